@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.middleware.RequestProfilingMiddleware', # opt-in: REQUEST_PROFILING = True (Server-Timing + log de requests lentos)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,15 +129,22 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'base.authentication.CachedJWTAuthentication', # JWT com o usuario em cache (sem query por request)
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        # contadores num arquivo SQLite compartilhado entre workers (THROTTLE_STORE_PATH, base/throttling.py)
+        'base.throttling.SharedAnonRateThrottle',
+        'base.throttling.SharedUserRateThrottle',
+        'base.throttling.SharedScopedRateThrottle', # só nas views com throttle_scope
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        # um contador por endpoint: logins errados não bloqueiam a recuperação de senha
+        'login': '10/minute',
+        'password_reset': '5/minute', # request-reset (envia email)
+        'password_reset_confirm': '10/minute',
+        'otp': '5/minute', # verify-2fa
     }
 }
 
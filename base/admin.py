@@ -1,11 +1,12 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     BaseProduct, ProductVariation, 
     BaseCustomUser, Address,
     Order, OrderItem,
     Cart, CartItem,
     CRMTag, CustomerCRM, CRMInteraction,
-    Supplier, InventoryLog, FinancialTransaction
+    Supplier, InventoryLog, FinancialTransaction, StockReservation, EmailOutbox
 )
 
 
@@ -30,7 +31,7 @@ class BaseProductAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('product', 'price_display', 'quantity')
+    readonly_fields = ('product', 'variation', 'price_display', 'quantity')
 
     def has_add_permission(self, request, obj=None):
         return False
@@ -39,7 +40,7 @@ class OrderItemInline(admin.TabularInline):
         return False
 
     def price_display(self, obj):
-        return obj.product.price if obj.product else '-'
+        return obj.unit_price if obj.unit_price is not None else '-'
     price_display.short_description = 'Preço Unitário'
 
 @admin.register(Order)
@@ -59,7 +60,7 @@ class OrderAdmin(admin.ModelAdmin):
         return False
 
     def total_pedido(self, obj):
-        return f"R$ {obj.get_total:.2f}"
+        return f"R$ {obj.total:.2f}"
     total_pedido.short_description = 'Total'
 
 class CartItemInline(admin.TabularInline):
@@ -119,6 +120,30 @@ class InventoryLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'variation', 'cart', 'cart_item', 'quantity', 'expires_at', 'created_at')
+    list_filter = ('expires_at',)
+    readonly_fields = ('product', 'variation', 'cart', 'cart_item', 'quantity', 'expires_at', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    search_fields = ('to', 'subject')
+    list_filter = ('status', 'created_at')
+    readonly_fields = [f.name for f in EmailOutbox._meta.fields]
+    actions = ['requeue']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Reenfileirar emails selecionados')
+    def requeue(self, request, queryset):
+        queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+
 @admin.register(FinancialTransaction)
 class FinancialTransactionAdmin(admin.ModelAdmin):
     list_display = ('id', 'type', 'amount', 'date')
@@ -0,0 +1,173 @@
+import asyncio
+import io
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .loadtest import LoadTestError, summarize
+from .models import BaseCustomUser, BaseProduct
+from .services.seed_service import seed_email
+from .throttling import reset_throttles
+
+# Compara, no mesmo processo e sem servidor HTTP, o caminho de leitura WSGI (views sincronas)
+# com o ASGI (base/async_views.py): os apps do Django são chamados direto com environ/scope.
+# - wsgi: pool fixo de threads (como gunicorn --threads); a thread fica presa até o cliente
+#   terminar de receber a resposta (--client-delay simula rede/cliente lento).
+# - asgi: um event loop (como um worker do uvicorn); a espera pelo cliente é um await.
+# - asgi_sync: as views sincronas servidas pelo handler ASGI, para separar o ganho do dispatch.
+# O ORM assincrono do Django ainda executa as queries numa thread (sync_to_async), então o ganho
+# vem de não segurar threads durante esperas, não de queries mais rapidas.
+# Usa os dados do seed_data (--prefix); throttle e cache do catalogo são zerados a cada rodada.
+
+ENDPOINTS = {
+    'product_list': ('/api/products/', '/api/async/products/'),
+    'product_detail': ('/api/products/{product}/', '/api/async/products/{product}/'),
+    'cart': ('/api/cart/', '/api/async/cart/'),
+    'order_list': ('/api/orders/', '/api/async/orders/'),
+}
+MODES = ('wsgi', 'asgi', 'asgi_sync')
+HOST = '127.0.0.1'
+DETAIL_PRODUCTS = 50
+
+def wsgi_environ(path, token):
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST, 'HTTP_ACCEPT': 'application/json', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+def asgi_scope(path, token):
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'accept', b'application/json'),
+                    (b'authorization', f'Bearer {token}'.encode())],
+        'client': (HOST, 0), 'server': (HOST, 80),
+    }
+
+def run_wsgi(app, paths, tokens, requests, concurrency, workers, client_delay):
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def handle(path, token):
+        result = {}
+
+        def start_response(status, headers, exc_info=None):
+            result['status'] = int(status.split(' ', 1)[0])
+
+        body = app(wsgi_environ(path, token), start_response)
+        try:
+            for _ in body:
+                pass
+            # envio ao cliente: a thread do servidor não atende ninguém enquanto isso
+            time.sleep(client_delay)
+        finally:
+            body.close()
+        return result['status']
+
+    def client(index):
+        while (n := next(counter, None)) is not None:
+            started = time.perf_counter()
+            code = server.submit(handle, paths[n % len(paths)], tokens[index % len(tokens)]).result()
+            with lock:
+                statuses[code] += 1
+                if code < 400:
+                    latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as server, ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(client, range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+async def asgi_request(app, path, token, client_delay):
+    result = {}
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # o cliente nunca desconecta; o handler cancela esta espera ao terminar
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+        elif not message.get('more_body'):
+            await asyncio.sleep(client_delay)
+
+    await app(asgi_scope(path, token), receive, send)
+    return result['status']
+
+async def run_asgi(app, paths, tokens, requests, concurrency, client_delay):
+    latencies, statuses = [], Counter()
+    counter = iter(range(requests))
+
+    async def client(index):
+        while (n := next(counter, None)) is not None:
+            started = time.perf_counter()
+            code = await asgi_request(app, paths[n % len(paths)], tokens[index % len(tokens)], client_delay)
+            statuses[code] += 1
+            if code < 400:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+def run(endpoints=None, modes=None, concurrency=(1, 8, 32, 64), requests=200, workers=8,
+        client_delay=0.02, clients=8, prefix='seed'):
+    names = endpoints or list(ENDPOINTS)
+    modes = modes or list(MODES)
+    unknown = (set(names) - set(ENDPOINTS)) | (set(modes) - set(MODES))
+    if unknown:
+        raise LoadTestError(f"Endpoint/modo desconhecido: {', '.join(sorted(unknown))}")
+    users = list(BaseCustomUser.objects.filter(email__in=[seed_email(prefix, i) for i in range(clients)]))
+    if not users:
+        raise LoadTestError(f"Nenhum usuario com o prefixo '{prefix}'; rode `manage.py seed_data` antes.")
+    # tokens emitidos fora da medição; a autenticação JWT de cada request continua sendo medida
+    tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+    products = list(BaseProduct.objects.filter(slug__startswith=f'{prefix}-', is_active=True)
+                    .order_by('created_at').values_list('pk', flat=True)[:DETAIL_PRODUCTS])
+    apps = {'wsgi': get_wsgi_application(), 'asgi': get_asgi_application()}
+
+    def expand(template):
+        return [template.format(product=pk) for pk in products] if '{product}' in template else [template]
+
+    report = {
+        'meta': {
+            'started_at': timezone.now().isoformat(),
+            'requests': requests,
+            'concurrency': list(concurrency),
+            'wsgi_workers': workers,
+            'client_delay_ms': round(client_delay * 1000, 3),
+            'clients': len(tokens),
+        },
+        'results': {},
+    }
+    for name in names:
+        sync_path, async_path = ENDPOINTS[name]
+        if name == 'product_detail' and not products:
+            raise LoadTestError(f"Nenhum produto com o prefixo '{prefix}'.")
+        for level in concurrency:
+            row = report['results'].setdefault(name, {}).setdefault(str(level), {})
+            for mode in modes:
+                cache.clear()
+                reset_throttles()
+                if mode == 'wsgi':
+                    row[mode] = run_wsgi(apps['wsgi'], expand(sync_path), tokens, requests, level, workers, client_delay)
+                else:
+                    paths = expand(async_path if mode == 'asgi' else sync_path)
+                    row[mode] = asyncio.run(run_asgi(apps['asgi'], paths, tokens, requests, level, client_delay))
+    return report
@@ -0,0 +1,105 @@
+import inspect
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+from .views import BaseProductViewSet, CartViewSet, CatalogHTTPCacheMixin, OrderViewSet
+
+# Caminho de leitura assincrono (ASGI) para catalogo, carrinho e pedidos.
+# Mesmos querysets, filtros, permissões, paginação e serializers das views sincronas; muda só
+# o dispatch: consultas pelo ORM assincrono (acount/aget/async for) e as partes do DRF que
+# ainda são sincronas (autenticação JWT, throttles, filtros) via sync_to_async.
+# Os serializers rodam no event loop, então os querysets precisam trazer tudo o que a
+# serialização usa (select_related/prefetch_related): um acesso lazy ao banco aqui
+# levanta SynchronousOnlyOperation em vez de virar N+1 silencioso.
+
+class AsyncViewSetMixin:
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        # o view do ViewSetMixin devolve a coroutine de dispatch; marcado, o handler do Django a aguarda
+        return markcoroutinefunction(super().as_view(actions, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # options/http_method_not_allowed continuam sincronos
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def afilter_queryset(self, queryset):
+        # backends de filtro podem consultar o banco (busca, ModelChoiceFilter)
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def list(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+class AsyncCatalogHTTPCacheMixin(CatalogHTTPCacheMixin):
+    async def cached_response(self, request, version, handler, *args, **kwargs):
+        key, data = self.cache_lookup(request, version)
+        if data is not None:
+            return Response(data)
+        return self.cache_store(key, await handler(request, *args, **kwargs))
+
+    async def conditional_response(self, request, handler, *args, **kwargs):
+        version, etag, last_modified, response = self.precondition(request)
+        if response is None:
+            response = await self.cached_response(request, version, handler, *args, **kwargs)
+        return self.tag_response(response, etag, last_modified)
+
+    async def list(self, request, *args, **kwargs):
+        return await self.conditional_response(request, super().list, *args, **kwargs)
+
+    async def retrieve(self, request, *args, **kwargs):
+        return await self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+class AsyncProductViewSet(AsyncCatalogHTTPCacheMixin, AsyncViewSetMixin, BaseProductViewSet):
+    pass
+
+class AsyncOrderViewSet(AsyncViewSetMixin, OrderViewSet):
+    pass
+
+class AsyncCartViewSet(AsyncViewSetMixin, CartViewSet):
+    async def list(self, request, *args, **kwargs):
+        user = request.user
+        if user.is_staff:
+            return await super().list(request, *args, **kwargs)
+        # mesmo caminho do CartViewSet (snapshot, criação do carrinho e envelope), numa thread
+        return await sync_to_async(self.client_cart_response)(user)
@@ -0,0 +1,34 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_cached_principal, set_cached_principal
+
+class CachedJWTAuthentication(JWTAuthentication):
+    # Igual ao JWTAuthentication, mas o usuario do token vem do cache (base/cache.py) e só
+    # uma falta vai ao banco: GETs autenticados não consultam o usuario a cada request.
+    # As checagens de usuario ativo e de token revogado valem também para o usuario em cache.
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = get_cached_principal(user_id)
+        if user is None:
+            try:
+                # o security_profile vem junto: 2FA e permissões o consultam no mesmo request
+                user = self.user_model.objects.select_related('security_profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            set_cached_principal(user)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,278 @@
+import time
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .services.seed_service import WORDS
+
+# Benchmarks rodam dentro de uma transação que é desfeita no final,
+# então podem ser executados contra o banco de desenvolvimento sem sujá-lo.
+
+class Rollback(Exception):
+    pass
+
+def run_in_rollback(func, *args, **kwargs):
+    from django.core.cache import cache
+    from .throttling import reset_throttles
+    # limpa contadores de throttle e caches entre suites
+    cache.clear()
+    reset_throttles()
+    result = {}
+    try:
+        with transaction.atomic():
+            result = func(*args, **kwargs)
+            raise Rollback
+    except Rollback:
+        pass
+    return result
+
+def measure(client, url, repeat=20, **params):
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = client.get(url, params)
+            timings.append(time.perf_counter() - start)
+        queries = len(ctx.captured_queries)
+        assert response.status_code == 200, response.status_code
+    timings.sort()
+    return {
+        'queries': queries,
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+    }
+
+def _make_user(email):
+    from .models import BaseCustomUser
+    return BaseCustomUser.objects.create_user(username=email, email=email, password=None)
+
+def bench_cart(sizes=(1, 10, 50, 200), repeat=20):
+    from django.core.cache import cache
+    from .models import BaseProduct, Cart, CartItem
+    rows = []
+    for size in sizes:
+        user = _make_user(f'bench-cart-{size}@bench.local')
+        cart = Cart.objects.create(user=user)
+        products = BaseProduct.objects.bulk_create(
+            BaseProduct(name=f'Produto {size}-{i}', slug=f'bench-{size}-{i}', price=Decimal('10.00'), stock=100)
+            for i in range(size)
+        )
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=p, quantity=1) for p in products)
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user=user)
+        url = reverse('cart-list')
+
+        # miss: limpa o cache antes de cada chamada
+        misses = []
+        for _ in range(repeat):
+            cache.clear()
+            misses.append(measure(client, url, repeat=1))
+        warm = measure(client, url, repeat=repeat)
+        rows.append({
+            'items': size,
+            'miss_queries': misses[0]['queries'],
+            'miss_p50_ms': sorted(m['p50_ms'] for m in misses)[len(misses) // 2],
+            'hit_queries': warm['queries'],
+            'hit_p50_ms': warm['p50_ms'],
+        })
+    return rows
+
+
+def bench_search(repeat=20, size=100_000):
+    import random
+    from .models import BaseProduct
+    from .search import DatabaseSearchBackend, get_search_backend
+
+    rng = random.Random(42)
+    # vocabulario sintetico grande para que as buscas sejam seletivas como em um catalogo real
+    syllables = ['ba', 'ca', 'de', 'fi', 'go', 'lu', 'ma', 'ne', 'po', 'ri', 'sa', 'te', 'vo', 'xu', 'zé']
+    vocabulary = WORDS + [''.join(rng.choices(syllables, k=4)) for _ in range(20_000)]
+    batch = []
+    for i in range(size):
+        name = ' '.join(rng.sample(WORDS, 1) + rng.sample(vocabulary, 2)).capitalize()
+        description = ' '.join(rng.sample(vocabulary, 8))
+        batch.append(BaseProduct(name=name, slug=f'bench-search-{i}', description=description, price=Decimal('10.00')))
+        if len(batch) == 5000:
+            BaseProduct.objects.bulk_create(batch)
+            batch = []
+    BaseProduct.objects.bulk_create(batch)
+
+    backend = get_search_backend()
+    start = time.perf_counter()
+    backend.rebuild()
+    rebuild_seconds = round(time.perf_counter() - start, 3)
+
+    user = _make_user('bench-search@bench.local')
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user=user)
+    url = reverse('product-list')
+    rare = vocabulary[len(WORDS) + 7]
+    queries = {
+        'common': 'camiseta',
+        'selective': f'{rare}',
+        'typo': f'{rare[:-1]}x',
+        'prefix': rare[:5],
+    }
+    report = {'products': size, 'rebuild_seconds': rebuild_seconds}
+    for label, query in queries.items():
+        report[f'api_{label}'] = measure(client, url, repeat=repeat, search=query)
+
+    # comparação direta com a busca por icontains (primeira pagina)
+    fallback = DatabaseSearchBackend()
+    queryset = BaseProduct.objects.filter(is_active=True)
+    for label, engine in (('fts', backend), ('icontains', fallback)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(engine.search(queryset, rare)[:10])
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        report[f'selective_first_page_{label}_p50_ms'] = round(timings[len(timings) // 2] * 1000, 3)
+    return report
+
+def _rows_per_second(serializer_class, instances, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serializer_class(instances, many=True).data
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(len(instances) / best) if best else None
+
+def bench_serializers(repeat=20, rows=100):
+    from . import serializers as base_serializers
+    from .models import (
+        BaseProduct, ProductVariation, Order, OrderItem, Cart, CartItem, CustomerCRM,
+        CRMInteraction, CRMTag, Supplier, InventoryLog, FinancialTransaction, Address,
+    )
+
+    user = _make_user('bench-serializers@bench.local')
+    products = BaseProduct.objects.bulk_create(
+        BaseProduct(name=f'Produto {i}', slug=f'bench-ser-{i}', price=Decimal(i), stock=i % 3,
+                    description='' if i % 2 else 'descrição')
+        for i in range(rows)
+    )
+    ProductVariation.objects.bulk_create(
+        ProductVariation(product=p, name='Cor', value='Azul', stock=i % 2) for i, p in enumerate(products))
+    orders = Order.objects.bulk_create(Order(client=user, total=Decimal(i)) for i in range(rows))
+    OrderItem.objects.bulk_create(
+        OrderItem(order=o, product=products[i], quantity=2, unit_price=products[i].price) for i, o in enumerate(orders))
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.bulk_create(CartItem(cart=cart, product=p, quantity=1) for p in products)
+    crm = CustomerCRM.objects.create(user=user)
+    CRMInteraction.objects.bulk_create(
+        CRMInteraction(customer=crm, agent=user, type='call', subject=f'Contato {i}', description='...') for i in range(rows))
+    CRMTag.objects.bulk_create(CRMTag(name=f'bench-tag-{i}') for i in range(rows))
+    Supplier.objects.bulk_create(Supplier(name=f'Fornecedor {i}') for i in range(rows))
+    Address.objects.bulk_create(
+        Address(street='Rua A', city='Recife', state='PE', zip_code='50000-000') for _ in range(rows))
+    InventoryLog.objects.bulk_create(
+        InventoryLog(product=p, type='IN', quantity=1, reason='bench', user=user) for p in products)
+    FinancialTransaction.objects.bulk_create(
+        FinancialTransaction(type='INCOME', amount=Decimal(i), description='bench') for i in range(rows))
+
+    datasets = {
+        base_serializers.ProductSerializer: BaseProduct.objects.all(),
+        base_serializers.ProductDetailSerializer: BaseProduct.objects.all(),
+        base_serializers.SimpleProductSerializer: BaseProduct.objects.all(),
+        base_serializers.VariationProductSerializer: ProductVariation.objects.all(),
+        base_serializers.AddressSerializer: Address.objects.all(),
+        base_serializers.CustomUserSerializer: type(user).objects.select_related('address'),
+        base_serializers.OrderSerializer: Order.objects.prefetch_related('items__product'),
+        base_serializers.OrderItemSerializer: OrderItem.objects.select_related('product'),
+        base_serializers.CartSerializer: Cart.objects.prefetch_related('items__product'),
+        base_serializers.CartItemSerializer: CartItem.objects.select_related('product'),
+        base_serializers.CRMTagSerializer: CRMTag.objects.all(),
+        base_serializers.CRMInteractionSerializer: CRMInteraction.objects.select_related('agent'),
+        base_serializers.CustomerCRMSerializer: CustomerCRM.objects.select_related('user').prefetch_related('tags', 'interactions__agent'),
+        base_serializers.SupplierSerializer: Supplier.objects.all(),
+        base_serializers.InventoryLogSerializer: InventoryLog.objects.select_related('product', 'user'),
+        base_serializers.FinancialTransactionSerializer: FinancialTransaction.objects.all(),
+    }
+    report = {}
+    for serializer_class, queryset in datasets.items():
+        instances = list(queryset[:rows])
+        try:
+            base_serializers.CleanModelSerializer.use_fast_representation = False
+            legacy = _rows_per_second(serializer_class, instances, repeat)
+        finally:
+            base_serializers.CleanModelSerializer.use_fast_representation = True
+        fast = _rows_per_second(serializer_class, instances, repeat)
+        report[serializer_class.__name__] = {
+            'rows': len(instances),
+            'legacy_rows_per_s': legacy,
+            'fast_rows_per_s': fast,
+            'speedup': round(fast / legacy, 2) if legacy else None,
+        }
+    return report
+
+def bench_analytics(repeat=20, lines=1_000_000):
+    import random
+    from datetime import timedelta
+    from django.core.cache import cache
+    from django.utils import timezone
+    from .models import BaseCustomUser, BaseProduct, CustomerCRM, Order, OrderItem
+    from .services.analytics_service import dashboard, default_window
+    from .services.seed_service import bulk_create_backdated
+
+    rng = random.Random(7)
+    users = BaseCustomUser.objects.bulk_create(
+        BaseCustomUser(username=f'bench-analytics-{i}', email=f'bench-analytics-{i}@bench.local',
+                       birth_date=timezone.localdate() - timedelta(days=rng.randint(16 * 365, 80 * 365)))
+        for i in range(2000)
+    )
+    CustomerCRM.objects.bulk_create(
+        CustomerCRM(user=u, lifetime_value=Decimal(rng.randint(0, 800000)) / 100) for u in users)
+    products = BaseProduct.objects.bulk_create(
+        BaseProduct(name=f'Produto {i}', slug=f'bench-analytics-{i}', price=Decimal(rng.randint(100, 50000)) / 100)
+        for i in range(500)
+    )
+    statuses = [code for code, _ in Order.STATUS_CHOICE]
+    now = timezone.now()
+    # pedidos espalhados no ano (created_at é auto_now_add e é regravado depois do insert)
+    orders = bulk_create_backdated(Order, (
+        Order(client=rng.choice(users), status=rng.choice(statuses), payment_status=rng.random() < 0.8,
+              total=Decimal('0.00'), created_at=now - timedelta(minutes=rng.randint(0, 364 * 24 * 60)))
+        for _ in range(lines // 4)
+    ), ['created_at'], 5000)
+    batch = []
+    for i in range(lines):
+        product = rng.choice(products)
+        batch.append(OrderItem(order=orders[i // 4], product=product, quantity=rng.randint(1, 5), unit_price=product.price))
+        if len(batch) == 10000:
+            OrderItem.objects.bulk_create(batch)
+            batch = []
+    OrderItem.objects.bulk_create(batch)
+
+    start, end = default_window()
+    cold = []
+    for _ in range(3):
+        cache.clear()
+        started = time.perf_counter()
+        dashboard(start, end, 'month')
+        cold.append(time.perf_counter() - started)
+    cold.sort()
+
+    user = _make_user('bench-analytics@bench.local')
+    user.is_staff = True
+    user.save()
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user=user)
+    return {
+        'order_lines': lines,
+        'orders': len(orders),
+        'cold_dashboard_p50_ms': round(cold[1] * 1000, 3),
+        'cached_revenue': measure(client, reverse('analytics-revenue'), repeat=repeat),
+        'cached_cohorts': measure(client, reverse('analytics-cohorts'), repeat=repeat),
+    }
+
+SUITES = {
+    'cart': bench_cart,
+    'search': bench_search,
+    'serializers': bench_serializers,
+    'analytics': bench_analytics,
+}
@@ -0,0 +1,116 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# snapshot serializado do carrinho, invalidado pelos sinais de CartItem/BaseProduct
+CART_SNAPSHOT_PREFIX = 'cart:snapshot:'
+
+def cart_snapshot_key(user_id):
+    return f"{CART_SNAPSHOT_PREFIX}{user_id}"
+
+def get_cart_snapshot(user_id):
+    return cache.get(cart_snapshot_key(user_id))
+
+def set_cart_snapshot(user_id, data):
+    timeout = getattr(settings, 'CART_SNAPSHOT_TTL', 300)
+    cache.set(cart_snapshot_key(user_id), data, timeout)
+
+def invalidate_cart_snapshots(user_ids):
+    keys = [cart_snapshot_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys)
+
+# usuario autenticado via JWT (base/authentication.py), com o security_profile ja carregado.
+# Invalidado pelos sinais de BaseCustomUser/UserSecurityProfile; updates em massa (queryset.update)
+# não disparam sinais e ficam visiveis só depois do TTL, por isso ele é curto.
+# Com o locmem (padrão sem CACHES) cada worker tem sua copia e a invalidação só alcança o
+# processo que tratou a alteração: nos demais, um usuario desativado ou com a senha trocada
+# continua autenticando até AUTH_PRINCIPAL_CACHE_TTL expirar. Use um cache compartilhado em produção.
+PRINCIPAL_PREFIX = 'auth:principal:'
+
+def principal_key(user_id):
+    return f"{PRINCIPAL_PREFIX}{user_id}"
+
+def get_cached_principal(user_id):
+    return cache.get(principal_key(user_id))
+
+def set_cached_principal(user):
+    timeout = getattr(settings, 'AUTH_PRINCIPAL_CACHE_TTL', 60)
+    cache.set(principal_key(user.pk), user, timeout)
+
+def invalidate_principal(user_id):
+    key = principal_key(user_id)
+    cache.delete(key)
+    # de novo após o commit: um request concorrente pode ter recolocado a versão antiga
+    if not transaction.get_autocommit():
+        transaction.on_commit(lambda: cache.delete(key))
+
+# versão do catalogo por escopo ('products', 'variations'): base dos ETags e do Last-Modified.
+# Precisa de um cache compartilhado entre os processos (Redis/Memcached) em produção.
+CATALOG_VERSION_PREFIX = 'catalog:version:'
+CATALOG_SCOPES = ('products', 'variations')
+
+def _new_catalog_state():
+    return {'version': uuid.uuid4().hex, 'modified': time.time()}
+
+def catalog_state(scope):
+    key = f"{CATALOG_VERSION_PREFIX}{scope}"
+    state = cache.get(key)
+    if state is None:
+        # sem estado (cache reiniciado): nova versão e modificação "agora"; no pior caso o cliente baixa de novo
+        state = _new_catalog_state()
+        if not cache.add(key, state, None):
+            state = cache.get(key) or state
+    return state['version'], state['modified']
+
+def _set_catalog_versions(scopes):
+    cache.set_many({f"{CATALOG_VERSION_PREFIX}{scope}": _new_catalog_state() for scope in scopes}, None)
+
+def bump_catalog_version(*scopes):
+    scopes = scopes or CATALOG_SCOPES
+    _set_catalog_versions(scopes)
+    # de novo após o commit: respostas geradas entre o primeiro bump e o commit ainda liam os dados antigos
+    if not transaction.get_autocommit():
+        transaction.on_commit(lambda: _set_catalog_versions(scopes))
+
+# respostas (response.data) de produtos/variações; a versão do catalogo faz parte da chave,
+# então um bump invalida tudo de uma vez e as chaves antigas expiram pelo TTL
+CATALOG_RESPONSE_PREFIX = 'catalog:response:'
+CATALOG_STATS_PREFIX = 'catalog:stats:'
+
+def catalog_response_key(scope, version, variant):
+    digest = hashlib.sha1(variant.encode('utf-8')).hexdigest()
+    return f"{CATALOG_RESPONSE_PREFIX}{scope}:{version}:{digest}"
+
+def get_catalog_response(key):
+    return cache.get(key)
+
+def set_catalog_response(key, data):
+    timeout = getattr(settings, 'CATALOG_RESPONSE_CACHE_TTL', 600)
+    cache.set(key, data, timeout)
+
+def record_catalog_cache(scope, hit):
+    key = f"{CATALOG_STATS_PREFIX}{scope}:{'hits' if hit else 'misses'}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+def catalog_cache_stats():
+    keys = [f"{CATALOG_STATS_PREFIX}{scope}:{kind}" for scope in CATALOG_SCOPES for kind in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    stats = {}
+    for scope in CATALOG_SCOPES:
+        hits = values.get(f"{CATALOG_STATS_PREFIX}{scope}:hits", 0)
+        misses = values.get(f"{CATALOG_STATS_PREFIX}{scope}:misses", 0)
+        total = hits + misses
+        stats[scope] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else None}
+    return stats
+
+def reset_catalog_cache_stats():
+    cache.delete_many([f"{CATALOG_STATS_PREFIX}{scope}:{kind}" for scope in CATALOG_SCOPES for kind in ('hits', 'misses')])
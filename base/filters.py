@@ -1,6 +1,8 @@
 import django_filters
 from django.core.exceptions import PermissionDenied
+from rest_framework import filters
 from .models import BaseProduct, Order, InventoryLog, FinancialTransaction, BaseCustomUser
+from .search import get_search_backend
 
 class BasePermissionFilter(django_filters.FilterSet):
     def __init__(self, *args, **kwargs):
@@ -17,7 +19,7 @@ class BasePermissionFilter(django_filters.FilterSet):
 class ProductFilter(BasePermissionFilter):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
-    name = django_filters.CharFilter(field_name="name", lookup_expr='icontains')
+    name = django_filters.CharFilter(field_name="name", method='filter_name')
 
     class Meta:
         model = BaseProduct
@@ -28,6 +30,9 @@ class ProductFilter(BasePermissionFilter):
              if not (self.user and self.user.is_staff):
                  raise PermissionDenied("Apenas administradores podem filtrar por status de atividade.")
 
+    def filter_name(self, queryset, name, value):
+        return get_search_backend().search(queryset, value, fields=['name'], rank=False)
+
 class OrderFilter(BasePermissionFilter):
     min_date = django_filters.DateFilter(field_name="created_at", lookup_expr='gte')
     max_date = django_filters.DateFilter(field_name="created_at", lookup_expr='lte')
@@ -85,4 +90,20 @@ class FinancialTransactionFilter(BasePermissionFilter):
 
     def check_permissions(self):
         if not (self.user and self.user.is_staff):
-            raise PermissionDenied("PERIGO: Tentativa de acesso não autorizado a dados financeiros.")
\ No newline at end of file
+            raise PermissionDenied("PERIGO: Tentativa de acesso não autorizado a dados financeiros.")
+
+# Busca de produtos pelo backend de indice (?search=), ordenada por relevancia
+class ProductSearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, ' '.join(terms))
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    # durante uma busca, a ordenação padrão da view não sobrescreve a relevancia
+    def get_ordering(self, request, queryset, view):
+        searching = request.query_params.get(ProductSearchFilter.search_param)
+        if searching and not request.query_params.get(self.ordering_param):
+            return None
+        return super().get_ordering(request, queryset, view)
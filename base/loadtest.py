@@ -0,0 +1,192 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.utils import timezone
+
+from .services.seed_service import DEFAULT_PASSWORD, WORDS, seed_email, staff_email
+
+# Teste de carga HTTP contra um servidor em execução (runserver, gunicorn, uvicorn...),
+# usando os usuarios gerados por `manage.py seed_data`. Cada cenario é executado com
+# N clientes concorrentes e reporta latencia (p50/p95/p99) e vazão em JSON.
+# Os throttles do servidor valem aqui também: anon/user em todos os cenarios e o escopo
+# 'login' (10/minute por IP) no /api/token/. Respostas 429 aparecem em "status" e contam como
+# erro (o cenario token_obtain esbarra no 'login' logo nos primeiros requests), então suba
+# DEFAULT_THROTTLE_RATES no servidor alvo. Na preparação, os logins de cada cliente esperam o
+# Retry-After em vez de falhar: com a taxa padrão, ~6s por cliente além do 10º.
+
+LOGIN_MAX_WAIT = 120
+
+class LoadTestError(Exception):
+    pass
+
+class Scenario:
+    def __init__(self, path, method='GET', auth=None, params=None, body=None):
+        self.path = path
+        self.method = method
+        self.auth = auth  # None, 'client' ou 'staff'
+        self.params = params
+        self.body = body
+
+SCENARIOS = {
+    'product_search': Scenario('/api/products/', params=lambda rng, user: {'search': rng.choice(WORDS)}),
+    'cart': Scenario('/api/cart/', auth='client'),
+    'order_list': Scenario('/api/orders/', auth='client'),
+    'token_obtain': Scenario('/api/token/', method='POST',
+                             body=lambda rng, user: {'email': user['email'], 'password': user['password']}),
+    'financial_list': Scenario('/api/financial-transactions/', auth='staff'),
+}
+
+def percentile(sorted_values, pct):
+    # nearest-rank: sempre um valor observado
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+class HttpClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, params=None, body=None, token=None):
+        code, payload, _ = self.send(method, path, params=params, body=body, token=token)
+        return code, payload
+
+    def send(self, method, path, params=None, body=None, token=None):
+        url = self.base_url + path
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method)
+        request.add_header('Accept', 'application/json')
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+    def obtain_token(self, email, password, max_wait=LOGIN_MAX_WAIT):
+        waited = 0.0
+        while True:
+            code, payload, headers = self.send('POST', '/api/token/', body={'email': email, 'password': password})
+            if code != 429:
+                break
+            delay = float(headers.get('Retry-After') or 1)
+            if waited + delay > max_wait:
+                raise LoadTestError(f"Login de {email} limitado pelo throttle 'login' (HTTP 429); "
+                                    "suba DEFAULT_THROTTLE_RATES['login'] no servidor alvo.")
+            time.sleep(delay)
+            waited += delay
+        if code != 200:
+            raise LoadTestError(f"Falha ao autenticar {email}: HTTP {code}")
+        data = json.loads(payload)
+        if 'access' not in data:
+            raise LoadTestError(f"{email} exige 2FA; use usuarios gerados pelo seed_data.")
+        return data['access']
+
+def run_scenario(client, scenario, identities, requests, concurrency, random_seed=0):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(index):
+        rng = random.Random(random_seed + index)
+        identity = identities[index % len(identities)]
+        local_latencies, local_statuses = [], Counter()
+        # as threads dividem um unico contador: o total de requests não depende da concorrencia
+        while next(counter, None) is not None:
+            params = scenario.params(rng, identity) if scenario.params else None
+            body = scenario.body(rng, identity) if scenario.body else None
+            started = time.perf_counter()
+            try:
+                code, _ = client.request(scenario.method, scenario.path, params=params, body=body,
+                                         token=identity.get(scenario.auth))
+            except OSError:
+                code = 'connection_error'
+            local_statuses[code] += 1
+            if isinstance(code, int) and code < 400:
+                local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+def summarize(latencies, statuses, elapsed):
+    # latencia e vazão só das respostas bem sucedidas: um 429 rapido não pode melhorar o p50
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': sum(statuses.values()),
+        'errors': sum(statuses.values()) - len(latencies),
+        'status': {str(code): count for code, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': ms(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+
+def compare(report, baseline):
+    # variação relativa em relação a uma execução anterior (positivo = mais lento / mais vazão)
+    delta = {}
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        delta[name] = {
+            key: round((result[key] - previous[key]) / previous[key], 4)
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+            if result.get(key) is not None and previous.get(key)
+        }
+    return delta
+
+def run(base_url, scenarios=None, requests=200, concurrency=8, clients=None, prefix='seed',
+        password=DEFAULT_PASSWORD, timeout=30, random_seed=0):
+    names = scenarios or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise LoadTestError(f"Cenario desconhecido: {', '.join(sorted(unknown))}")
+    client = HttpClient(base_url, timeout=timeout)
+
+    # autenticação fora da medição; cada thread usa um cliente diferente (throttle e carrinho por usuario)
+    needs = {SCENARIOS[name].auth for name in names}
+    staff_token = client.obtain_token(staff_email(prefix), password) if 'staff' in needs else None
+    identities = []
+    for index in range(clients or concurrency):
+        email = seed_email(prefix, index)
+        identity = {'email': email, 'password': password, 'staff': staff_token}
+        if 'client' in needs:
+            identity['client'] = client.obtain_token(email, password)
+        identities.append(identity)
+
+    report = {
+        'meta': {
+            'started_at': timezone.now().isoformat(),
+            'base_url': base_url,
+            'requests': requests,
+            'concurrency': concurrency,
+            'clients': len(identities),
+        },
+        'results': {},
+    }
+    for name in names:
+        report['results'][name] = run_scenario(
+            client, SCENARIOS[name], identities, requests, concurrency, random_seed=random_seed)
+    return report
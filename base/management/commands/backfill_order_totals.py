@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from base.services.order_service import backfill_totals
+
+class Command(BaseCommand):
+    help = "Congela o preço dos itens sem unit_price e recalcula o total dos pedidos divergentes (backfill)."
+
+    def handle(self, *args, **options):
+        result = backfill_totals()
+        self.stdout.write(f"{result['items']} item(ns) com preço congelado, {result['orders']} pedido(s) recalculados.")
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.asgi_benchmark import ENDPOINTS, MODES, run
+from base.loadtest import LoadTestError
+
+class Command(BaseCommand):
+    help = "Compara latencia e vazão das leituras WSGI (views sincronas) e ASGI (views assincronas), em processo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoints', nargs='*', help=f"Endpoints: {', '.join(ENDPOINTS)} (padrão: todos).")
+        parser.add_argument('--modes', default=','.join(MODES), help="Modos separados por virgula.")
+        parser.add_argument('--concurrency', default='1,8,32,64', help="Niveis de concorrencia separados por virgula.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests por endpoint, nivel e modo.")
+        parser.add_argument('--workers', type=int, default=8, help="Threads do servidor WSGI simulado.")
+        parser.add_argument('--client-delay', type=float, default=20, help="Tempo (ms) que o cliente leva para receber a resposta.")
+        parser.add_argument('--clients', type=int, default=8, help="Usuarios do seed_data usados nas requests.")
+        parser.add_argument('--prefix', default='seed', help="Prefixo usado no seed_data.")
+        parser.add_argument('--output', help="Grava o relatorio JSON neste arquivo.")
+
+    def handle(self, *args, **options):
+        try:
+            concurrency = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError("--concurrency deve ser uma lista de inteiros, ex: 1,8,32")
+        try:
+            report = run(
+                endpoints=options['endpoints'], modes=options['modes'].split(','), concurrency=concurrency,
+                requests=options['requests'], workers=options['workers'], client_delay=options['client_delay'] / 1000,
+                clients=options['clients'], prefix=options['prefix'],
+            )
+        except LoadTestError as e:
+            raise CommandError(str(e))
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
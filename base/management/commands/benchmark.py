@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.benchmarks import SUITES, run_in_rollback
+
+class Command(BaseCommand):
+    help = "Executa benchmarks internos (dados criados são descartados ao final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', help=f"Suites a executar: {', '.join(sorted(SUITES))} (padrão: todas).")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        names = options['suites'] or sorted(SUITES)
+        unknown = set(names) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Suite desconhecida: {', '.join(sorted(unknown))}")
+        report = {}
+        for name in names:
+            report[name] = run_in_rollback(SUITES[name], repeat=options['repeat'])
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.services.export_service import DATASETS, DEFAULT_BATCH_SIZE, FORMATS, ExportError, export_dataset
+
+class Command(BaseCommand):
+    help = "Exporta pedidos, itens, estoque, financeiro e exclusões para Parquet ou Lance (incremental por padrão)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('datasets', nargs='*', help=f"Datasets: {', '.join(DATASETS)} (padrão: todos).")
+        parser.add_argument('--format', choices=FORMATS, default='parquet')
+        parser.add_argument('--output', default='exports', help="Diretório de destino.")
+        parser.add_argument('--full', action='store_true', help="Ignora a ultima marca d'água e reescreve o destino.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        names = options['datasets'] or list(DATASETS)
+        unknown = set(names) - set(DATASETS)
+        if unknown:
+            raise CommandError(f"Dataset desconhecido: {', '.join(sorted(unknown))}")
+        for name in names:
+            try:
+                result = export_dataset(
+                    name, options['output'], fmt=options['format'],
+                    incremental=not options['full'], batch_size=options['batch_size'],
+                )
+            except ExportError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"{name}: {result['rows']} linha(s) -> {result['path']}")
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.models import BaseCustomUser
+from base.services.inventory_import import DEFAULT_CHUNK_SIZE, ingest_movements, iter_rows
+
+class Command(BaseCommand):
+    help = "Importa movimentos de estoque em lote a partir de CSV, JSON ou JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Arquivo de entrada ou '-' para stdin.")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Padrão: deduzido pela extensão.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--user', help="Email do usuário registrado nos logs.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+        user = None
+        if options['user']:
+            try:
+                user = BaseCustomUser.objects.get(email=options['user'])
+            except BaseCustomUser.DoesNotExist:
+                raise CommandError(f"Usuário {options['user']} não encontrado.")
+
+        # binario: a decodificação é por linha (base.services.inventory_import)
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            report = ingest_movements(iter_rows(stream, fmt), user=user, chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(f"Arquivo inválido: {e}")
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in report['errors']:
+            self.stderr.write(f"linha {error['row']}: {error['errors']}")
+        self.stdout.write(f"{report['created']} movimento(s) importado(s), {report['rejected']} rejeitado(s).")
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.loadtest import SCENARIOS, LoadTestError, compare, run
+from base.services.seed_service import DEFAULT_PASSWORD
+
+class Command(BaseCommand):
+    help = "Teste de carga HTTP dos endpoints principais contra um servidor em execução (dados do seed_data)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Cenarios: {', '.join(SCENARIOS)} (padrão: todos).")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="URL base do servidor alvo.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests por cenario.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--clients', type=int, default=None, help="Usuarios distintos (padrão: a concorrencia).")
+        parser.add_argument('--prefix', default='seed', help="Prefixo usado no seed_data.")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help="Grava o relatorio JSON neste arquivo.")
+        parser.add_argument('--baseline', help="Relatorio anterior para comparação (adiciona 'delta').")
+
+    def handle(self, *args, **options):
+        try:
+            report = run(
+                options['url'], scenarios=options['scenarios'], requests=options['requests'],
+                concurrency=options['concurrency'], clients=options['clients'], prefix=options['prefix'],
+                password=options['password'], timeout=options['timeout'],
+            )
+        except LoadTestError as e:
+            raise CommandError(str(e))
+        except OSError as e:
+            raise CommandError(f"Servidor inacessível em {options['url']}: {e}")
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                report['delta'] = compare(report, json.load(f))
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from base.services.token_service import purge_expired
+
+class Command(BaseCommand):
+    help = "Remove codigos OTP e tokens de redefinição de senha vencidos."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(f"{deleted} token(s) vencido(s) removido(s).")
@@ -0,0 +1,12 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.throttling import get_store
+
+class Command(BaseCommand):
+    help = "Remove contadores de throttle cujas janelas já venceram."
+
+    def handle(self, *args, **options):
+        deleted = get_store().purge(time.time())
+        self.stdout.write(f"{deleted} contador(es) de throttle removido(s).")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from base.services.crm_service import rebuild_metrics
+
+class Command(BaseCommand):
+    help = "Recalcula lifetime_value, total_orders_count e last_purchase_date de todos os clientes a partir dos pedidos pagos."
+
+    def handle(self, *args, **options):
+        updated = rebuild_metrics()
+        self.stdout.write(f"{updated} perfil(is) de CRM recalculado(s).")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from base.services.finance_service import rebuild_rollups
+
+class Command(BaseCommand):
+    help = "Reconstrói os rollups diários e mensais a partir de FinancialTransaction (backfill)."
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups()
+        self.stdout.write(f"{rows} linha(s) de rollup geradas.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from base.models import BaseProduct
+from base.search import get_search_backend
+
+class Command(BaseCommand):
+    help = "Reconstrói o indice de busca de produtos a partir da tabela de produtos."
+
+    def handle(self, *args, **options):
+        get_search_backend().rebuild()
+        self.stdout.write(f"Indice reconstruído com {BaseProduct.objects.count()} produto(s).")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from base.services.stock_service import release_expired
+
+class Command(BaseCommand):
+    help = "Devolve ao estoque as reservas de carrinho/checkout vencidas."
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        self.stdout.write(f"{released} unidade(s) devolvidas ao estoque.")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from base.services.outbox import OutboxWorker
+
+class Command(BaseCommand):
+    help = "Drena a fila de emails (EmailOutbox) com um pool de threads, retentativas e dead-letter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--once', action='store_true', help="Sai quando a fila estiver vazia.")
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(workers=options['workers'], batch_size=options['batch_size'])
+        sent, failed = worker.run(poll_interval=options['poll_interval'], once=options['once'])
+        self.stdout.write(f"{sent} email(s) enviado(s), {failed} falha(s).")
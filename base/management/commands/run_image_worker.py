@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from base.services.image_pipeline import ImageWorker, enqueue_missing
+
+class Command(BaseCommand):
+    help = "Gera os derivados das fotos de produto (ProductImageJob) com um pool de threads e retentativas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--once', action='store_true', help="Sai quando a fila estiver vazia.")
+        parser.add_argument('--backfill', action='store_true', help="Enfileira antes os produtos com foto sem derivados.")
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f"{enqueue_missing()} produto(s) enfileirado(s).")
+        worker = ImageWorker(workers=options['workers'], batch_size=options['batch_size'])
+        done, failed = worker.run(poll_interval=options['poll_interval'], once=options['once'])
+        self.stdout.write(f"{done} imagem(ns) processada(s), {failed} falha(s).")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.services.seed_service import DEFAULT_BATCH_SIZE, DEFAULT_PASSWORD, SeedError, seed, seed_email, staff_email
+
+class Command(BaseCommand):
+    help = "Gera dados sintéticos em volume (catalogo, usuarios, CRM, carrinhos, pedidos, estoque e financeiro)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--variations', type=int, default=3, help="Variações por produto.")
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--days', type=int, default=365, help="Periodo em que as datas são espalhadas.")
+        parser.add_argument('--prefix', default='seed', help="Prefixo de emails/slugs; permite mais de uma carga no mesmo banco.")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help="Senha de todos os usuarios gerados.")
+        parser.add_argument('--seed', type=int, default=42, help="Semente do gerador (cargas reproduziveis).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            counts = seed(
+                products=options['products'], users=options['users'], orders=options['orders'],
+                variations_per_product=options['variations'], items_per_order=options['items_per_order'],
+                days=options['days'], prefix=options['prefix'], password=options['password'],
+                random_seed=options['seed'], batch_size=options['batch_size'],
+            )
+        except SeedError as e:
+            raise CommandError(str(e))
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
+        prefix = options['prefix']
+        self.stdout.write(f"Staff: {staff_email(prefix)} | clientes: {seed_email(prefix, 0)} ... (senha: {options['password']})")
+        self.stdout.write(f"Concluído em {time.perf_counter() - started:.1f}s.")
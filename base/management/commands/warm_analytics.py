@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.services.analytics_service import PERIODS, warm_window
+
+class Command(BaseCommand):
+    help = "Recalcula e guarda no cache os dashboards das janelas mais usadas (rodar via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, nargs='+', default=[30, 90, 365],
+                            help="Tamanhos das janelas terminando hoje (padrão: 30 90 365).")
+
+    def handle(self, *args, **options):
+        end = timezone.localdate()
+        for days in options['days']:
+            start = end - timedelta(days=days - 1)
+            warm_window(start, end)
+            self.stdout.write(f"{start} a {end}: {len(PERIODS)} dashboard(s) atualizados.")
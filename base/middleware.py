@@ -0,0 +1,152 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('base.profiling')
+
+_current = ContextVar('request_profile', default=None)
+TOP_QUERIES = 5
+SQL_PREVIEW = 300
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.rendered = None
+        self.queries = []
+        self.serialize = 0.0
+        self.serializing = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+    def timings(self, finished):
+        # tudo em ms; view inclui sql e serialização, render é a geração do corpo pelo renderer
+        view_end = self.view_finished or self.rendered or finished
+        return {
+            'sql': sum(duration for duration, _ in self.queries) * 1000,
+            'view': (view_end - self.view_started) * 1000 if self.view_started else 0.0,
+            'serialize': self.serialize * 1000,
+            'render': (self.rendered - self.view_finished) * 1000 if self.rendered and self.view_finished else 0.0,
+            'total': (finished - self.started) * 1000,
+        }
+
+    def top_queries(self):
+        slowest = sorted(self.queries, key=lambda query: query[0], reverse=True)[:TOP_QUERIES]
+        return [{'ms': round(duration * 1000, 2), 'sql': sql[:SQL_PREVIEW]} for duration, sql in slowest]
+
+def profile_serialization(to_representation, instance):
+    # chamado pelo CleanModelSerializer; só o objeto mais externo conta (os aninhados ja estão
+    # dentro dele). Sem profiling ativo no request é só a leitura da ContextVar.
+    profile = _current.get()
+    if profile is None or profile.serializing:
+        return to_representation(instance)
+    profile.serializing += 1
+    start = time.perf_counter()
+    try:
+        return to_representation(instance)
+    finally:
+        profile.serialize += time.perf_counter() - start
+        profile.serializing -= 1
+
+class RequestProfilingMiddleware:
+    # Opt-in (REQUEST_PROFILING = True). Desligado, o Django remove o middleware da cadeia
+    # (MiddlewareNotUsed) e nenhuma medição é feita.
+    # Ligado: header Server-Timing em toda resposta e, acima de REQUEST_PROFILING_SLOW_MS,
+    # uma linha JSON no logger 'base.profiling' para uma amostra (REQUEST_PROFILING_SAMPLE_RATE).
+    # Sync e async: sob ASGI as views async (api/async/...) não passam por sync_to_async por causa dele.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with self.wrap_queries(request, profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        # as connections são por thread: os wrappers entram (e saem) na thread sensivel do request,
+        # a mesma onde rodam o ORM async e os sync_to_async da view
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            stack = await sync_to_async(self.wrap_queries)(request, profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def wrap_queries(self, request, profile):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile.record_query))
+        request._profile = profile
+        return stack
+
+    def finish(self, request, response, profile):
+        timings = profile.timings(time.perf_counter())
+        response['Server-Timing'] = self.server_timing(profile, timings)
+        if timings['total'] >= self.slow_ms and random.random() < self.sample_rate:
+            self.log(request, response, profile, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # chamado depois da view e antes do render (Response do DRF é um SimpleTemplateResponse)
+        profile = request._profile
+        profile.view_finished = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: setattr(profile, 'rendered', time.perf_counter()))
+        return response
+
+    def server_timing(self, profile, timings):
+        metrics = [f'sql;dur={timings["sql"]:.2f};desc="{len(profile.queries)} queries"']
+        metrics += [f'{name};dur={timings[name]:.2f}' for name in ('view', 'serialize', 'render', 'total')]
+        return ', '.join(metrics)
+
+    def log(self, request, response, profile, timings):
+        match = request.resolver_match
+        # o DRF repassa o usuario autenticado (JWT) para o HttpRequest
+        user = getattr(request, 'user', None)
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'endpoint': match.view_name if match else request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'user_type': getattr(user, 'user_type', None) if user is not None and user.is_authenticated else 'anonymous',
+            'queries': len(profile.queries),
+            'timings_ms': {name: round(value, 2) for name, value in timings.items()},
+            'top_queries': profile.top_queries(),
+        }, ensure_ascii=False))
@@ -1,9 +1,13 @@
 from django.db import models
+from django.db.models import F, Sum, OuterRef, Subquery, DecimalField, Value
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 #DOCUMENTATION ABOUT ID'S
 import uuid
+import logging
 
 #DOCUMENTATION ABOUT USER'S
 
@@ -11,6 +15,8 @@ from django.contrib.auth.models import AbstractUser
 #aponta para o modelo correto de usuario
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 #PRODUCTS
 
 class BaseProduct(models.Model):
@@ -21,6 +27,8 @@ class BaseProduct(models.Model):
     slug = models.SlugField(unique=True, null=True, blank=True) 
     stock = models.PositiveIntegerField(default=0, null=True, blank=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # derivados redimensionados da foto, gerados em background (base/services/image_pipeline.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -42,6 +50,33 @@ class ProductVariation(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.name}: {self.value}"
 
+class ProductImageJob(models.Model):
+    # fila duravel de geração de derivados; gravada na transação do upload e drenada pelo run_image_worker
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('processing', 'Processando'),
+        ('done', 'Concluido'),
+        ('dead', 'Falha definitiva'),
+    ]
+    product = models.ForeignKey(BaseProduct, on_delete=models.CASCADE, related_name='image_jobs')
+    source = models.CharField(max_length=255)  # nome da foto original no storage
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    claim_token = models.UUIDField(null=True, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='image_job_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
 #USERS
 
 class Address(models.Model):
@@ -66,6 +101,7 @@ class BaseCustomUser(AbstractUser):
     email = models.EmailField(max_length=254, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     last_login_ip = models.GenericIPAddressField(null=True, blank=True)
+    birth_date = models.DateField(null=True, blank=True) # faixa etária nos dashboards do CRM
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'name']
 
@@ -83,38 +119,81 @@ class BaseCustomUser(AbstractUser):
 class UserSecurityProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='security_profile')
     is_2fa_enabled = models.BooleanField(default=False)
-    otp_code = models.CharField(max_length=6, blank=True, null=True)
-    otp_created_at = models.DateTimeField(blank=True, null=True)
-    reset_password_token = models.CharField(max_length=100, blank=True, null=True)
-    reset_password_expires = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return f"Security Profile for {self.user.email}"
 
+class SecurityToken(models.Model):
+    # codigos OTP e tokens de redefinição de senha (base/services/token_service.py).
+    # Só o HMAC do valor é gravado; expirados são removidos pelo purge_security_tokens.
+    PURPOSES = (
+        ('otp', 'Código 2FA'),
+        ('password_reset', 'Redefinição de senha'),
+    )
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='security_tokens')
+    purpose = models.CharField(max_length=20, choices=PURPOSES)
+    token_hash = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'purpose'])]
+
+    def __str__(self):
+        return f"{self.get_purpose_display()} de {self.user_id} até {self.expires_at}"
+
+# só na criação: o perfil é salvo por quem o altera, não a cada save do usuario
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_security_profile(sender, instance, created, **kwargs):
     if created:
         UserSecurityProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_security_profile(sender, instance, **kwargs):
-    if not hasattr(instance, 'security_profile'):
-        UserSecurityProfile.objects.create(user=instance)
-    else:
-        instance.security_profile.save()
-
 # ORDERS 
 
+def set_null_and_touch(collector, field, sub_objs, using):
+    # SET_NULL que também avança updated_at: a exportação incremental reenvia a linha sem a referencia
+    collector.add_field_update(field, None, sub_objs)
+    collector.add_field_update(field.model._meta.get_field('updated_at'), timezone.now(), sub_objs)
+
+def line_total_expression(prefix=''):
+    return F(f'{prefix}unit_price') * F(f'{prefix}quantity')
+
+class OrderQuerySet(models.QuerySet):
+    def with_items_total(self):
+        # soma das linhas calculada no banco, usada para conferir o total persistido
+        return self.annotate(items_total=Coalesce(
+            Sum(line_total_expression('items__'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)))
+
+    def refresh_totals(self):
+        # recalcula o total de todos os pedidos do queryset em um unico UPDATE
+        items_total = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            total=Sum(line_total_expression(), output_field=DecimalField(max_digits=12, decimal_places=2))
+        ).values('total')
+        # update() não passa pelo auto_now: updated_at vai explicito para a exportação incremental ver o novo total
+        return self.update(
+            total=Coalesce(Subquery(items_total), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            updated_at=timezone.now(),
+        )
+
 class Order(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    client = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    client = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=set_null_and_touch, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # total desnormalizado, mantido pelos itens do pedido (OrderItem.save/delete)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = OrderQuerySet.as_manager()
 
-    
     @property
     def get_total(self):
-        return sum(item.product.price * item.quantity for item in self.items.all())
+        return self.total
+
+    def recalculate_total(self):
+        Order.objects.filter(pk=self.pk).refresh_totals()
+        self.total, self.updated_at = Order.objects.values_list('total', 'updated_at').get(pk=self.pk)
+        return self.total
 
     @property
     def get_products_and_quantities(self): 
@@ -131,30 +210,123 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICE, default='pending')
     payment_status = models.BooleanField(default=False)
 
+    class Meta:
+        # indices compostos usados pela paginação por cursor (created_at, id)
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='order_client_created_id_idx'),
+            # exportação incremental (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='order_updated_id_idx'),
+        ]
+
+    # campos cujo valor carregado do banco fica guardado na instancia (change tracking sem re-consulta)
+    TRACKED_FIELDS = ('status', 'payment_status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # a releitura não passa pelo from_db desta instancia: os valores de referencia acompanham o banco
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {**getattr(self, '_loaded_values', {}), **{
+            name: getattr(self, name) for name in self.TRACKED_FIELDS
+            if name not in deferred and (fields is None or name in fields)
+        }}
+
+    def has_changed(self, field):
+        loaded = getattr(self, '_loaded_values', {})
+        return field in loaded and loaded[field] != getattr(self, field)
+
     def save(self, *args, **kwargs):
         is_new_order = self._state.adding
         was_paid = False
         if not is_new_order:
-            was_paid = Order.objects.get(pk=self.pk).payment_status
-            
+            loaded = getattr(self, '_loaded_values', {})
+            if 'payment_status' in loaded:
+                was_paid = loaded['payment_status']
+            else:
+                # instancia montada à mão ou com o campo adiado (.only/.defer): consulta o banco
+                was_paid = Order.objects.filter(pk=self.pk).values_list('payment_status', flat=True).first() or False
+
         super().save(*args, **kwargs)
-        try:
-            from base.signals import order_completed_signal
-            if self.payment_status and not was_paid:
-                order_total = self.get_total
-                order_completed_signal.send(
-                    sender=self.__class__,
-                    user_id=self.client.id if self.client else None,
-                    order_total=order_total,
-                    order_date=self.created_at
-                )
-        except Exception as e:
-             pass
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS if name not in deferred}
+        from base.signals import order_completed_signal
+        if self.payment_status and not was_paid:
+            # send_robust: falha de um modulo ouvinte (CRM, financeiro) não desfaz o pedido, mas é registrada
+            responses = order_completed_signal.send_robust(
+                sender=self.__class__,
+                user_id=self.client_id,
+                order_total=self.total,
+                order_date=self.created_at
+            )
+            for receiver_func, response in responses:
+                if isinstance(response, Exception):
+                    logger.error("Falha em %s ao processar o pedido pago %s: %r", receiver_func.__name__, self.pk, response)
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(BaseProduct, on_delete=models.CASCADE)
+    variation = models.ForeignKey(ProductVariation, on_delete=set_null_and_touch, null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
+    # preço unitario congelado no momento da compra
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # exportação incremental (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='orderitem_updated_id_idx'),
+        ]
+
+    @staticmethod
+    def resolve_unit_price(product, variation=None):
+        if variation is not None and variation.price_override is not None:
+            return variation.price_override
+        return product.price
+
+    @property
+    def line_total(self):
+        return (self.unit_price or 0) * self.quantity
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price_source = instance._price_source()
+        return instance
+
+    def _price_source(self):
+        # (produto, variação) que definiram o preço congelado; None se algum veio adiado (only/defer)
+        if 'product_id' in self.__dict__ and 'variation_id' in self.__dict__:
+            return (self.product_id, self.variation_id)
+        return None
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_price_source', None)
+        # trocar produto ou variação de um item existente congela o preço do novo par
+        if self.unit_price is None or (loaded is not None and loaded != self._price_source()):
+            self.unit_price = self.resolve_unit_price(self.product, self.variation)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'unit_price'}
+        super().save(*args, **kwargs)
+        self._loaded_price_source = self._price_source()
+        self.order.recalculate_total()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_price_source = self._price_source()
+
+    def delete(self, *args, **kwargs):
+        order = self.order
+        result = super().delete(*args, **kwargs)
+        order.recalculate_total()
+        return result
 
 #CART
 
@@ -239,25 +411,70 @@ class InventoryLog(models.Model):
     reason = models.CharField(max_length=200) 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True) 
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='invlog_created_id_idx'),
+        ]
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.variation:
-            target = self.variation
-        else:
-            target = self.product
-            
-        if self.type == 'IN':
-            target.stock += self.quantity
-        elif self.type == 'OUT':
-            target.stock = max(0, target.stock - self.quantity)
-        elif self.type == 'ADJUST':
-            target.stock = self.quantity 
-            pass
-        target.save() 
+    def save(self, *args, apply_stock=True, **kwargs):
+        from django.db import transaction
+        from base.services.stock_service import apply_movement
+        if not self._state.adding or not apply_stock:
+            return super().save(*args, **kwargs)
+        # movimento aplicado como UPDATE condicional; OUT sem estoque levanta InsufficientStock
+        with transaction.atomic():
+            apply_movement(self.product_id, self.type, self.quantity, variation_id=self.variation_id)
+            super().save(*args, **kwargs)
+            target = self.variation if self.variation_id else self.product
+            target.refresh_from_db(fields=['stock'])
     def __str__(self):
         return f"{self.type} - {self.product.name} ({self.quantity})"
     
+class StockReservation(models.Model):
+    # reserva temporaria: o estoque ja foi debitado e volta se a reserva expirar
+    product = models.ForeignKey(BaseProduct, on_delete=models.CASCADE, related_name='reservations')
+    variation = models.ForeignKey(ProductVariation, on_delete=models.CASCADE, null=True, blank=True)
+    cart = models.ForeignKey(Cart, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations')
+    # linha do carrinho dona da reserva: editar ou remover uma linha devolve só o que ela segurava
+    cart_item = models.ForeignKey(CartItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reserva {self.product_id} ({self.quantity}) até {self.expires_at}"
+
+# EMAIL
+
+class EmailOutbox(models.Model):
+    # fila duravel de emails; gravada na mesma transação da requisição e drenada pelo worker
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('sending', 'Enviando'),
+        ('sent', 'Enviado'),
+        ('dead', 'Falha definitiva'),
+    ]
+    to = models.EmailField(max_length=254)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    claim_token = models.UUIDField(null=True, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
+
 class FinancialTransaction(models.Model):
     TRANSACTION_TYPES = [
         ('INCOME', 'Receita'),
@@ -268,19 +485,68 @@ class FinancialTransaction(models.Model):
     description = models.CharField(max_length=200) 
     category = models.CharField(max_length=50, blank=True) 
     date = models.DateField(auto_now_add=True)
-    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
-    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True)
+    order = models.ForeignKey(Order, on_delete=set_null_and_touch, null=True, blank=True, related_name='transactions')
+    supplier = models.ForeignKey(Supplier, on_delete=set_null_and_touch, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    def __str__(self):
-        return f"{self.get_type_display()}: R$ {self.amount} - {self.description}"
-
-
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='fintx_date_id_idx'),
+            # exportação incremental (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='fintx_updated_id_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.get_type_display()}: R$ {self.amount} - {self.description}"
 
+class FinancialRollup(models.Model):
+    # totais pré-agregados por dia/mês, tipo e categoria; mantidos pelos sinais de FinancialTransaction
+    PERIOD_CHOICES = [
+        ('day', 'Diário'),
+        ('month', 'Mensal'),
+    ]
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    type = models.CharField(max_length=10, choices=FinancialTransaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=50, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'type', 'category'], name='unique_financial_rollup'),
+        ]
 
+    def __str__(self):
+        return f"{self.get_period_display()} {self.period_start} {self.type} {self.category}: R$ {self.total}"
+
+class ExportCheckpoint(models.Model):
+    # marca d'água da ultima exportação colunar de cada dataset/destino (runs incrementais)
+    dataset = models.CharField(max_length=50)
+    destination = models.CharField(max_length=500)
+    watermark = models.JSONField()
+    rows_exported = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'destination'], name='unique_export_checkpoint'),
+        ]
 
+    def __str__(self):
+        return f"{self.dataset} -> {self.destination}"
 
+class ExportTombstone(models.Model):
+    # linha apagada de um dataset exportado; vira o dataset 'deletions' para o destino colunar descartar o id
+    dataset = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.dataset}:{self.object_id}"
@@ -1,6 +1,158 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
-    max_page_size = 100 
\ No newline at end of file
+    max_page_size = 100 
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # paginate_queryset das views assincronas: COUNT e pagina lidos pelo ORM assincrono
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count é cached_property: preenchido aqui, o Paginator não volta ao banco
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+class KeysetPagination(BasePagination):
+    # Paginação por chave (keyset): a próxima pagina filtra pelos valores da ultima linha,
+    # sem COUNT(*) e sem OFFSET. A ordenação vem de view.cursor_ordering, ex: ('created_at', 'id'),
+    # e deve ter um indice composto correspondente.
+    cursor_query_param = 'cursor'
+    page_size = CustomPagination.page_size
+    page_size_query_param = CustomPagination.page_size_query_param
+    max_page_size = CustomPagination.max_page_size
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'cursor_ordering', ('created_at', 'id')))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, queryset, ordering, encoded):
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if len(raw) != len(ordering):
+                raise ValueError
+            fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in ordering]
+            return [field.to_python(value) for field, value in zip(fields, raw)]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def keyset_filter(self, ordering, values):
+        # (a, b) > (va, vb)  ==>  a > va OR (a = va AND b > vb)
+        condition = Q()
+        equal = Q()
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def page_queryset(self, queryset, request, view=None):
+        ordering = self.get_ordering(view)
+        self.request = request
+        self.ordering = ordering
+        self.page_size_value = self.get_page_size(request)
+        queryset = queryset.order_by(*ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.keyset_filter(ordering, self.decode_cursor(queryset, ordering, encoded)))
+        # busca uma linha a mais só para saber se existe proxima pagina
+        return queryset[:self.page_size_value + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.finish_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def finish_page(self, rows):
+        ordering = self.ordering
+        self.has_next = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        self.next_cursor = None
+        if self.has_next:
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor([getattr(last, name.lstrip('-')) for name in ordering])
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+class OptionalCursorPagination(BasePagination):
+    # paginação por pagina por padrão; ?cursor= (mesmo vazio) ativa o modo keyset
+    def __init__(self):
+        self.paginator = CustomPagination()
+
+    def select_paginator(self, request):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.paginator = KeysetPagination()
+        return self.paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.select_paginator(request).paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return await self.select_paginator(request).apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return self.paginator.get_schema_operation_parameters(view)
@@ -0,0 +1,197 @@
+import re
+import unicodedata
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+
+# BUSCA DE PRODUTOS
+# Backends plugaveis: SQLiteFTSBackend usa um indice FTS5 mantido pelos sinais de BaseProduct;
+# DatabaseSearchBackend é o fallback (icontains) para bancos sem FTS5.
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def normalize(text):
+    # minusculas e sem acentos, igual ao tokenizer unicode61 com remove_diacritics
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+def edit_distance(a, b, limit):
+    # Levenshtein com corte: retorna limit + 1 assim que a distancia passa do limite
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class SearchBackend:
+    fields = ('name', 'description')
+
+    def setup(self):
+        pass
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, queryset, query, fields=None, rank=True):
+        raise NotImplementedError("As subclasses devem implementar o método search")
+
+class DatabaseSearchBackend(SearchBackend):
+    def search(self, queryset, query, fields=None, rank=True):
+        condition = Q()
+        for term in query.split():
+            term_condition = Q()
+            for field in fields or self.fields:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        return queryset.filter(condition)
+
+class SQLiteFTSBackend(SearchBackend):
+    table = 'base_product_fts'
+    vocab_table = 'base_product_fts_vocab'
+    # pesos do bm25 por coluna: product_id, name, description
+    weights = (0.0, 10.0, 1.0)
+
+    @staticmethod
+    def rowid(product_id):
+        # rowid inteiro estavel derivado do UUID: remoção/atualização O(log n) sem tabela de mapeamento
+        if not isinstance(product_id, uuid.UUID):
+            product_id = uuid.UUID(str(product_id))
+        return product_id.int & ((1 << 63) - 1)
+
+    def setup(self):
+        # chamado no post_migrate: cria o indice e popula a partir dos produtos existentes
+        if self.table not in connection.introspection.table_names():
+            self.rebuild()
+
+    def create_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "product_id UNINDEXED, name, description, tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.vocab_table} USING fts5vocab({self.table}, 'row')")
+
+    def _execute(self, sql, params=(), many=False):
+        # cria o indice na primeira utilização (o projeto não usa migrations)
+        try:
+            return self._run(sql, params, many)
+        except OperationalError as e:
+            if 'no such table' not in str(e):
+                raise
+            self.create_tables()
+            self.rebuild()
+            return self._run(sql, params, many)
+
+    def _run(self, sql, params, many):
+        with connection.cursor() as cursor:
+            if many:
+                cursor.executemany(sql, params)
+                return []
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _row(self, product):
+        return (self.rowid(product.pk), product.pk.hex, product.name or '', strip_tags(product.description or ''))
+
+    def index(self, product):
+        self._execute(f"DELETE FROM {self.table} WHERE rowid = %s", [self.rowid(product.pk)])
+        self._execute(
+            f"INSERT INTO {self.table}(rowid, product_id, name, description) VALUES (%s, %s, %s, %s)",
+            self._row(product),
+        )
+
+    def remove(self, product_id):
+        self._execute(f"DELETE FROM {self.table} WHERE rowid = %s", [self.rowid(product_id)])
+
+    def rebuild(self, batch_size=2000):
+        from base.models import BaseProduct
+        self.create_tables()
+        # uma unica transação: em autocommit cada linha do executemany seria um commit (fsync) separado
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table}")
+            batch = []
+            for product in BaseProduct.objects.only('id', 'name', 'description').iterator(chunk_size=batch_size):
+                batch.append(self._row(product))
+                if len(batch) >= batch_size:
+                    self._run(f"INSERT INTO {self.table}(rowid, product_id, name, description) VALUES (%s, %s, %s, %s)", batch, True)
+                    batch = []
+            if batch:
+                self._run(f"INSERT INTO {self.table}(rowid, product_id, name, description) VALUES (%s, %s, %s, %s)", batch, True)
+
+    def similar_terms(self, term):
+        # tolerancia a erros de digitação: termos do vocabulario com mesma inicial e distancia pequena
+        if len(term) < 4:
+            return []
+        limit = 1 if len(term) < 8 else 2
+        if self._execute(f"SELECT 1 FROM {self.vocab_table} WHERE term = %s", [term]):
+            return []
+        rows = self._execute(
+            f"SELECT term, doc FROM {self.vocab_table} WHERE term >= %s AND term < %s",
+            [term[0], chr(ord(term[0]) + 1)],
+        )
+        candidates = [(doc, candidate) for candidate, doc in rows if edit_distance(term, candidate, limit) <= limit]
+        return [candidate for _, candidate in sorted(candidates, reverse=True)[:5]]
+
+    def build_match(self, query, fields=None):
+        terms = tokenize(query)
+        if not terms:
+            return None
+        clauses = []
+        for position, term in enumerate(terms):
+            options = [f'"{term}"'] + [f'"{similar}"' for similar in self.similar_terms(term)]
+            if position == len(terms) - 1:
+                # ultimo termo também casa por prefixo (busca enquanto digita)
+                options.append(f'"{term}"*')
+            clauses.append(f"({' OR '.join(options)})")
+        match = ' AND '.join(clauses)
+        if fields:
+            match = f"{{{' '.join(fields)}}} : ({match})"
+        return match
+
+    def search(self, queryset, query, fields=None, rank=True):
+        match = self.build_match(query, fields)
+        if not match:
+            return queryset.none()
+        if not rank:
+            return queryset.filter(pk__in=RawSQL(f"SELECT product_id FROM {self.table} WHERE {self.table} MATCH %s", [match]))
+        # join direto com o indice: o MATCH conduz a consulta e o produto é buscado pela PK.
+        # bm25: quanto menor, mais relevante
+        product_table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.extra(
+            tables=[self.table],
+            where=[f"{self.table}.product_id = {product_table}.id", f"{self.table} MATCH %s"],
+            params=[match],
+            select={'search_rank': f"bm25({self.table}, {weights})"},
+            order_by=['search_rank'],
+        )
+
+_backend = None
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        default = 'base.search.SQLiteFTSBackend' if connection.vendor == 'sqlite' else 'base.search.DatabaseSearchBackend'
+        _backend = import_string(getattr(settings, 'PRODUCT_SEARCH_BACKEND', default))()
+    return _backend
@@ -1,17 +1,84 @@
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from rest_framework import serializers
+from rest_framework.fields import Field, SkipField
+
+from .middleware import profile_serialization
+
+def is_empty_value(value):
+    return value is None or value == "" or value == 0 or value == [] or value == "0.00"
+
+# modos de leitura do plano de campos
+READ_ATTRIBUTE, READ_FK_ID, READ_FIELD = range(3)
 
 class CleanModelSerializer(serializers.ModelSerializer):
+    # omite chaves com None, "", 0, [] e "0.00" da representação
+    use_fast_representation = True
+
+    def _representation_plan(self):
+        # calculado uma vez por instancia do serializer; em listas o child é reutilizado por todas as linhas
+        plan = self.__dict__.get('_plan')
+        if plan is not None:
+            return plan
+        model = self.Meta.model
+        plan = []
+        for field in self._readable_fields:
+            mode, attr = READ_FIELD, None
+            attrs = field.source_attrs
+            if len(attrs) == 1:
+                if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                    try:
+                        model_field = model._meta.get_field(attrs[0])
+                    except FieldDoesNotExist:
+                        model_field = None
+                    if model_field is not None and model_field.many_to_one and model_field.concrete:
+                        mode, attr = READ_FK_ID, model_field.attname
+                elif type(field).get_attribute is Field.get_attribute:
+                    mode, attr = READ_ATTRIBUTE, attrs[0]
+            plan.append((field.field_name, mode, attr, field))
+        self._plan = plan
+        return plan
+
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
+        # tempo de serialização no Server-Timing quando o RequestProfilingMiddleware está ativo
+        return profile_serialization(self.clean_representation, instance)
+
+    def clean_representation(self, instance):
+        if not self.use_fast_representation:
+            representation = super().to_representation(instance)
+            return {key: value for key, value in representation.items() if not is_empty_value(value)}
+
+        # passada unica: lê o atributo, converte e já descarta valores vazios
         clean_representation = {}
-        for key, value in representation.items():
-            if value is not None and value != "" and value != 0 and value != [] and value != "0.00":
-                clean_representation[key] = value
-                
+        for name, mode, attr, field in self._representation_plan():
+            if mode != READ_FIELD:
+                try:
+                    attribute = getattr(instance, attr)
+                except (AttributeError, ObjectDoesNotExist):
+                    # ex: instancia é um dict; o caminho padrão do DRF trata esses casos
+                    mode = READ_FIELD
+                else:
+                    if mode == READ_FK_ID:
+                        # PrimaryKeyRelatedField sem pk_field representa a relação pela própria pk
+                        if not is_empty_value(attribute):
+                            clean_representation[name] = attribute
+                        continue
+                    if callable(attribute):
+                        mode = READ_FIELD
+            if mode == READ_FIELD:
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+            check_for_none = attribute.pk if isinstance(attribute, serializers.PKOnlyObject) else attribute
+            if check_for_none is None:
+                continue
+            value = field.to_representation(attribute)
+            if not is_empty_value(value):
+                clean_representation[name] = value
         return clean_representation
 
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .utils import SanitizedCharField, RichTextField
+from .utils import ImageSrcsetField, SanitizedCharField, RichTextField
 from .models import (
     BaseProduct, ProductVariation, Address, BaseCustomUser, Order, 
     OrderItem, CartItem, Cart, CRMTag, CRMInteraction, CustomerCRM, 
@@ -23,17 +90,20 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class ProductSerializer(CleanModelSerializer):
     name = SanitizedCharField(max_length=125)
     description = RichTextField(required=False, allow_blank=True)
+    image_srcset = ImageSrcsetField()
     class Meta:
         model = BaseProduct
-        fields = ['id', 'name', 'price', 'description', 'slug', 'image']
+        fields = ['id', 'name', 'price', 'description', 'slug', 'image', 'image_srcset']
 
 
 class ProductDetailSerializer(CleanModelSerializer):
     name = SanitizedCharField(max_length=125)
     description = RichTextField(required=False, allow_blank=True)
+    image_srcset = ImageSrcsetField()
     class Meta:
         model = BaseProduct
-        fields = '__all__'
+        # image_variants (nomes no storage) sai como image_srcset
+        exclude = ['image_variants']
 
 
 class SimpleProductSerializer(CleanModelSerializer):
@@ -71,7 +141,7 @@ class CustomUserSerializer(CleanModelSerializer):
     
     class Meta:
         model = BaseCustomUser
-        fields = ['username', 'email', 'name', 'phone', 'address', 'password']
+        fields = ['username', 'email', 'name', 'phone', 'birth_date', 'address', 'password']
         
         extra_kwargs = {
             'password': {'write_only': True}, 
@@ -92,11 +162,20 @@ class OrderItemSerializer(CleanModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_name', 'quantity']
+        fields = ['id', 'product', 'product_name', 'variation', 'quantity', 'unit_price']
+        read_only_fields = ['unit_price']
+
+    def validate(self, data):
+        # em PATCH o campo ausente vem da instancia
+        product = data['product'] if 'product' in data else getattr(self.instance, 'product', None)
+        variation = data['variation'] if 'variation' in data else getattr(self.instance, 'variation', None)
+        if variation is not None and product is not None and variation.product_id != product.pk:
+            raise serializers.ValidationError({'variation': "A variação não pertence ao produto."})
+        return data
 
 class OrderSerializer(CleanModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
-    total = serializers.ReadOnlyField(source='get_total')
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     class Meta:
         model = Order
         fields = ['id', 'client', 'status', 'payment_status', 'created_at', 'updated_at', 'items', 'total']
@@ -116,15 +195,7 @@ class CartItemSerializer(CleanModelSerializer):
         if value <= 0:
             raise serializers.ValidationError("A quantidade deve ser maior que zero.")
         return value
-
-    def validate(self, data):
-        product = data.get('product')
-        quantity = data.get('quantity')
-        
-        if product and quantity:
-            if product.stock is not None and quantity > product.stock:
-                 raise serializers.ValidationError(f"Estoque insuficiente. Restam apenas {product.stock} unidades.")
-        return data
+    # a disponibilidade de estoque é garantida pela reserva feita em CartItemViewSet
 
 class CartSerializer(CleanModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
@@ -186,3 +257,40 @@ class FinancialTransactionSerializer(CleanModelSerializer):
     class Meta:
         model = FinancialTransaction
         fields = '__all__'
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    period = serializers.ChoiceField(choices=['day', 'week', 'month'], default='month')
+    top = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, data):
+        # import local: o analytics_service carrega o numpy, desnecessario para os demais serializers
+        from .services.analytics_service import default_window
+        default_start, default_end = default_window()
+        data.setdefault('end', default_end)
+        data.setdefault('start', data['end'] - (default_end - default_start))
+        if data['start'] > data['end']:
+            raise serializers.ValidationError("A data inicial deve ser anterior à data final.")
+        return data
+
+class FinancialSummaryQuerySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    period = serializers.ChoiceField(choices=['day', 'month'], default='day')
+    category = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        if data['start'] > data['end']:
+            raise serializers.ValidationError("A data inicial deve ser anterior à data final.")
+        return data
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICE, required=False)
+    payment_status = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if 'status' not in data and 'payment_status' not in data:
+            raise serializers.ValidationError("Informe status e/ou payment_status.")
+        return data
@@ -0,0 +1,307 @@
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import CharField, DecimalField, F, IntegerField, Min, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round, Substr
+from django.utils import timezone
+
+from base.models import CustomerCRM, FinancialTransaction, Order, OrderItem
+
+# Os dashboards carregam colunas compactas (datas, códigos, centavos) uma vez por janela,
+# calculam todas as seções com NumPy e guardam o resultado no cache; cada endpoint lê a sua seção.
+# O comando warm_analytics recalcula as janelas padrão para que o painel sempre encontre o cache quente.
+ANALYTICS_CACHE_PREFIX = 'analytics:'
+LOAD_CHUNK_SIZE = 50_000
+MAX_TOP_PRODUCTS = 100
+PERIODS = ('day', 'week', 'month')
+STATUSES = [code for code, _ in Order.STATUS_CHOICE]
+TRANSACTION_TYPES = [code for code, _ in FinancialTransaction.TRANSACTION_TYPES]
+AGE_BANDS = [0, 18, 25, 35, 45, 55, 65]
+LTV_BANDS = [0, 100, 500, 1000, 5000]  # em reais
+
+def cache_ttl():
+    return getattr(settings, 'ANALYTICS_CACHE_TTL', 600)
+
+def default_window():
+    end = timezone.localdate()
+    return end - timedelta(days=364), end
+
+def _day_range(start, end):
+    # limites em datetime (meia-noite local) para usar o indice de created_at
+    tz = timezone.get_current_timezone()
+    return (datetime.combine(start, time.min, tzinfo=tz),
+            datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz))
+
+def _cents(field):
+    return Cast(Round(F(field) * 100), IntegerField())
+
+def _text(field, length=None):
+    # colunas lidas como texto/inteiro não passam pelos conversores do Django linha a linha;
+    # datas e UUIDs são convertidos de uma vez pelo NumPy
+    value = Cast(field, CharField())
+    if length:
+        value = Substr(value, 1, length)
+    return Coalesce(value, Value(''))
+
+def _money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+def _load(queryset, columns):
+    # columns: [(expressão, dtype)]; cursor cru em blocos: sem conversores por linha e sem manter
+    # todas as tuplas do banco em memoria
+    names = [f'c{i}' for i in range(len(columns))]
+    queryset = queryset.order_by().annotate(**{name: expression for name, (expression, _) in zip(names, columns)})
+    sql, params = queryset.values_list(*names).query.sql_with_params()
+    parts = [[] for _ in columns]
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            for part, (_, dtype), values in zip(parts, columns, zip(*chunk)):
+                part.append(np.array(values, dtype=dtype))
+    return [np.concatenate(part) if part else np.empty(0, dtype=dtype)
+            for part, (_, dtype) in zip(parts, columns)]
+
+def _codes(values, choices):
+    codes = np.full(len(values), -1, dtype=np.int8)
+    for i, choice in enumerate(choices):
+        codes[values == choice] = i
+    return codes
+
+def _local_days(moments):
+    # UTC -> data local; o offset do fuso é calculado uma vez por hora distinta, não por linha
+    if not len(moments):
+        return moments.astype('datetime64[D]')
+    tz = timezone.get_current_timezone()
+    hours, inverse = np.unique(moments.astype('datetime64[h]'), return_inverse=True)
+    offsets = np.array([
+        int(hour.item().replace(tzinfo=dt_timezone.utc).astimezone(tz).utcoffset().total_seconds())
+        for hour in hours
+    ], dtype=np.int64)
+    return (moments + offsets[inverse].astype('timedelta64[s]')).astype('datetime64[D]')
+
+def _bucket(days, period):
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    if period == 'week':
+        # 1970-01-01 foi quinta-feira: desloca para a segunda-feira da semana
+        return days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    return days
+
+def _axis(start, end, period):
+    first, last = _bucket(np.array([start, end], dtype='datetime64[D]'), period)
+    if period == 'month':
+        return np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1).astype('datetime64[D]')
+    return np.arange(first, last + 1, 7 if period == 'week' else 1)
+
+def _per_period(axis, buckets, weights=None):
+    index = np.searchsorted(axis, buckets)
+    return np.bincount(index, weights=weights, minlength=len(axis))[:len(axis)]
+
+def _dates(array):
+    return [day.item() for day in array]
+
+class SalesFrame:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        since, until = _day_range(start, end)
+        self.orders = Order.objects.filter(created_at__gte=since, created_at__lt=until)
+        created, client, status, self.order_total, paid = _load(self.orders, [
+            (_text('created_at', 19), 'datetime64[s]'),
+            (_text('client_id'), np.str_),
+            (_text('status'), np.str_),
+            (_cents('total'), np.int64),
+            (Cast('payment_status', IntegerField()), np.bool_),
+        ])
+        self.order_day = _local_days(created)
+        self.order_status = _codes(status, STATUSES)
+        self.order_paid = paid
+        # clientes viram inteiros densos; -1 = pedido sem cliente
+        self.client_keys, self.order_client = np.unique(client, return_inverse=True)
+        self.order_client = self.order_client.astype(np.int64)
+        if len(self.client_keys) and self.client_keys[0] == '':
+            self.client_keys = self.client_keys[1:]
+            self.order_client -= 1
+
+        transactions = FinancialTransaction.objects.filter(date__range=(start, end))
+        self.tx_day, tx_type, self.tx_amount = _load(transactions, [
+            (_text('date'), 'datetime64[D]'),
+            (_text('type'), np.str_),
+            (_cents('amount'), np.int64),
+        ])
+        self.tx_type = _codes(tx_type, TRANSACTION_TYPES)
+
+        # primeira compra de cada cliente do periodo (histórico completo), base das coortes
+        first_client, first_at = _load(
+            Order.objects.filter(client_id__in=self.orders.values('client_id'))
+            .values('client_id').annotate(first=Min('created_at')),
+            [(_text('client_id'), np.str_), (Substr(Cast('first', CharField()), 1, 19), 'datetime64[s]')],
+        )
+        self.client_first = np.full(len(self.client_keys), np.datetime64('NaT'), dtype='datetime64[D]')
+        if len(first_client):
+            self.client_first[np.searchsorted(self.client_keys, first_client)] = _local_days(first_at)
+
+    @property
+    def revenue_mask(self):
+        return self.order_paid & (self.order_status != STATUSES.index('canceled'))
+
+    def revenue(self, period):
+        axis = _axis(self.start, self.end, period)
+        paid = self.revenue_mask
+        buckets = _bucket(self.order_day[paid], period)
+        tx_buckets = _bucket(self.tx_day, period)
+        income = self.tx_type == TRANSACTION_TYPES.index('INCOME')
+        revenue = _per_period(axis, buckets, self.order_total[paid].astype(np.float64))
+        orders = _per_period(axis, buckets)
+        income_total = _per_period(axis, tx_buckets[income], self.tx_amount[income].astype(np.float64))
+        expense_total = _per_period(axis, tx_buckets[~income], self.tx_amount[~income].astype(np.float64))
+        return [
+            {
+                'period_start': day,
+                'revenue': _money(revenue[i]),
+                'orders': int(orders[i]),
+                'average_ticket': _money(revenue[i] // orders[i]) if orders[i] else Decimal('0.00'),
+                'income': _money(income_total[i]),
+                'expense': _money(expense_total[i]),
+            }
+            for i, day in enumerate(_dates(axis))
+        ]
+
+    def top_products(self, limit=MAX_TOP_PRODUCTS):
+        # agregado por produto no banco: o volume lido depende do catalogo, não do numero de linhas de pedido
+        lines = (OrderItem.objects.filter(order__in=self.orders.filter(payment_status=True).exclude(status='canceled'))
+                 .order_by().values('product_id'))
+        product, name, revenue, quantity = _load(
+            lines.annotate(revenue=Sum(F('unit_price') * F('quantity'), output_field=DecimalField()),
+                           quantity_sum=Sum('quantity')),
+            [(_text('product_id'), np.str_), (_text('product__name'), np.str_),
+             (Cast(Round(F('revenue') * 100), IntegerField()), np.int64), (F('quantity_sum'), np.int64)],
+        )
+        top = np.lexsort((product, -revenue))[:limit]
+        return [
+            {
+                'product': str(uuid.UUID(product[i])),
+                'name': str(name[i]),
+                'revenue': _money(revenue[i]),
+                'quantity': int(quantity[i]),
+            }
+            for i in top
+        ]
+
+    def orders_by_status(self):
+        counts = np.bincount(self.order_status, minlength=len(STATUSES))
+        totals = np.bincount(self.order_status, weights=self.order_total.astype(np.float64), minlength=len(STATUSES))
+        labels = dict(Order.STATUS_CHOICE)
+        return [
+            {'status': code, 'label': labels[code], 'orders': int(counts[i]), 'total': _money(totals[i])}
+            for i, code in enumerate(STATUSES)
+        ]
+
+    def cohorts(self):
+        # coorte = mês da primeira compra; retenção = clientes da coorte que compraram k meses depois
+        window_start = np.datetime64(self.start, 'M')
+        cohort_month = self.client_first.astype('datetime64[M]')
+        in_window = ~np.isnat(self.client_first) & (cohort_month >= window_start)
+        months = np.arange(window_start, np.datetime64(self.end, 'M') + 1)
+        if not in_window.any():
+            return []
+
+        has_client = self.order_client >= 0
+        clients = self.order_client[has_client]
+        order_month = self.order_day[has_client].astype('datetime64[M]')
+        keep = in_window[clients]
+        clients, order_month = clients[keep], order_month[keep]
+        offset = (order_month - cohort_month[clients]).astype(np.int64)
+
+        # pares (cliente, mês) distintos antes de contar
+        width = len(months)
+        pairs = np.unique(clients * width + offset)
+        pair_clients, pair_offsets = pairs // width, pairs % width
+        pair_cohorts = (cohort_month[pair_clients] - window_start).astype(np.int64)
+        active = np.zeros((width, width), dtype=np.int64)
+        np.add.at(active, (pair_cohorts, pair_offsets), 1)
+        sizes = np.bincount((cohort_month[in_window] - window_start).astype(np.int64), minlength=width)
+
+        result = []
+        for i, month in enumerate(_dates(months.astype('datetime64[D]'))):
+            if not sizes[i]:
+                continue
+            horizon = width - i
+            result.append({
+                'cohort': month,
+                'customers': int(sizes[i]),
+                'retention': [round(float(active[i, k]) / sizes[i], 4) for k in range(horizon)],
+            })
+        return result
+
+def customer_distribution():
+    # pirâmide: faixas etárias x faixas de LTV a partir do CRM (retrato atual, não depende da janela)
+    birth, ltv = _load(CustomerCRM.objects.all(), [
+        (_text('user__birth_date'), 'datetime64[D]'),
+        (_cents('lifetime_value'), np.int64),
+    ])
+    today = np.datetime64(timezone.localdate(), 'D')
+    known = ~np.isnat(birth)
+    ages = np.zeros(len(birth), dtype=np.int64)
+    ages[known] = ((today - birth[known]).astype(np.int64) // 365.25).astype(np.int64)
+    age_band = np.where(known, np.digitize(ages, AGE_BANDS) - 1, len(AGE_BANDS))
+    ltv_band = np.digitize(ltv, [band * 100 for band in LTV_BANDS]) - 1
+    ltv_band = np.clip(ltv_band, 0, len(LTV_BANDS) - 1)
+
+    bands = len(AGE_BANDS) + 1
+    matrix = np.zeros((bands, len(LTV_BANDS)), dtype=np.int64)
+    np.add.at(matrix, (age_band, ltv_band), 1)
+    customers = np.bincount(age_band, minlength=bands)
+    totals = np.bincount(age_band, weights=ltv.astype(np.float64), minlength=bands)
+
+    ltv_labels = [
+        f"R${low}-{high}" for low, high in zip(LTV_BANDS, LTV_BANDS[1:])
+    ] + [f"R${LTV_BANDS[-1]}+"]
+    age_labels = [
+        f"{low}-{high - 1}" for low, high in zip(AGE_BANDS, AGE_BANDS[1:])
+    ] + [f"{AGE_BANDS[-1]}+", 'desconhecida']
+    return {
+        'ltv_bands': ltv_labels,
+        'age_bands': [
+            {
+                'age': age_labels[i],
+                'customers': int(customers[i]),
+                'lifetime_value': _money(totals[i]),
+                'average_ltv': _money(totals[i] // customers[i]) if customers[i] else Decimal('0.00'),
+                'by_ltv': [int(count) for count in matrix[i]],
+            }
+            for i in range(bands)
+        ],
+    }
+
+def dashboard_key(start, end, period):
+    return f"{ANALYTICS_CACHE_PREFIX}{start.isoformat()}:{end.isoformat()}:{period}"
+
+def warm_window(start, end):
+    # uma carga de colunas serve todos os periodos da janela
+    frame = SalesFrame(start, end)
+    shared = {
+        'start': start,
+        'end': end,
+        'top_products': frame.top_products(),
+        'orders_by_status': frame.orders_by_status(),
+        'cohorts': frame.cohorts(),
+        'customers': customer_distribution(),
+    }
+    dashboards = {period: {**shared, 'period': period, 'revenue': frame.revenue(period)} for period in PERIODS}
+    cache.set_many({dashboard_key(start, end, period): data for period, data in dashboards.items()}, cache_ttl())
+    return dashboards
+
+def dashboard(start, end, period='month'):
+    data = cache.get(dashboard_key(start, end, period))
+    if data is None:
+        data = warm_window(start, end)[period]
+    return data
@@ -0,0 +1,66 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from base.models import Cart, CartItem, InventoryLog, Order, OrderItem, StockReservation
+from base.services.stock_service import adjust_products
+
+class CheckoutError(Exception):
+    pass
+
+class EmptyCart(CheckoutError):
+    def __init__(self):
+        super().__init__("O carrinho está vazio.")
+
+class CheckoutConflict(CheckoutError):
+    # o carrinho ou as reservas mudaram durante o checkout (outro request, expiração); nada foi gravado
+    def __init__(self):
+        super().__init__("O carrinho foi alterado durante o checkout. Tente novamente.")
+
+def checkout(user):
+    # Converte o carrinho do usuario em pedido numa unica transação, com numero fixo de consultas:
+    # itens com preço congelado em um INSERT, estoque em um UPDATE condicional, carrinho esvaziado.
+    # O estoque ja debitado pelas reservas do carrinho é aproveitado; só a diferença é debitada.
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().filter(user=user).first()
+        if cart is None:
+            raise EmptyCart()
+        items = list(CartItem.objects.filter(cart=cart).select_related('product'))
+        if not items:
+            raise EmptyCart()
+        reservations = list(StockReservation.objects.select_for_update().filter(cart=cart)
+                            .values_list('pk', 'product_id', 'quantity'))
+
+        wanted = defaultdict(int)
+        for item in items:
+            wanted[item.product_id] += item.quantity
+        deltas = dict(wanted)
+        for _, product_id, quantity in reservations:
+            deltas[product_id] = deltas.get(product_id, 0) - quantity
+
+        if reservations:
+            deleted, _ = StockReservation.objects.filter(pk__in=[pk for pk, _, _ in reservations]).delete()
+            if deleted != len(reservations):
+                # uma reserva expirou e ja devolveu o estoque entre a leitura e o delete
+                raise CheckoutConflict()
+        adjust_products(deltas)
+
+        total = sum((item.product.price * item.quantity for item in items), Decimal('0.00'))
+        order = Order.objects.create(client=user, total=total)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=item.product, quantity=item.quantity, unit_price=item.product.price)
+            for item in items
+        )
+        # saida definitiva no historico (o estoque ja foi ajustado acima)
+        InventoryLog.objects.bulk_create(
+            InventoryLog(product_id=product_id, type='OUT', quantity=quantity,
+                         reason=f"Checkout do pedido {order.pk}", user=user)
+            for product_id, quantity in wanted.items()
+        )
+        # delete() do queryset: SET_NULL das reservas e post_delete (snapshot do carrinho, uma
+        # consulta por carrinho) com numero fixo de consultas, qualquer que seja o tamanho do carrinho
+        _, removed = CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+        if removed.get(CartItem._meta.label, 0) != len(items):
+            raise CheckoutConflict()
+    return order
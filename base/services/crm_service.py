@@ -0,0 +1,62 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateTimeField, DecimalField, F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from base.models import BaseCustomUser, CustomerCRM, Order
+
+def coalesce_payments(payments):
+    # (user_id, total, data) -> um acumulado por cliente
+    per_user = defaultdict(lambda: [0, Decimal('0.00'), None])
+    for user_id, order_total, order_date in payments:
+        if not user_id:
+            continue
+        metrics = per_user[user_id]
+        metrics[0] += 1
+        metrics[1] += Decimal(order_total or 0)
+        if order_date and (metrics[2] is None or order_date > metrics[2]):
+            metrics[2] = order_date
+    return per_user
+
+def _increment(user_id, count, total, last_date):
+    updates = {
+        'total_orders_count': F('total_orders_count') + count,
+        'lifetime_value': F('lifetime_value') + total,
+    }
+    if last_date is not None:
+        # Greatest com NULL devolve NULL no SQLite: Coalesce garante a comparação
+        updates['last_purchase_date'] = Greatest(
+            Coalesce('last_purchase_date', Value(last_date), output_field=DateTimeField()),
+            Value(last_date), output_field=DateTimeField())
+    return CustomerCRM.objects.filter(user_id=user_id).update(**updates)
+
+def apply_payments(payments):
+    # incrementos atomicos no banco: pagamentos concorrentes nunca se sobrescrevem
+    per_user = coalesce_payments(payments)
+    if not per_user:
+        return 0
+    with transaction.atomic():
+        # garante os perfis num unico INSERT (ON CONFLICT DO NOTHING) e depois incrementa
+        CustomerCRM.objects.bulk_create([CustomerCRM(user_id=user_id) for user_id in per_user], ignore_conflicts=True)
+        for user_id, (count, total, last_date) in per_user.items():
+            _increment(user_id, count, total, last_date)
+    return len(per_user)
+
+def rebuild_metrics():
+    # recalcula tudo a partir dos pedidos pagos: um INSERT para perfis faltantes e um UPDATE com subconsultas
+    paid = Order.objects.filter(payment_status=True, client__isnull=False)
+    missing = BaseCustomUser.objects.filter(
+        pk__in=paid.values('client_id'), crm_profile__isnull=True).values_list('pk', flat=True)
+    CustomerCRM.objects.bulk_create([CustomerCRM(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+
+    per_client = paid.filter(client_id=OuterRef('user_id')).order_by().values('client_id')
+    return CustomerCRM.objects.update(
+        total_orders_count=Coalesce(
+            Subquery(per_client.annotate(n=Count('pk')).values('n')), Value(0), output_field=IntegerField()),
+        lifetime_value=Coalesce(
+            Subquery(per_client.annotate(s=Sum('total')).values('s')), Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)),
+        last_purchase_date=Subquery(per_client.annotate(d=Max('created_at')).values('d')),
+    )
@@ -1,10 +1,13 @@
 from django.conf import settings
 from .resend_service import ResendEmailService
+from .fake_service import FakeEmailService
 
 def get_email_service():
     service_name = getattr(settings, 'EMAIL_SERVICE', 'resend').lower()
     
     if service_name == 'resend':
         return ResendEmailService()
+    elif service_name == 'fake':
+        return FakeEmailService()
     else:
         raise ValueError(f"Serviço de e-mail {service_name} não configurado.")
\ No newline at end of file
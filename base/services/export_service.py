@@ -0,0 +1,298 @@
+import base64
+import io
+import json
+import os
+import queue
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+from base.models import ExportCheckpoint, ExportTombstone, FinancialTransaction, InventoryLog, Order, OrderItem
+
+DEFAULT_BATCH_SIZE = 10_000
+FORMATS = ('parquet', 'lance')
+_END = object()
+
+class ExportError(Exception):
+    pass
+
+def _text(value):
+    return None if value is None else str(value)
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+class ExportSpec:
+    # columns: [(campo, tipo arrow, conversor opcional)]; cursor: colunas monotônicas usadas na marca d'água
+    def __init__(self, model, columns, cursor):
+        self.model = model
+        self.columns = columns
+        self.cursor = cursor
+        self.fields = [name for name, _, _ in columns]
+        self.schema = pa.schema([pa.field(name, arrow_type) for name, arrow_type, _ in columns])
+
+    def to_batch(self, rows):
+        arrays = []
+        for (name, arrow_type, convert), values in zip(self.columns, zip(*rows)):
+            if convert is not None:
+                values = [convert(value) for value in values]
+            arrays.append(pa.array(values, type=arrow_type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+# Tabelas editaveis usam o cursor (updated_at, id): uma linha alterada volta na proxima exportação
+# e o destino fica com a versão de maior updated_at de cada id. Linhas apagadas viram registros do
+# dataset 'deletions' (ExportTombstone), que o destino aplica removendo o object_id do dataset.
+# inventory_logs é só de inserção (a API é somente leitura), então o cursor é o id.
+DATASETS = {
+    'orders': ExportSpec(Order, [
+        ('id', pa.string(), _text),
+        ('client_id', pa.string(), _text),
+        ('status', pa.string(), None),
+        ('payment_status', pa.bool_(), None),
+        ('total', pa.decimal128(12, 2), None),
+        ('created_at', TIMESTAMP, None),
+        ('updated_at', TIMESTAMP, None),
+    ], cursor=('updated_at', 'id')),
+    'order_items': ExportSpec(OrderItem, [
+        ('id', pa.int64(), None),
+        ('order_id', pa.string(), _text),
+        ('product_id', pa.string(), _text),
+        ('variation_id', pa.int64(), None),
+        ('quantity', pa.int64(), None),
+        ('unit_price', pa.decimal128(10, 2), None),
+        ('updated_at', TIMESTAMP, None),
+    ], cursor=('updated_at', 'id')),
+    'inventory_logs': ExportSpec(InventoryLog, [
+        ('id', pa.int64(), None),
+        ('product_id', pa.string(), _text),
+        ('variation_id', pa.int64(), None),
+        ('type', pa.string(), None),
+        ('quantity', pa.int64(), None),
+        ('reason', pa.string(), None),
+        ('user_id', pa.string(), _text),
+        ('created_at', TIMESTAMP, None),
+    ], cursor=('id',)),
+    'financial_transactions': ExportSpec(FinancialTransaction, [
+        ('id', pa.int64(), None),
+        ('type', pa.string(), None),
+        ('amount', pa.decimal128(12, 2), None),
+        ('description', pa.string(), None),
+        ('category', pa.string(), None),
+        ('date', pa.date32(), None),
+        ('order_id', pa.string(), _text),
+        ('supplier_id', pa.int64(), None),
+        ('created_at', TIMESTAMP, None),
+        ('updated_at', TIMESTAMP, None),
+    ], cursor=('updated_at', 'id')),
+    'deletions': ExportSpec(ExportTombstone, [
+        ('id', pa.int64(), None),
+        ('dataset', pa.string(), None),
+        ('object_id', pa.string(), None),
+        ('deleted_at', TIMESTAMP, None),
+    ], cursor=('deleted_at', 'id')),
+}
+
+def get_spec(name):
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ExportError(f"Dataset desconhecido: {name}")
+
+def dump_watermark(values):
+    return json.loads(json.dumps(values, default=str))
+
+def load_watermark(spec, raw):
+    try:
+        if len(raw) != len(spec.cursor):
+            raise ValueError
+        fields = [spec.model._meta.get_field(name) for name in spec.cursor]
+        return [field.to_python(value) for field, value in zip(fields, raw)]
+    except (TypeError, ValueError, DjangoValidationError):
+        raise ExportError("Marca d'água inválida.")
+
+def encode_watermark(values):
+    raw = json.dumps(dump_watermark(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_watermark(spec, encoded):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+    except (TypeError, ValueError):
+        raise ExportError("Marca d'água inválida.")
+    return load_watermark(spec, raw)
+
+def _after(cursor, values):
+    # (a, b) > (va, vb)  ==>  a > va OR (a = va AND b > vb)
+    condition = Q()
+    equal = Q()
+    for name, value in zip(cursor, values):
+        condition |= equal & Q(**{f'{name}__gt': value})
+        equal &= Q(**{name: value})
+    return condition
+
+def high_watermark(spec):
+    # fixada antes de ler: linhas gravadas durante a exportação ficam para o proximo run
+    row = (spec.model.objects.order_by(*[f'-{name}' for name in spec.cursor])
+           .values_list(*spec.cursor).first())
+    return list(row) if row is not None else None
+
+def iter_batches(spec, since=None, until=None, batch_size=DEFAULT_BATCH_SIZE):
+    queryset = spec.model.objects.order_by(*spec.cursor)
+    if since is not None:
+        queryset = queryset.filter(_after(spec.cursor, since))
+    if until is not None:
+        queryset = queryset.exclude(_after(spec.cursor, until))
+    # iterator(): cursor do lado do servidor (PostgreSQL) / fetchmany; só um lote fica em memoria
+    rows = queryset.values_list(*spec.fields).iterator(chunk_size=batch_size)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return
+        yield spec.to_batch(chunk)
+
+def _counted(batches, counter):
+    for batch in batches:
+        counter[0] += batch.num_rows
+        yield batch
+
+def write_parquet(spec, batches, directory, overwrite=False):
+    # cada run vira um arquivo novo do dataset; o .tmp evita arquivos parciais visiveis para leitores
+    os.makedirs(directory, exist_ok=True)
+    previous = [entry for entry in os.listdir(directory) if entry.endswith('.parquet')] if overwrite else []
+    name = f"part-{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(directory, name)
+    counter = [0]
+    try:
+        with pq.ParquetWriter(path + '.tmp', spec.schema, compression='zstd') as writer:
+            for batch in _counted(batches, counter):
+                writer.write_batch(batch)
+    except BaseException:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+    if not counter[0]:
+        os.remove(path + '.tmp')
+        return 0
+    os.replace(path + '.tmp', path)
+    for entry in previous:
+        os.remove(os.path.join(directory, entry))
+    return counter[0]
+
+def write_lance(spec, batches, uri, overwrite=False):
+    try:
+        import lance
+    except ImportError:
+        raise ExportError("pylance não está instalado; use --format parquet.")
+    if not os.path.exists(uri):
+        mode = 'create'
+    else:
+        mode = 'overwrite' if overwrite else 'append'
+
+    # o Lance consome o reader numa thread própria; as leituras do banco continuam nesta thread
+    # (a conexão do Django é por thread) e a fila limitada mantém no maximo dois lotes em memoria
+    pending = queue.Queue(maxsize=2)
+
+    def consume():
+        def drain():
+            while True:
+                item = pending.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        reader = pa.RecordBatchReader.from_batches(spec.schema, drain())
+        # o commit da versão do Lance é atomico: uma falha no meio não deixa dados pela metade
+        lance.write_dataset(reader, uri, schema=spec.schema, mode=mode)
+
+    def put(item):
+        while True:
+            try:
+                pending.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if writer.done():
+                    writer.result()
+                    return
+
+    rows = 0
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        writer = pool.submit(consume)
+        try:
+            for batch in batches:
+                put(batch)
+                rows += batch.num_rows
+        except BaseException as e:
+            put(ExportError(f"Exportação interrompida: {e!r}"))
+            raise
+        put(_END)
+        writer.result()
+    return rows
+
+def export_dataset(name, output_dir, fmt='parquet', incremental=True, batch_size=DEFAULT_BATCH_SIZE):
+    if fmt not in FORMATS:
+        raise ExportError(f"Formato desconhecido: {fmt}")
+    spec = get_spec(name)
+    target = os.path.abspath(os.path.join(output_dir, name if fmt == 'parquet' else f'{name}.lance'))
+    checkpoint = None
+    if incremental:
+        checkpoint = ExportCheckpoint.objects.filter(dataset=name, destination=target).first()
+    since = load_watermark(spec, checkpoint.watermark) if checkpoint else None
+    until = high_watermark(spec)
+    result = {'dataset': name, 'path': target, 'rows': 0}
+    if until is None or until == since:
+        return result
+
+    batches = iter_batches(spec, since=since, until=until, batch_size=batch_size)
+    writer = write_parquet if fmt == 'parquet' else write_lance
+    # sem checkpoint (run completo) o destino é reescrito em vez de receber duplicatas
+    result['rows'] = writer(spec, batches, target, overwrite=since is None)
+
+    # a marca d'água só avança depois que os dados foram gravados
+    ExportCheckpoint.objects.update_or_create(
+        dataset=name, destination=target,
+        defaults={
+            'watermark': dump_watermark(until),
+            'rows_exported': (checkpoint.rows_exported if checkpoint else 0) + result['rows'],
+        },
+    )
+    return result
+
+class _StreamSink(io.RawIOBase):
+    # destino só de escrita para o ParquetWriter; os bytes são drenados a cada lote
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def stream_parquet(spec, since=None, until=None, batch_size=DEFAULT_BATCH_SIZE):
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, spec.schema, compression='zstd')
+    for batch in iter_batches(spec, since=since, until=until, batch_size=batch_size):
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,17 @@
+from .email_service import EmailService
+
+class FakeEmailService(EmailService):
+    # serviço local para testes e desenvolvimento: guarda as mensagens em memória
+    sent = []
+    fail_for = set()
+
+    def send_email(self, to: str, subject: str, body: str) -> bool:
+        if to in self.fail_for:
+            raise ConnectionError(f"Falha simulada ao enviar para {to}")
+        self.sent.append({'to': to, 'subject': subject, 'body': body})
+        return True
+
+    @classmethod
+    def reset(cls):
+        cls.sent.clear()
+        cls.fail_for.clear()
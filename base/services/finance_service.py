@@ -0,0 +1,105 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from base.models import FinancialRollup, FinancialTransaction
+
+PERIODS = ('day', 'month')
+
+def period_start(period, day):
+    return day.replace(day=1) if period == 'month' else day
+
+def apply_to_rollups(changes):
+    # changes: [(type, category, date, amount_delta, count_delta)]; agrupa antes de tocar o banco
+    grouped = defaultdict(lambda: [Decimal('0.00'), 0])
+    for tx_type, category, day, amount, count in changes:
+        for period in PERIODS:
+            key = (period, period_start(period, day), tx_type, category or '')
+            grouped[key][0] += Decimal(amount)
+            grouped[key][1] += count
+    if not grouped:
+        return
+    with transaction.atomic():
+        FinancialRollup.objects.bulk_create([
+            FinancialRollup(period=period, period_start=start, type=tx_type, category=category)
+            for period, start, tx_type, category in grouped
+        ], ignore_conflicts=True)
+        for (period, start, tx_type, category), (amount, count) in grouped.items():
+            FinancialRollup.objects.filter(
+                period=period, period_start=start, type=tx_type, category=category,
+            ).update(total=F('total') + amount, count=F('count') + count)
+
+def rebuild_rollups():
+    # backfill: dois GROUP BY sobre as transações e um INSERT em lote por periodo
+    with transaction.atomic():
+        FinancialRollup.objects.all().delete()
+        daily = (FinancialTransaction.objects.order_by()
+                 .values('date', 'type', 'category')
+                 .annotate(total=Sum('amount'), count=Count('pk')))
+        FinancialRollup.objects.bulk_create((
+            FinancialRollup(period='day', period_start=row['date'], type=row['type'],
+                            category=row['category'], total=row['total'], count=row['count'])
+            for row in daily.iterator()
+        ), batch_size=1000)
+        monthly = (FinancialTransaction.objects.order_by()
+                   .annotate(month=TruncMonth('date'))
+                   .values('month', 'type', 'category')
+                   .annotate(total=Sum('amount'), count=Count('pk')))
+        FinancialRollup.objects.bulk_create((
+            FinancialRollup(period='month', period_start=row['month'], type=row['type'],
+                            category=row['category'], total=row['total'], count=row['count'])
+            for row in monthly.iterator()
+        ), batch_size=1000)
+    return FinancialRollup.objects.count()
+
+def summary(start, end, period='day', category=None):
+    start = period_start(period, start)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    rollups = FinancialRollup.objects.filter(period=period, period_start__lte=end)
+    if category is not None:
+        rollups = rollups.filter(category=category)
+    # uma consulta: periodos anteriores ao inicio caem num unico balde (NULL) que vira o saldo inicial
+    rows = (rollups
+            .annotate(bucket=Case(When(period_start__gte=start, then=F('period_start')), default=None))
+            .values('bucket')
+            .annotate(
+                income=Sum('total', filter=Q(type='INCOME'), default=Value(Decimal('0.00')), output_field=money),
+                expense=Sum('total', filter=Q(type='EXPENSE'), default=Value(Decimal('0.00')), output_field=money),
+                transactions=Sum('count'),
+            )
+            .order_by('bucket'))
+
+    opening = Decimal('0.00')
+    periods = []
+    for row in rows:
+        if row['bucket'] is None:
+            opening = row['income'] - row['expense']
+            continue
+        periods.append({
+            'period_start': row['bucket'],
+            'income': row['income'],
+            'expense': row['expense'],
+            'net': row['income'] - row['expense'],
+            'transactions': row['transactions'],
+        })
+    balance = opening
+    for item in periods:
+        balance += item['net']
+        item['balance'] = balance
+
+    income = sum((item['income'] for item in periods), Decimal('0.00'))
+    expense = sum((item['expense'] for item in periods), Decimal('0.00'))
+    return {
+        'start': start,
+        'end': end,
+        'period': period,
+        'opening_balance': opening,
+        'income': income,
+        'expense': expense,
+        'net': income - expense,
+        'closing_balance': balance,
+        'periods': periods,
+    }
@@ -0,0 +1,180 @@
+import hashlib
+import io
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from base.models import BaseProduct, ProductImageJob
+
+logger = logging.getLogger(__name__)
+
+# Derivados das fotos de produto (thumbnail/card/zoom, WebP e JPEG), gerados fora do request:
+# o upload só grava um ProductImageJob e o run_image_worker processa a fila com um pool de threads
+# (o Pillow libera o GIL ao decodificar, redimensionar e codificar). Os arquivos têm o hash do
+# conteudo no nome e o resultado vai para BaseProduct.image_variants, lido pelos serializers.
+
+# nome e caixa maxima (px) de cada derivado; fotos menores não são ampliadas
+DERIVATIVES = (
+    ('thumbnail', 160),
+    ('card', 480),
+    ('zoom', 1600),
+)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+DERIVATIVE_DIR = 'products/derivatives'
+
+def needs_derivatives(product):
+    return bool(product.image) and product.image_variants.get('source') != product.image.name
+
+def enqueue_image_job(product):
+    # grava na transação corrente; nenhuma imagem é processada na requisição
+    source = product.image.name
+    if ProductImageJob.objects.filter(product=product, source=source, status__in=['pending', 'processing']).exists():
+        return None
+    return ProductImageJob.objects.create(product=product, source=source)
+
+def enqueue_missing():
+    # produtos com foto sem derivados (ex: importados com bulk_create ou anteriores ao pipeline)
+    products = BaseProduct.objects.exclude(image='').exclude(image__isnull=True).only('pk', 'image', 'image_variants')
+    return sum(1 for product in products.iterator() if needs_derivatives(product) and enqueue_image_job(product))
+
+def flatten(image):
+    # JPEG não tem canal alfa: transparencia vira fundo branco (nos dois formatos, para ficarem iguais)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+def render(data):
+    # {nome: ((largura, altura), {ext: bytes})}, do maior para o menor derivado
+    image = Image.open(io.BytesIO(data))
+    largest = max(box for _, box in DERIVATIVES)
+    # JPEG: o decoder já entrega a foto reduzida (escala do DCT) quando ela é muito maior que o zoom
+    image.draft('RGB', (largest, largest))
+    image = flatten(ImageOps.exif_transpose(image))
+    rendered = {}
+    for name, box in sorted(DERIVATIVES, key=lambda derivative: -derivative[1]):
+        # cada tamanho parte do anterior, não da foto original
+        image.thumbnail((box, box), Image.Resampling.LANCZOS)
+        files = {}
+        for ext, fmt, options in FORMATS:
+            buffer = io.BytesIO()
+            image.save(buffer, fmt, **options)
+            files[ext] = buffer.getvalue()
+        rendered[name] = (image.size, files)
+    return rendered
+
+def store(name, ext, content):
+    # nome pelo conteudo: reprocessar a mesma foto não duplica arquivos e a URL pode ter cache longo
+    path = f'{DERIVATIVE_DIR}/{name}/{hashlib.sha256(content).hexdigest()[:20]}.{ext}'
+    if default_storage.exists(path):
+        return path
+    return default_storage.save(path, ContentFile(content))
+
+def build_derivatives(source):
+    with default_storage.open(source, 'rb') as f:
+        data = f.read()
+    variants = {'source': source}
+    for name, ((width, height), files) in render(data).items():
+        variants[name] = {'width': width, 'height': height}
+        for ext, content in files.items():
+            variants[name][ext] = store(name, ext, content)
+    return variants
+
+def max_attempts():
+    return getattr(settings, 'IMAGE_JOB_MAX_ATTEMPTS', 3)
+
+def backoff(attempts):
+    # 60s, 120s, 240s ... limitado a 1 hora
+    base = getattr(settings, 'IMAGE_JOB_BACKOFF_SECONDS', 60)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 3600))
+
+def claim_batch(batch_size, lease=timedelta(minutes=5)):
+    # mesmo esquema do outbox de emails: UPDATE condicional com um token por lote
+    now = timezone.now()
+    token = uuid.uuid4()
+    ready = Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', locked_until__lt=now)
+    candidates = list(ProductImageJob.objects.filter(ready).order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    ProductImageJob.objects.filter(ready, pk__in=candidates).update(
+        status='processing', claim_token=token, locked_until=now + lease)
+    return list(ProductImageJob.objects.filter(claim_token=token))
+
+class ImageWorker:
+    def __init__(self, workers=2, batch_size=10):
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def process(self, job):
+        # só storage e Pillow aqui; o banco é atualizado por record, na thread principal
+        try:
+            return job, build_derivatives(job.source), None
+        except Exception as e:
+            return job, None, str(e) or type(e).__name__
+
+    def record(self, results):
+        now = timezone.now()
+        done = 0
+        for job, variants, error in results:
+            if error is None:
+                with transaction.atomic():
+                    product = BaseProduct.objects.filter(pk=job.product_id).first()
+                    # foto trocada durante o processamento: o job da foto nova grava os derivados dela
+                    if product is not None and product.image.name == job.source:
+                        product.image_variants = variants
+                        # save dispara a nova versão do catalogo e a invalidação dos carrinhos
+                        product.save(update_fields=['image_variants'])
+                    ProductImageJob.objects.filter(pk=job.pk).update(
+                        status='done', finished_at=now, claim_token=None, locked_until=None, last_error='')
+                done += 1
+                continue
+            attempts = job.attempts + 1
+            dead = attempts >= max_attempts()
+            ProductImageJob.objects.filter(pk=job.pk).update(
+                status='dead' if dead else 'pending',
+                attempts=attempts,
+                next_attempt_at=now + backoff(attempts),
+                claim_token=None,
+                locked_until=None,
+                last_error=error[:1000],
+            )
+            if dead:
+                logger.error("Derivados de %s falharam após %s tentativas: %s", job.source, attempts, error)
+        return done, len(results) - done
+
+    def run_once(self, executor=None):
+        batch = claim_batch(self.batch_size)
+        if not batch:
+            return 0, 0
+        if executor is None or len(batch) == 1:
+            results = [self.process(job) for job in batch]
+        else:
+            results = list(executor.map(self.process, batch))
+        return self.record(results)
+
+    def run(self, poll_interval=2.0, once=False):
+        totals = [0, 0]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                done, failed = self.run_once(executor)
+                totals[0] += done
+                totals[1] += failed
+                if once and not (done or failed):
+                    return tuple(totals)
+                if not (done or failed):
+                    time.sleep(poll_interval)
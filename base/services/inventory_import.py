@@ -0,0 +1,225 @@
+import codecs
+import csv
+import io
+import json
+from collections import OrderedDict
+from itertools import chain, islice
+
+from django.db import DatabaseError, transaction
+from django.db.models import Case, When, F, Value, IntegerField
+from rest_framework import serializers
+
+from base.cache import bump_catalog_version
+from base.models import BaseProduct, ProductVariation, InventoryLog
+from base.utils import SanitizedCharField
+
+DEFAULT_CHUNK_SIZE = 500
+
+class MovementRowSerializer(serializers.Serializer):
+    # validação apenas de formato; existencia de produto/variação é checada em lote por chunk
+    product = serializers.UUIDField()
+    variation = serializers.IntegerField(required=False, allow_null=True)
+    type = serializers.ChoiceField(choices=[choice for choice, _ in InventoryLog.MOVEMENT_TYPES])
+    quantity = serializers.IntegerField(min_value=0)
+    reason = SanitizedCharField(max_length=200)
+
+    def validate(self, data):
+        if data['type'] != 'ADJUST' and data['quantity'] == 0:
+            raise serializers.ValidationError({'quantity': "A quantidade deve ser maior que zero."})
+        return data
+
+# LEITURA
+
+class InvalidRow:
+    # linha que não pôde ser lida (JSON malformado, bytes fora de UTF-8): vira erro daquela linha,
+    # os chunks já gravados continuam valendo e o relatorio chega inteiro ao cliente
+    def __init__(self, message):
+        self.message = message
+
+def _lines(stream):
+    # (texto, erro) por linha: a decodificação é feita linha a linha para um byte invalido
+    # no meio do arquivo invalidar só a linha em que aparece
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if isinstance(stream, io.TextIOBase):
+        for line in stream:
+            yield line, None
+        return
+    for number, raw in enumerate(stream):
+        if number == 0:
+            raw = raw.removeprefix(codecs.BOM_UTF8)
+        try:
+            yield raw.decode('utf-8'), None
+        except UnicodeDecodeError as e:
+            yield raw.decode('utf-8', errors='replace'), f"Codificação inválida (esperado UTF-8): {e.reason}."
+
+def iter_csv_rows(stream):
+    pending = []
+
+    def lines():
+        for line, error in _lines(stream):
+            if error:
+                pending.append(error)
+            yield line
+
+    reader = csv.reader(lines())
+    header = next(reader, None)
+    if header is None:
+        return
+    if pending:
+        raise ValueError(pending[0])
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            pending.clear()
+            yield InvalidRow(f"CSV inválido: {e}.")
+            continue
+        if pending:
+            yield InvalidRow(pending[0])
+            pending.clear()
+            continue
+        # linhas em branco não contam, como no csv.DictReader
+        if values:
+            yield {key: value for key, value in zip(header, values) if value not in (None, '')}
+
+def iter_json_rows(stream):
+    # aceita um array JSON ou JSON Lines (um objeto por linha)
+    lines = _lines(stream)
+    for line, error in lines:
+        if error or line.strip():
+            break
+    else:
+        return
+    if not error and line.lstrip().startswith('['):
+        # o array é lido inteiro antes do primeiro item: um erro aqui não deixa nada gravado
+        rest = list(lines)
+        errors = [error for _, error in rest if error]
+        if errors:
+            raise ValueError(errors[0])
+        yield from json.loads(line + ''.join(text for text, _ in rest))
+        return
+    for line, error in chain([(line, error)], lines):
+        if error:
+            yield InvalidRow(error)
+        elif line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidRow(f"JSON inválido: {e.msg} (coluna {e.colno}).")
+
+def iter_rows(stream, fmt):
+    if fmt == 'csv':
+        return iter_csv_rows(stream)
+    if fmt == 'json':
+        return iter_json_rows(stream)
+    raise ValueError(f"Formato não suportado: {fmt}")
+
+# INGESTAO
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _stock_update(targets):
+    # targets: {pk: (absoluto ou None, delta)} -> um unico UPDATE com CASE por modelo
+    whens = []
+    for pk, (absolute, delta) in targets.items():
+        if absolute is not None:
+            whens.append(When(pk=pk, then=Value(absolute + delta)))
+        elif delta:
+            whens.append(When(pk=pk, then=F('stock') + delta))
+    return whens
+
+def ingest_chunk(rows, offset=0, user=None):
+    errors = []
+    valid = []
+    for index, row in enumerate(rows, start=offset + 1):
+        if isinstance(row, InvalidRow):
+            errors.append({'row': index, 'errors': {'non_field_errors': [row.message]}})
+            continue
+        serializer = MovementRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+
+    with transaction.atomic():
+        product_ids = {data['product'] for _, data in valid}
+        variation_ids = {data['variation'] for _, data in valid if data.get('variation')}
+        products = dict(BaseProduct.objects.select_for_update().filter(pk__in=product_ids).values_list('pk', 'stock'))
+        variations = {
+            pk: (product_id, stock) for pk, product_id, stock in
+            ProductVariation.objects.select_for_update().filter(pk__in=variation_ids).values_list('pk', 'product_id', 'stock')
+        }
+
+        # simula os movimentos em ordem para rejeitar linhas que deixariam estoque negativo
+        current = {('product', pk): stock for pk, stock in products.items()}
+        current.update({('variation', pk): stock for pk, (_, stock) in variations.items()})
+        pending = {}
+        logs = []
+        for index, data in valid:
+            product_id = data['product']
+            variation_id = data.get('variation')
+            if product_id not in products:
+                errors.append({'row': index, 'errors': {'product': ["Produto não encontrado."]}})
+                continue
+            if variation_id and variations.get(variation_id, (None,))[0] != product_id:
+                errors.append({'row': index, 'errors': {'variation': ["Variação não encontrada para este produto."]}})
+                continue
+
+            key = ('variation', variation_id) if variation_id else ('product', product_id)
+            stock = current[key]
+            absolute, delta = pending.get(key, (None, 0))
+            quantity = data['quantity']
+            if data['type'] == 'ADJUST':
+                absolute, delta, stock = quantity, 0, quantity
+            elif data['type'] == 'IN':
+                delta += quantity
+                stock = None if stock is None else stock + quantity
+            else:
+                if stock is not None and stock < quantity:
+                    errors.append({'row': index, 'errors': {'quantity': [f"Estoque insuficiente. Restam apenas {stock} unidades."]}})
+                    continue
+                delta -= quantity
+                stock = None if stock is None else stock - quantity
+            current[key] = stock
+            pending[key] = (absolute, delta)
+            logs.append(InventoryLog(
+                product_id=product_id, variation_id=variation_id, type=data['type'],
+                quantity=quantity, reason=data['reason'], user=user,
+            ))
+
+        InventoryLog.objects.bulk_create(logs)
+        for model, kind in ((BaseProduct, 'product'), (ProductVariation, 'variation')):
+            targets = {pk: value for (target_kind, pk), value in pending.items() if target_kind == kind}
+            whens = _stock_update(targets)
+            if whens:
+                model.objects.filter(pk__in=targets).update(stock=Case(*whens, default=F('stock'), output_field=IntegerField()))
+                if model is ProductVariation:
+                    bump_catalog_version('variations')
+
+    errors.sort(key=lambda error: error['row'])
+    return len(logs), errors
+
+def ingest_movements(rows, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    report = OrderedDict(created=0, rejected=0, errors=[])
+    offset = 0
+    for chunk in chunked(rows, chunk_size):
+        try:
+            created, errors = ingest_chunk(chunk, offset=offset, user=user)
+        except DatabaseError as e:
+            # falha do chunk inteiro (ex: conflito de concorrencia) nao aborta os demais
+            created = 0
+            errors = [{'row': index, 'errors': {'non_field_errors': [str(e)]}} for index in range(offset + 1, offset + len(chunk) + 1)]
+        report['created'] += created
+        report['rejected'] += len(errors)
+        report['errors'].extend(errors)
+        offset += len(chunk)
+    return report
@@ -0,0 +1,58 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base.models import BaseProduct, Order, OrderItem, ProductVariation
+from base.signals import orders_completed_signal
+
+logger = logging.getLogger(__name__)
+
+def bulk_transition(order_ids, status=None, payment_status=None):
+    # status/payment_status de varios pedidos num unico UPDATE. Os pedidos que passam a pagos
+    # geram um unico orders_completed_signal com todos os pagamentos (CRM, financeiro).
+    changes = {}
+    if status is not None:
+        changes['status'] = status
+    if payment_status is not None:
+        changes['payment_status'] = payment_status
+    if not changes:
+        return {'updated': 0, 'paid': 0, 'not_found': []}
+    # update() não passa por save(): o auto_now de updated_at (usado na exportação incremental) vai explicito
+    changes['updated_at'] = timezone.now()
+
+    with transaction.atomic():
+        orders = Order.objects.filter(pk__in=order_ids)
+        # select_for_update: um segundo lote concorrente espera e não vê estes pedidos como não pagos
+        rows = list(orders.select_for_update().values_list('pk', 'payment_status', 'client_id', 'total', 'created_at'))
+        found = {row[0] for row in rows}
+        payments = []
+        if payment_status:
+            payments = [(client_id, total, created_at) for _, was_paid, client_id, total, created_at in rows if not was_paid]
+        updated = orders.update(**changes)
+        if payments:
+            responses = orders_completed_signal.send_robust(sender=Order, payments=payments)
+            for receiver_func, response in responses:
+                if isinstance(response, Exception):
+                    logger.error("Falha em %s ao processar %d pedido(s) pagos: %r", receiver_func.__name__, len(payments), response)
+    return {
+        'updated': updated,
+        'paid': len(payments),
+        'not_found': [str(pk) for pk in order_ids if pk not in found],
+    }
+
+def backfill_totals(chunk_size=1000):
+    # Pedidos anteriores ao preço congelado: itens com unit_price NULL recebem o preço atual do
+    # produto/variação e os pedidos cujo total não bate com a soma das linhas são recalculados.
+    price = Coalesce(
+        Subquery(ProductVariation.objects.filter(pk=OuterRef('variation_id')).values('price_override')[:1]),
+        Subquery(BaseProduct.objects.filter(pk=OuterRef('product_id')).values('price')[:1]),
+    )
+    with transaction.atomic():
+        items = OrderItem.objects.filter(unit_price__isnull=True).update(unit_price=price, updated_at=timezone.now())
+        stale = list(Order.objects.with_items_total().exclude(total=F('items_total')).values_list('pk', flat=True))
+        for start in range(0, len(stale), chunk_size):
+            Order.objects.filter(pk__in=stale[start:start + chunk_size]).refresh_totals()
+    return {'items': items, 'orders': len(stale)}
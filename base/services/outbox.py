@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from base.models import EmailOutbox
+from .email_factory import get_email_service
+
+logger = logging.getLogger(__name__)
+
+def enqueue_email(to, subject, body):
+    # grava na transação corrente; nenhuma chamada de rede acontece na requisição
+    return EmailOutbox.objects.create(to=to, subject=subject, body=body)
+
+def max_attempts():
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+def backoff(attempts):
+    # 30s, 60s, 120s ... limitado a 1 hora
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 3600))
+
+def claim_batch(batch_size, lease=timedelta(minutes=5)):
+    # um UPDATE condicional marca o lote com um token; só quem o gravou processa as linhas
+    now = timezone.now()
+    token = uuid.uuid4()
+    ready = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', locked_until__lt=now)
+    candidates = list(EmailOutbox.objects.filter(ready).order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    EmailOutbox.objects.filter(ready, pk__in=candidates).update(
+        status='sending', claim_token=token, locked_until=now + lease)
+    return list(EmailOutbox.objects.filter(claim_token=token))
+
+class OutboxWorker:
+    def __init__(self, workers=4, batch_size=50):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.local = threading.local()
+
+    def service(self):
+        # um serviço por thread, reutilizado entre envios
+        if not hasattr(self.local, 'service'):
+            self.local.service = get_email_service()
+        return self.local.service
+
+    def deliver(self, message):
+        try:
+            if self.service().send_email(to=message.to, subject=message.subject, body=message.body):
+                return message, None
+            return message, "Serviço de email recusou o envio."
+        except Exception as e:
+            return message, str(e) or type(e).__name__
+
+    def record(self, results):
+        now = timezone.now()
+        sent = [message.pk for message, error in results if error is None]
+        with transaction.atomic():
+            if sent:
+                EmailOutbox.objects.filter(pk__in=sent).update(
+                    status='sent', sent_at=now, claim_token=None, locked_until=None, last_error='')
+            for message, error in results:
+                if error is None:
+                    continue
+                attempts = message.attempts + 1
+                dead = attempts >= max_attempts()
+                EmailOutbox.objects.filter(pk=message.pk).update(
+                    status='dead' if dead else 'pending',
+                    attempts=attempts,
+                    next_attempt_at=now + backoff(attempts),
+                    claim_token=None,
+                    locked_until=None,
+                    last_error=error[:1000],
+                )
+                if dead:
+                    logger.error("Email %s movido para dead-letter após %s tentativas: %s", message.pk, attempts, error)
+        return len(sent), len(results) - len(sent)
+
+    def _deliver_in_thread(self, message):
+        try:
+            return self.deliver(message)
+        finally:
+            close_old_connections()
+
+    def run_once(self, executor=None):
+        batch = claim_batch(self.batch_size)
+        if not batch:
+            return 0, 0
+        if executor is None or len(batch) == 1:
+            results = [self.deliver(message) for message in batch]
+        else:
+            results = list(executor.map(self._deliver_in_thread, batch))
+        return self.record(results)
+
+    def run(self, poll_interval=2.0, once=False):
+        totals = [0, 0]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                sent, failed = self.run_once(executor)
+                totals[0] += sent
+                totals[1] += failed
+                if once and not (sent or failed):
+                    return tuple(totals)
+                if not (sent or failed):
+                    time.sleep(poll_interval)
@@ -0,0 +1,184 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from base.cache import bump_catalog_version
+from base.models import (
+    Address, BaseCustomUser, BaseProduct, Cart, CartItem, CRMInteraction, CRMTag, CustomerCRM,
+    FinancialTransaction, InventoryLog, Order, OrderItem, ProductVariation, Supplier, UserSecurityProfile
+)
+from base.search import get_search_backend
+from base.services.crm_service import rebuild_metrics
+from base.services.finance_service import rebuild_rollups
+
+DEFAULT_PASSWORD = 'seed-password'
+DEFAULT_BATCH_SIZE = 2000
+WORDS = [
+    'camiseta', 'algodão', 'caneca', 'porcelana', 'café', 'açúcar', 'mascavo', 'tênis', 'corrida',
+    'mochila', 'couro', 'relógio', 'pulseira', 'garrafa', 'térmica', 'luminária', 'mesa', 'cadeira',
+    'escritório', 'notebook', 'capa', 'silicone', 'fone', 'bluetooth', 'jaqueta', 'jeans', 'vestido',
+    'floral', 'sandália', 'praia', 'perfume', 'lavanda', 'sabonete', 'orgânico', 'chocolate', 'amargo',
+]
+COLORS = ['Azul', 'Preto', 'Branco', 'Verde', 'Vermelho']
+CATEGORIES = ['Fornecedores', 'Frete', 'Marketing', 'Aluguel']
+
+class SeedError(Exception):
+    pass
+
+def seed_email(prefix, index):
+    return f'{prefix}-{index}@seed.local'
+
+def staff_email(prefix):
+    return f'{prefix}-staff@seed.local'
+
+def _spread(rng, now, days):
+    return now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+
+def bulk_create_backdated(model, objs, fields, batch_size):
+    # created_at/date são auto_now_add e o bulk_create grava "agora"; as datas espalhadas no periodo
+    # são regravadas com um UPDATE ... CASE por lote e devolvidas às instancias
+    objs = list(objs)
+    wanted = [{name: getattr(obj, name) for name in fields} for obj in objs]
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    for start in range(0, len(objs), batch_size):
+        batch = list(zip(objs[start:start + batch_size], wanted[start:start + batch_size]))
+        model.objects.filter(pk__in=[obj.pk for obj, _ in batch]).update(**{
+            name: Case(*(When(pk=obj.pk, then=Value(values[name])) for obj, values in batch),
+                       output_field=model._meta.get_field(name))
+            for name in fields
+        })
+    for obj, values in zip(objs, wanted):
+        for name, value in values.items():
+            setattr(obj, name, value)
+    return objs
+
+def seed(products=1000, users=1000, orders=5000, variations_per_product=3, items_per_order=3,
+         days=365, prefix='seed', password=DEFAULT_PASSWORD, random_seed=42, batch_size=DEFAULT_BATCH_SIZE):
+    # Tudo via bulk_create; signals de linha (perfil de segurança, rollups, CRM, indice de busca)
+    # são substituidos por inserts em lote e pelos rebuilds ao final, mantendo os dados coerentes.
+    if BaseCustomUser.objects.filter(email=staff_email(prefix)).exists():
+        raise SeedError(f"Já existem dados com o prefixo '{prefix}'; use outro --prefix.")
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    # um unico hash para todos: o PBKDF2 por usuario dominaria o tempo da carga
+    password_hash = make_password(password)
+    counts = {}
+
+    with transaction.atomic():
+        catalog = BaseProduct.objects.bulk_create((
+            BaseProduct(
+                name=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                description=' '.join(rng.sample(WORDS, 8)),
+                slug=f'{prefix}-{i}',
+                price=Decimal(rng.randint(500, 50000)) / 100,
+                stock=rng.randint(0, 500),
+            ) for i in range(products)
+        ), batch_size=batch_size)
+        variations = ProductVariation.objects.bulk_create((
+            ProductVariation(product=product, name='Cor', value=COLORS[k % len(COLORS)],
+                             price_override=product.price + k if k else None, stock=rng.randint(0, 100))
+            for product in catalog for k in range(variations_per_product)
+        ), batch_size=batch_size)
+        variations_by_product = {}
+        for variation in variations:
+            variations_by_product.setdefault(variation.product_id, []).append(variation)
+
+        staff = BaseCustomUser(username=f'{prefix}-staff', email=staff_email(prefix), name='Equipe Seed',
+                               password=password_hash, user_type='admin', is_staff=True, is_superuser=True)
+        addresses = Address.objects.bulk_create((
+            Address(street=f'Rua {rng.choice(WORDS).capitalize()}, {i}', city='Recife', state='PE', zip_code='50000-000')
+            for i in range(users)
+        ), batch_size=batch_size)
+        clients = BaseCustomUser.objects.bulk_create([staff] + [
+            BaseCustomUser(
+                username=f'{prefix}-{i}', email=seed_email(prefix, i), name=f'Cliente {i}', password=password_hash,
+                address=addresses[i], date_joined=_spread(rng, now, days),
+                birth_date=now.date() - timedelta(days=rng.randint(16 * 365, 80 * 365)),
+            ) for i in range(users)
+        ], batch_size=batch_size)[1:]
+        UserSecurityProfile.objects.bulk_create(
+            (UserSecurityProfile(user=user) for user in [staff] + clients), batch_size=batch_size)
+
+        tags = CRMTag.objects.bulk_create(CRMTag(name=f'{prefix}-{name}') for name in ('vip', 'novo', 'atacado', 'inativo'))
+        customers = CustomerCRM.objects.bulk_create(
+            (CustomerCRM(user=user) for user in clients), batch_size=batch_size)
+        CustomerCRM.tags.through.objects.bulk_create((
+            CustomerCRM.tags.through(customercrm_id=customer.pk, crmtag_id=tag.pk)
+            for customer in customers for tag in rng.sample(tags, rng.randint(0, 2))
+        ), batch_size=batch_size)
+
+        bulk_create_backdated(CRMInteraction, (
+            CRMInteraction(customer=customer, agent=staff, type=rng.choice(CRMInteraction.INTERACTION_TYPES)[0],
+                           subject='Contato', description='Interação gerada pelo seed',
+                           created_at=_spread(rng, now, days))
+            for customer in customers for _ in range(rng.randint(0, 3))
+        ), ['created_at'], batch_size)
+
+        carts = Cart.objects.bulk_create((Cart(user=user) for user in clients), batch_size=batch_size)
+        CartItem.objects.bulk_create((
+            CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+            for cart in carts for product in rng.sample(catalog, min(len(catalog), rng.randint(0, 4)))
+        ), batch_size=batch_size)
+
+        statuses = [code for code, _ in Order.STATUS_CHOICE]
+        order_rows, item_rows = [], []
+        for _ in range(orders if clients and catalog else 0):
+            order = Order(client=rng.choice(clients), status=rng.choice(statuses),
+                          payment_status=rng.random() < 0.8, created_at=_spread(rng, now, days))
+            total = Decimal('0.00')
+            for product in rng.sample(catalog, min(len(catalog), rng.randint(1, items_per_order))):
+                variation = rng.choice(variations_by_product[product.pk]) if product.pk in variations_by_product else None
+                item = OrderItem(order=order, product=product, variation=variation, quantity=rng.randint(1, 5),
+                                 unit_price=OrderItem.resolve_unit_price(product, variation))
+                total += item.line_total
+                item_rows.append(item)
+            # total desnormalizado calculado aqui, sem o recalculate_total por item
+            order.total = total
+            order_rows.append(order)
+        bulk_create_backdated(Order, order_rows, ['created_at'], batch_size)
+        OrderItem.objects.bulk_create(item_rows, batch_size=batch_size)
+
+        bulk_create_backdated(InventoryLog, (
+            InventoryLog(product=product, type=rng.choice(('IN', 'IN', 'OUT', 'ADJUST')), quantity=rng.randint(1, 50),
+                         reason='Carga do seed', user=staff, created_at=_spread(rng, now, days))
+            for product in catalog for _ in range(2)
+        ), ['created_at'], batch_size)
+
+        suppliers = Supplier.objects.bulk_create(
+            Supplier(name=f'Fornecedor {prefix}-{i}', email=f'fornecedor{i}@seed.local') for i in range(20))
+        transactions = [
+            FinancialTransaction(type='INCOME', amount=order.total, description=f'Pedido {order.pk}',
+                                 category='Vendas', order=order, date=order.created_at.date(),
+                                 created_at=order.created_at)
+            for order in order_rows if order.payment_status
+        ]
+        for _ in range(max(1, orders // 10)):
+            created_at = _spread(rng, now, days)
+            transactions.append(FinancialTransaction(
+                type='EXPENSE', amount=Decimal(rng.randint(1000, 500000)) / 100, description='Despesa do seed',
+                category=rng.choice(CATEGORIES), supplier=rng.choice(suppliers),
+                date=created_at.date(), created_at=created_at))
+        bulk_create_backdated(FinancialTransaction, transactions, ['created_at', 'date'], batch_size)
+
+        rebuild_metrics()
+        rebuild_rollups()
+        bump_catalog_version('products', 'variations')
+
+    get_search_backend().rebuild()
+    counts.update({
+        'products': len(catalog),
+        'variations': len(variations),
+        'users': len(clients) + 1,
+        'crm_profiles': len(customers),
+        'carts': len(carts),
+        'orders': len(order_rows),
+        'order_items': len(item_rows),
+        'inventory_logs': len(catalog) * 2,
+        'financial_transactions': len(transactions),
+    })
+    return counts
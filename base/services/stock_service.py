@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from base.cache import bump_catalog_version
+from base.models import BaseProduct, ProductVariation, StockReservation, InventoryLog
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+        super().__init__(f"Estoque insuficiente para {quantity} unidade(s) do produto {product_id}.")
+
+def _target_queryset(product_id, variation_id=None):
+    if variation_id:
+        return ProductVariation.objects.filter(pk=variation_id)
+    return BaseProduct.objects.filter(pk=product_id)
+
+def _stock_changed(variation_id=None):
+    # o estoque da variação aparece em /api/product-variations/ e UPDATE direto não dispara sinais
+    if variation_id:
+        bump_catalog_version('variations')
+
+def decrement(product_id, quantity, variation_id=None):
+    # UPDATE ... WHERE stock >= quantity: o banco garante que duas saidas nao vendam a mesma unidade.
+    # stock NULL em BaseProduct significa estoque nao controlado
+    updated = _target_queryset(product_id, variation_id).filter(
+        Q(stock__gte=quantity) | Q(stock__isnull=True)
+    ).update(stock=F('stock') - quantity)
+    if not updated:
+        raise InsufficientStock(variation_id or product_id, quantity)
+    _stock_changed(variation_id)
+
+def adjust_products(deltas):
+    # varios produtos em um unico UPDATE condicional: stock - delta por produto (delta negativo devolve).
+    # Se algum produto não tiver estoque, nenhuma linha daquele produto casa e o total de linhas
+    # atualizadas denuncia a falha; quem chama deve estar numa transação para desfazer o resto.
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    delta = Case(*[When(pk=pk, then=Value(value)) for pk, value in deltas.items()], output_field=IntegerField())
+    updated = BaseProduct.objects.filter(pk__in=deltas).filter(
+        Q(stock__gte=delta) | Q(stock__isnull=True)
+    ).update(stock=F('stock') - delta)
+    if updated != len(deltas):
+        stocks = dict(BaseProduct.objects.filter(pk__in=deltas).values_list('pk', 'stock'))
+        missing = next(pk for pk, value in deltas.items() if pk not in stocks or (stocks[pk] is not None and stocks[pk] < value))
+        raise InsufficientStock(missing, deltas[missing])
+
+def increment(product_id, quantity, variation_id=None):
+    _target_queryset(product_id, variation_id).update(stock=F('stock') + quantity)
+    _stock_changed(variation_id)
+
+def apply_movement(product_id, movement_type, quantity, variation_id=None):
+    if movement_type == 'IN':
+        increment(product_id, quantity, variation_id)
+    elif movement_type == 'OUT':
+        decrement(product_id, quantity, variation_id)
+    elif movement_type == 'ADJUST':
+        _target_queryset(product_id, variation_id).update(stock=quantity)
+        _stock_changed(variation_id)
+    else:
+        raise ValueError(f"Tipo de movimento inválido: {movement_type}")
+
+# RESERVAS
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+
+def reserve(product_id, quantity, variation_id=None, cart_id=None, cart_item_id=None, ttl=None):
+    # devolve primeiro as reservas vencidas do mesmo produto
+    release_expired(product_id=product_id)
+    with transaction.atomic():
+        decrement(product_id, quantity, variation_id)
+        return StockReservation.objects.create(
+            product_id=product_id,
+            variation_id=variation_id,
+            cart_id=cart_id,
+            cart_item_id=cart_item_id,
+            quantity=quantity,
+            expires_at=timezone.now() + (ttl or reservation_ttl()),
+        )
+
+def _release_rows(reservations):
+    released = 0
+    for reservation in reservations:
+        with transaction.atomic():
+            # apenas quem apagar a linha devolve o estoque, evitando devolução dupla
+            deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+            if deleted:
+                increment(reservation.product_id, reservation.quantity, reservation.variation_id)
+                released += reservation.quantity
+    return released
+
+def release(reservation):
+    return _release_rows([reservation])
+
+def release_for_item(cart_item_id):
+    # só as reservas da linha; outras linhas do mesmo produto no carrinho continuam reservadas
+    return _release_rows(list(StockReservation.objects.filter(cart_item_id=cart_item_id)))
+
+def release_expired(now=None, product_id=None):
+    expired = StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+    if product_id:
+        expired = expired.filter(product_id=product_id)
+    return _release_rows(list(expired.only('id', 'product_id', 'variation_id', 'quantity')))
+
+def confirm(reservation, user=None, reason="Venda confirmada"):
+    # converte a reserva em saida definitiva; o estoque ja foi debitado na reserva
+    with transaction.atomic():
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+        if not deleted:
+            # reserva ja expirou e devolveu o estoque: tenta debitar de novo
+            decrement(reservation.product_id, reservation.quantity, reservation.variation_id)
+        log = InventoryLog(
+            product_id=reservation.product_id,
+            variation_id=reservation.variation_id,
+            type='OUT',
+            quantity=reservation.quantity,
+            reason=reason,
+            user=user,
+        )
+        log.save(apply_stock=False)
+        return log
@@ -0,0 +1,71 @@
+import random
+import secrets
+import string
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from base.models import SecurityToken
+
+OTP = 'otp'
+PASSWORD_RESET = 'password_reset'
+
+class TokenInvalid(Exception):
+    pass
+
+class TokenExpired(Exception):
+    pass
+
+def _ttl(purpose):
+    if purpose == OTP:
+        return timedelta(minutes=getattr(settings, 'OTP_TTL_MINUTES', 10))
+    return timedelta(minutes=getattr(settings, 'PASSWORD_RESET_TTL_MINUTES', 60))
+
+def token_digest(purpose, value):
+    # HMAC com a SECRET_KEY: um dump da tabela não permite testar os 10^6 OTPs possiveis offline
+    return salted_hmac(f'base.token_service.{purpose}', value).hexdigest()
+
+def _otp_value(user_id, code):
+    # codigos de 6 digitos se repetem entre usuarios; o id faz parte do valor assinado
+    return f'{user_id}:{code}'
+
+def issue(user, purpose, value, now=None):
+    # um token ativo por usuario e finalidade: emitir de novo invalida o anterior
+    now = now or timezone.now()
+    with transaction.atomic():
+        SecurityToken.objects.filter(user=user, purpose=purpose).delete()
+        SecurityToken.objects.create(
+            user=user, purpose=purpose, token_hash=token_digest(purpose, value), expires_at=now + _ttl(purpose))
+
+def consume(purpose, value, now=None):
+    # uso unico: o DELETE decide entre requests concorrentes com o mesmo token
+    row = SecurityToken.objects.filter(token_hash=token_digest(purpose, value), purpose=purpose).values(
+        'pk', 'user_id', 'expires_at').first()
+    if row is None or not SecurityToken.objects.filter(pk=row['pk']).delete()[0]:
+        raise TokenInvalid
+    if row['expires_at'] <= (now or timezone.now()):
+        raise TokenExpired
+    return row['user_id']
+
+def issue_otp(user, now=None):
+    code = ''.join(random.SystemRandom().choices(string.digits, k=6))
+    issue(user, OTP, _otp_value(user.pk, code), now=now)
+    return code
+
+def consume_otp(user, code, now=None):
+    return consume(OTP, _otp_value(user.pk, code), now=now)
+
+def issue_password_reset(user, now=None):
+    token = secrets.token_urlsafe(32)
+    issue(user, PASSWORD_RESET, token, now=now)
+    return token
+
+def consume_password_reset(token, now=None):
+    return consume(PASSWORD_RESET, token, now=now)
+
+def purge_expired(now=None):
+    deleted, _ = SecurityToken.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from base.models import BaseCustomUser, CustomerCRM, UserSecurityProfile
+from base.services.inventory_import import InvalidRow, chunked
+from base.utils import SanitizedCharField
+
+DEFAULT_CHUNK_SIZE = 1000
+
+class UserRowSerializer(serializers.Serializer):
+    # clientes vindos de outra plataforma; tipo de usuario não é importado (sempre 'client')
+    email = serializers.EmailField(max_length=254)
+    name = SanitizedCharField(max_length=125)
+    username = serializers.CharField(max_length=150, required=False, validators=[UnicodeUsernameValidator()])
+    phone = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    birth_date = serializers.DateField(required=False, allow_null=True)
+    # senha em texto (será hasheada) ou hash ja no formato do Django (ex: pbkdf2_sha256$...), copiado como está
+    password = serializers.CharField(required=False, trim_whitespace=False)
+    password_hash = serializers.CharField(required=False)
+    internal_notes = SanitizedCharField(required=False, allow_blank=True)
+
+    def validate_email(self, value):
+        return BaseCustomUser.objects.normalize_email(value)
+
+    def validate_password_hash(self, value):
+        try:
+            identify_hasher(value)
+        except ValueError:
+            raise serializers.ValidationError("Hash de senha não reconhecido.")
+        return value
+
+    def validate(self, data):
+        if 'password' in data and 'password_hash' in data:
+            raise serializers.ValidationError("Informe password ou password_hash, não os dois.")
+        return data
+
+class PasswordHasher:
+    # make_password em um pool de processos: o hash é CPU puro e domina o tempo da importação.
+    # O pool só é criado no primeiro lote grande o bastante; lotes pequenos são hasheados aqui mesmo.
+    # Usado pelo comando import_users; dentro de um worker web o hash é serial (workers=1).
+    def __init__(self, workers=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.executor = None
+
+    def hash(self, passwords):
+        # None gera uma senha inutilizavel (cliente define a sua pelo reset de senha)
+        if self.workers <= 1 or len(passwords) < self.workers * 2:
+            return [make_password(password) for password in passwords]
+        if self.executor is None:
+            # spawn em vez de fork: os filhos não herdam conexões, locks nem threads do processo pai
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.executor.map(make_password, passwords, chunksize=chunksize))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+def import_chunk(rows, offset=0, hasher=None):
+    hasher = hasher or PasswordHasher(workers=1)
+    errors = []
+    valid = []
+    for index, row in enumerate(rows, start=offset + 1):
+        if isinstance(row, InvalidRow):
+            errors.append({'row': index, 'errors': {'non_field_errors': [row.message]}})
+            continue
+        serializer = UserRowSerializer(data=row)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            data.setdefault('username', data['email'])
+            valid.append((index, data))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+
+    # duplicados contra o banco e dentro do proprio arquivo, em duas consultas por chunk
+    taken_emails = set(BaseCustomUser.objects.filter(
+        email__in=[data['email'] for _, data in valid]).values_list('email', flat=True))
+    taken_usernames = set(BaseCustomUser.objects.filter(
+        username__in=[data['username'] for _, data in valid]).values_list('username', flat=True))
+    accepted = []
+    for index, data in valid:
+        if data['email'] in taken_emails:
+            errors.append({'row': index, 'errors': {'email': ["Email já cadastrado."]}})
+            continue
+        if data['username'] in taken_usernames:
+            errors.append({'row': index, 'errors': {'username': ["Username já cadastrado."]}})
+            continue
+        taken_emails.add(data['email'])
+        taken_usernames.add(data['username'])
+        accepted.append(data)
+
+    # hash fora da transação: nenhuma trava fica aberta enquanto o pool trabalha
+    to_hash = [data for data in accepted if 'password_hash' not in data]
+    for data, hashed in zip(to_hash, hasher.hash([data.get('password') for data in to_hash])):
+        data['password_hash'] = hashed
+
+    users = [
+        BaseCustomUser(
+            username=data['username'], email=data['email'], name=data['name'], phone=data.get('phone') or None,
+            birth_date=data.get('birth_date'), password=data['password_hash'],
+        ) for data in accepted
+    ]
+    # bulk_create não dispara post_save: perfil de segurança e CRM são criados aqui, em lote
+    with transaction.atomic():
+        BaseCustomUser.objects.bulk_create(users)
+        UserSecurityProfile.objects.bulk_create(UserSecurityProfile(user=user) for user in users)
+        CustomerCRM.objects.bulk_create(
+            CustomerCRM(user=user, internal_notes=data.get('internal_notes', '')) for user, data in zip(users, accepted))
+
+    errors.sort(key=lambda error: error['row'])
+    return len(users), errors
+
+def import_users(rows, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    report = OrderedDict(created=0, rejected=0, errors=[])
+    hasher = PasswordHasher(workers)
+    offset = 0
+    try:
+        for chunk in chunked(rows, chunk_size):
+            try:
+                created, errors = import_chunk(chunk, offset=offset, hasher=hasher)
+            except DatabaseError as e:
+                # ex: email inserido por outro processo entre a checagem e o insert; os demais chunks seguem
+                created = 0
+                errors = [{'row': index, 'errors': {'non_field_errors': [str(e)]}} for index in range(offset + 1, offset + len(chunk) + 1)]
+            report['created'] += created
+            report['rejected'] += len(errors)
+            report['errors'].extend(errors)
+            offset += len(chunk)
+    finally:
+        hasher.close()
+    return report
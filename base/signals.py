@@ -1,21 +1,143 @@
 import django.dispatch
+from decimal import Decimal
+from django.conf import settings
 from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from base.cache import bump_catalog_version, invalidate_cart_snapshots, invalidate_principal
+from base.search import get_search_backend
 
 order_completed_signal = django.dispatch.Signal()
+# varios pedidos pagos na mesma operação: payments = [(user_id, order_total, order_date), ...]
+orders_completed_signal = django.dispatch.Signal()
+
 @receiver(order_completed_signal)
 def update_crm_metrics(sender, user_id, order_total, order_date, **kwargs):
-    from base.models import CustomerCRM
+    from base.services.crm_service import apply_payments
     if not user_id:
         return
-        
-    try:  
-        crm_profile, created = CustomerCRM.objects.get_or_create(user_id=user_id)
- 
-        crm_profile.total_orders_count += 1
-        crm_profile.lifetime_value += order_total
-        if not crm_profile.last_purchase_date or order_date > crm_profile.last_purchase_date:
-            crm_profile.last_purchase_date = order_date
-            
-        crm_profile.save()
-    except Exception as e:
-        pass
+    apply_payments([(user_id, order_total, order_date)])
+
+@receiver(orders_completed_signal)
+def update_crm_metrics_batch(sender, payments, **kwargs):
+    from base.services.crm_service import apply_payments
+    apply_payments(payments)
+
+
+# JWT PRINCIPAL
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_principal_on_user_change(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+@receiver(post_save, sender='base.UserSecurityProfile')
+@receiver(post_delete, sender='base.UserSecurityProfile')
+def invalidate_principal_on_profile_change(sender, instance, **kwargs):
+    invalidate_principal(instance.user_id)
+
+
+# CART SNAPSHOT
+@receiver(post_save, sender='base.CartItem')
+@receiver(post_delete, sender='base.CartItem')
+def invalidate_cart_on_item_change(sender, instance, origin=None, **kwargs):
+    from base.models import Cart, CartItem
+    if CartItem.cart.is_cached(instance):
+        # carrinho ja carregado: sem consulta por item
+        invalidate_cart_snapshots([instance.cart.user_id])
+        return
+    if origin is not None:
+        # delete() de um queryset (ex: checkout): uma consulta por carrinho, não por item
+        seen = origin.__dict__.setdefault('_invalidated_carts', set())
+        if instance.cart_id in seen:
+            return
+        seen.add(instance.cart_id)
+    user_ids = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True)
+    invalidate_cart_snapshots(list(user_ids))
+
+@receiver(post_delete, sender='base.Cart')
+def invalidate_cart_on_delete(sender, instance, **kwargs):
+    invalidate_cart_snapshots([instance.user_id])
+
+@receiver(post_save, sender='base.BaseProduct')
+def invalidate_carts_on_product_change(sender, instance, created, **kwargs):
+    from base.models import CartItem
+    if created:
+        return
+    # apenas os carrinhos que contem o produto alterado
+    user_ids = CartItem.objects.filter(product=instance).values_list('cart__user_id', flat=True).distinct()
+    invalidate_cart_snapshots(list(user_ids))
+
+# PRODUCT IMAGE DERIVATIVES
+@receiver(post_save, sender='base.BaseProduct')
+def enqueue_product_image(sender, instance, **kwargs):
+    from base.services.image_pipeline import enqueue_image_job, needs_derivatives
+    # sem consulta quando a foto não mudou
+    if needs_derivatives(instance):
+        enqueue_image_job(instance)
+
+# CATALOG VERSION (ETag / Last-Modified)
+@receiver(post_save, sender='base.BaseProduct')
+@receiver(post_delete, sender='base.BaseProduct')
+def bump_products_version(sender, **kwargs):
+    bump_catalog_version('products')
+
+@receiver(post_save, sender='base.ProductVariation')
+@receiver(post_delete, sender='base.ProductVariation')
+def bump_variations_version(sender, **kwargs):
+    bump_catalog_version('variations')
+
+# SEARCH INDEX
+@receiver(post_save, sender='base.BaseProduct')
+def index_product(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+@receiver(post_delete, sender='base.BaseProduct')
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+@receiver(post_migrate)
+def setup_search_index(sender, **kwargs):
+    if sender.name == 'base':
+        get_search_backend().setup()
+
+# EXPORT TOMBSTONES
+EXPORTED_MODELS = {
+    'Order': 'orders',
+    'OrderItem': 'order_items',
+    'InventoryLog': 'inventory_logs',
+    'FinancialTransaction': 'financial_transactions',
+}
+
+@receiver(post_delete, sender='base.Order')
+@receiver(post_delete, sender='base.OrderItem')
+@receiver(post_delete, sender='base.InventoryLog')
+@receiver(post_delete, sender='base.FinancialTransaction')
+def record_export_tombstone(sender, instance, **kwargs):
+    from base.models import ExportTombstone
+    ExportTombstone.objects.create(dataset=EXPORTED_MODELS[sender.__name__], object_id=str(instance.pk))
+
+# FINANCIAL ROLLUPS
+def _rollup_key(transaction):
+    return (transaction.type, transaction.category, transaction.date)
+
+@receiver(pre_save, sender='base.FinancialTransaction')
+def remember_financial_transaction(sender, instance, **kwargs):
+    # guarda os valores antigos para desfazer a contribuição nos rollups em caso de edição
+    instance._rollup_previous = None
+    if not instance._state.adding and instance.pk:
+        instance._rollup_previous = sender.objects.filter(pk=instance.pk).values_list(
+            'type', 'category', 'date', 'amount').first()
+
+@receiver(post_save, sender='base.FinancialTransaction')
+def update_financial_rollups(sender, instance, **kwargs):
+    from base.services.finance_service import apply_to_rollups
+    changes = [(*_rollup_key(instance), Decimal(str(instance.amount)), 1)]
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        tx_type, category, day, amount = previous
+        changes.append((tx_type, category, day, -amount, -1))
+    apply_to_rollups(changes)
+
+@receiver(post_delete, sender='base.FinancialTransaction')
+def remove_from_financial_rollups(sender, instance, **kwargs):
+    from base.services.finance_service import apply_to_rollups
+    apply_to_rollups([(*_rollup_key(instance), -Decimal(str(instance.amount)), -1)])
@@ -66,8 +66,13 @@ class SecurityTests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+from . import throttling
+from .services import token_service
+
 class TwoFactorAuthTests(APITestCase):
     def setUp(self):
+        # os contadores de throttle não voltam com o rollback do teste
+        throttling.reset_throttles()
         self.user_without_2fa = BaseCustomUser.objects.create_user(
             username='user1', email='user1@test.com', password='password123')
         self.user_with_2fa = BaseCustomUser.objects.create_user(
@@ -93,43 +98,38 @@ class TwoFactorAuthTests(APITestCase):
         self.assertNotIn('refresh', response.data)
 
     def test_verify_otp_with_valid_code(self):
-        profile = self.user_with_2fa.security_profile
-        profile.otp_code = '123456'
-        profile.otp_created_at = timezone.now()
-        profile.save()
+        code = token_service.issue_otp(self.user_with_2fa)
         
         url = reverse('verify_2fa')
-        data = {'email': 'user2@test.com', 'otp_code': '123456'}
+        data = {'email': 'user2@test.com', 'otp_code': code}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
         self.assertIn('refresh', response.data)
+        # uso unico
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_verify_otp_with_invalid_code(self):
-        profile = self.user_with_2fa.security_profile
-        profile.otp_code = '123456'
-        profile.otp_created_at = timezone.now()
-        profile.save()
+        code = token_service.issue_otp(self.user_with_2fa)
         
         url = reverse('verify_2fa')
-        data = {'email': 'user2@test.com', 'otp_code': '999999'}
+        data = {'email': 'user2@test.com', 'otp_code': str((int(code) + 1) % 1000000).zfill(6)}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('invÃ¡lido', str(response.data))
 
     def test_verify_otp_with_expired_code(self):
-        profile = self.user_with_2fa.security_profile
-        profile.otp_code = '123456'
-        profile.otp_created_at = timezone.now() - timedelta(minutes=11)
-        profile.save()
+        code = token_service.issue_otp(self.user_with_2fa, now=timezone.now() - timedelta(minutes=11))
         url = reverse('verify_2fa')
-        data = {'email': 'user2@test.com', 'otp_code': '123456'}
+        data = {'email': 'user2@test.com', 'otp_code': code}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('expirado', str(response.data))
 
 class PasswordResetTests(APITestCase):
     def setUp(self):
+        throttling.reset_throttles()
         self.user = BaseCustomUser.objects.create_user(
             username='testuser', email='test@test.com', password='oldpassword123')
 
@@ -148,13 +148,10 @@ class PasswordResetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_reset_password_with_valid_token(self):
-        profile = self.user.security_profile
-        profile.reset_password_token = 'valid-token-123'
-        profile.reset_password_expires = timezone.now() + timedelta(hours=1)
-        profile.save()
+        token = token_service.issue_password_reset(self.user)
         
         url = reverse('password_reset')
-        data = {'token': 'valid-token-123', 'new_password': 'newpassword123'}
+        data = {'token': token, 'new_password': 'newpassword123'}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
@@ -170,13 +167,10 @@ class PasswordResetTests(APITestCase):
         self.assertIn('invÃ¡lido', str(response.data))
 
     def test_reset_password_with_expired_token(self):
-        profile = self.user.security_profile
-        profile.reset_password_token = 'expired-token'
-        profile.reset_password_expires = timezone.now() - timedelta(hours=1)
-        profile.save()
+        token = token_service.issue_password_reset(self.user, now=timezone.now() - timedelta(hours=2))
         
         url = reverse('password_reset')
-        data = {'token': 'expired-token', 'new_password': 'newpassword123'}
+        data = {'token': token, 'new_password': 'newpassword123'}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('expirado', str(response.data))
@@ -268,3 +262,1768 @@ class ArchitectureAndDecouplingTests(APITestCase):
         self.assertIn("total_orders_count", data_populated)
         self.assertEqual(data_populated["total_orders_count"], 5)
 
+
+import io
+from django.core.management import call_command
+from .models import ProductVariation
+
+class OrderTotalsTests(APITestCase):
+    def setUp(self):
+        self.user = BaseCustomUser.objects.create_user(
+            username='buyer', email='buyer@test.com', password='123')
+        self.product = BaseProduct.objects.create(name='Camiseta', price=Decimal('50.00'), stock=10)
+        self.variation = ProductVariation.objects.create(
+            product=self.product, name='Tamanho', value='GG', price_override=Decimal('65.00'), stock=5)
+
+    def test_order_item_keeps_price_snapshot(self):
+        order = Order.objects.create(client=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        OrderItem.objects.create(order=order, product=self.product, variation=self.variation, quantity=1)
+        self.assertEqual(order.total, Decimal('165.00'))
+
+        # mudança de preço no catalogo nao altera pedidos antigos
+        self.product.price = Decimal('80.00')
+        self.product.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('165.00'))
+
+        order.items.filter(variation=self.variation).get().delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('100.00'))
+
+    def test_refresh_totals_matches_items(self):
+        order = Order.objects.create(client=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=3)
+        Order.objects.filter(pk=order.pk).update(total=0)
+        Order.objects.all().refresh_totals()
+        order = Order.objects.with_items_total().get(pk=order.pk)
+        self.assertEqual(order.total, Decimal('150.00'))
+        self.assertEqual(order.items_total, order.total)
+
+    def test_item_changes_touch_updated_at(self):
+        order = Order.objects.create(client=self.user)
+        Order.objects.filter(pk=order.pk).update(updated_at=order.updated_at - timedelta(days=1))
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+        self.assertGreater(order.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(Order.objects.get(pk=order.pk).updated_at, order.updated_at)
+
+    def test_backfill_freezes_prices_and_recomputes_totals(self):
+        order = Order.objects.create(client=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        OrderItem.objects.create(order=order, product=self.product, variation=self.variation, quantity=1)
+        # linhas anteriores ao preço congelado
+        OrderItem.objects.update(unit_price=None)
+        Order.objects.update(total=0)
+        output = io.StringIO()
+        call_command('backfill_order_totals', stdout=output)
+        self.assertIn('2 item(ns)', output.getvalue())
+        self.assertEqual(Order.objects.get(pk=order.pk).total, Decimal('165.00'))
+        self.assertEqual(sorted(OrderItem.objects.values_list('unit_price', flat=True)), [Decimal('50.00'), Decimal('65.00')])
+
+    def test_changing_product_or_variation_reprices_the_line(self):
+        order = Order.objects.create(client=self.user)
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        other = BaseProduct.objects.create(name='Boné', price=Decimal('30.00'), stock=10)
+        other_variation = ProductVariation.objects.create(
+            product=other, name='Cor', value='Azul', price_override=Decimal('35.00'), stock=5)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('order-item-detail', args=[item.pk])
+
+        # variação de outro produto não é aceita (nem o price_override dela)
+        response = self.client.patch(url, {'variation': other_variation.pk})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('variation', response.data)
+
+        response = self.client.patch(url, {'variation': self.variation.pk})
+        self.assertEqual(response.data['unit_price'], '65.00')
+        response = self.client.patch(url, {'product': other.pk, 'variation': ''})
+        self.assertEqual(response.data['unit_price'], '30.00')
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('60.00'))
+
+        # sem troca de produto/variação o preço congelado se mantém
+        other.price = Decimal('99.00')
+        other.save()
+        response = self.client.patch(url, {'quantity': 1})
+        self.assertEqual(response.data['unit_price'], '30.00')
+
+    def test_order_list_query_count_is_constant(self):
+        for _ in range(20):
+            order = Order.objects.create(client=self.user)
+            OrderItem.objects.create(order=order, product=self.product, quantity=1)
+            OrderItem.objects.create(order=order, product=self.product, variation=self.variation, quantity=1)
+        self.client.force_authenticate(user=self.user)
+        # count + pedidos + itens com produto
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('order-list'), {'page_size': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['total'], '115.00')
+
+from django.core.cache import cache
+from .models import CartItem
+
+class CartSnapshotTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = BaseCustomUser.objects.create_user(
+            username='shopper', email='shopper@test.com', password='123')
+        self.cart = Cart.objects.create(user=self.user)
+        self.products = [
+            BaseProduct.objects.create(name=f'Item {i}', price=Decimal('10.00'), stock=10) for i in range(10)]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('cart-list')
+
+    def test_cart_read_queries_do_not_grow_with_items(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.cart, product=product, quantity=2) for product in self.products[1:])
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results'][0]['items']), 10)
+        self.assertEqual(response.data['results'][0]['total'], Decimal('190.00'))
+
+        # leitura seguinte vem do snapshot, sem consultas
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_snapshot_invalidated_by_item_and_product_changes(self):
+        item = CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+        self.client.get(self.url)
+
+        item.quantity = 3
+        item.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['total'], Decimal('30.00'))
+
+        self.products[0].price = Decimal('12.00')
+        self.products[0].save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['total'], Decimal('36.00'))
+
+        item.delete()
+        response = self.client.get(self.url)
+        self.assertNotIn('items', response.data['results'][0])
+
+import threading
+import uuid
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase
+from .models import InventoryLog, StockReservation
+from .services import stock_service
+
+class StockEngineTests(APITestCase):
+    def setUp(self):
+        self.user = BaseCustomUser.objects.create_user(
+            username='stock', email='stock@test.com', password='123')
+        self.product = BaseProduct.objects.create(name='Caneca', price=Decimal('20.00'), stock=5)
+
+    def test_out_movement_rejects_oversell(self):
+        InventoryLog.objects.create(product=self.product, type='OUT', quantity=3, reason='venda')
+        with self.assertRaises(stock_service.InsufficientStock):
+            InventoryLog.objects.create(product=self.product, type='OUT', quantity=3, reason='venda')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertEqual(InventoryLog.objects.filter(type='OUT').count(), 1)
+
+    def test_expired_reservation_returns_stock(self):
+        stock_service.reserve(self.product.pk, 4, ttl=timedelta(seconds=-1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual(stock_service.release_expired(), 4)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cart_item_reserves_stock(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('cart-item-list')
+        response = self.client.post(url, {'product': self.product.pk, 'quantity': 4})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {'product': self.product.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        item = CartItem.objects.get()
+        self.client.delete(reverse('cart-item-detail', args=[item.pk]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_cart_item_releases_only_its_own_reservation(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('cart-item-list')
+        first = self.client.post(url, {'product': self.product.pk, 'quantity': 2}).data['id']
+        second = self.client.post(url, {'product': self.product.pk, 'quantity': 3}).data['id']
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+        # editar a primeira linha não devolve o estoque reservado pela segunda
+        response = self.client.patch(reverse('cart-item-detail', args=[first]), {'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        response = self.client.patch(reverse('cart-item-detail', args=[first]), {'quantity': 3})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.delete(reverse('cart-item-detail', args=[first]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertEqual(list(StockReservation.objects.values_list('cart_item_id', 'quantity')), [(uuid.UUID(second), 3)])
+
+class StockConcurrencyTests(TransactionTestCase):
+    def test_concurrent_movements_match_ledger(self):
+        product = BaseProduct.objects.create(name='Disputado', price=Decimal('1.00'), stock=50)
+        sold, rejected, reserved = [], [], []
+
+        def worker(index):
+            for step in range(20):
+                while True:
+                    try:
+                        if step % 5 == 0:
+                            reserved.append(stock_service.reserve(product.pk, 1, ttl=timedelta(seconds=-1)))
+                        else:
+                            InventoryLog.objects.create(product=product, type='OUT', quantity=1, reason='stress')
+                            sold.append(index)
+                        break
+                    except stock_service.InsufficientStock:
+                        rejected.append(index)
+                        break
+                    except OperationalError:
+                        # sqlite em memoria sinaliza lock em vez de esperar; tenta de novo
+                        continue
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        outs = InventoryLog.objects.filter(product=product, type='OUT').count()
+        holds = sum(r.quantity for r in StockReservation.objects.filter(product=product))
+        self.assertEqual(outs, len(sold))
+        self.assertEqual(len(sold) + len(reserved) + len(rejected), 8 * 20)
+        self.assertEqual(product.stock, 50 - outs - holds)
+        self.assertGreaterEqual(product.stock, 0)
+
+        stock_service.release_expired()
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 50 - outs)
+
+import json
+import uuid
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+class InventoryBulkImportTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='estoquista', email='estoque@test.com', password='123', user_type='employee')
+        self.products = [
+            BaseProduct.objects.create(name=f'Lote {i}', price=Decimal('5.00'), stock=10) for i in range(30)]
+        self.variation = ProductVariation.objects.create(
+            product=self.products[0], name='Cor', value='Azul', stock=2)
+        self.url = reverse('inventory-log-bulk')
+        self.client.force_authenticate(user=self.staff_user)
+
+    def test_bulk_json_applies_net_delta_and_reports_row_errors(self):
+        movements = [
+            {'product': str(p.pk), 'type': 'IN', 'quantity': 5, 'reason': 'NF 123'} for p in self.products]
+        movements += [
+            {'product': str(self.products[0].pk), 'type': 'OUT', 'quantity': 12, 'reason': 'venda'},
+            {'product': str(self.products[0].pk), 'type': 'OUT', 'quantity': 10, 'reason': 'venda'},
+            {'product': str(self.products[1].pk), 'type': 'ADJUST', 'quantity': 1, 'reason': 'auditoria'},
+            {'product': str(self.products[1].pk), 'type': 'IN', 'quantity': 2, 'reason': 'devolução'},
+            {'product': str(self.products[0].pk), 'variation': self.variation.pk, 'type': 'OUT', 'quantity': 2, 'reason': 'venda'},
+            {'product': str(uuid.uuid4()), 'type': 'IN', 'quantity': 1, 'reason': 'fantasma'},
+            {'product': str(self.products[2].pk), 'type': 'SWAP', 'quantity': 1, 'reason': 'x'},
+        ]
+        # validação, leitura de estoque, bulk_create e um UPDATE por modelo
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, movements, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 34)
+        self.assertEqual([error['row'] for error in response.data['errors']], [32, 36, 37])
+
+        stocks = dict(BaseProduct.objects.values_list('pk', 'stock'))
+        self.assertEqual(stocks[self.products[0].pk], 3)
+        self.assertEqual(stocks[self.products[1].pk], 3)
+        self.assertEqual(stocks[self.products[2].pk], 15)
+        self.variation.refresh_from_db()
+        self.assertEqual(self.variation.stock, 0)
+        self.assertEqual(InventoryLog.objects.count(), 34)
+
+    def test_bulk_csv_upload(self):
+        content = "product,type,quantity,reason\n"
+        content += f"{self.products[3].pk},IN,7,fornecedor\n"
+        content += f"{self.products[4].pk},OUT,abc,fornecedor\n"
+        upload = SimpleUploadedFile('remessa.csv', content.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.products[3].refresh_from_db()
+        self.assertEqual(self.products[3].stock, 17)
+
+    def test_bad_lines_after_the_first_chunk_are_row_errors(self):
+        line = json.dumps({'product': str(self.products[5].pk), 'type': 'IN', 'quantity': 1, 'reason': 'NF'}).encode()
+        content = b'\n'.join([line] * 550 + [b'{"product": '] + [line] * 50 + [b'{"reason": "caf\xe9"}'])
+        upload = SimpleUploadedFile('remessa.jsonl', content, content_type='application/jsonl')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        # os chunks gravados aparecem no relatorio: reenviar o arquivo não é necessario nem seguro
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['rejected']), (600, 2))
+        self.assertEqual([error['row'] for error in response.data['errors']], [551, 602])
+        self.products[5].refresh_from_db()
+        self.assertEqual(self.products[5].stock, 610)
+
+    def test_bulk_requires_staff(self):
+        client_user = BaseCustomUser.objects.create_user(
+            username='curioso', email='curioso@test.com', password='123')
+        self.client.force_authenticate(user=client_user)
+        response = self.client.post(self.url, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.coffee = BaseProduct.objects.create(name='Café Especial Torrado', price=Decimal('30.00'))
+        self.mug = BaseProduct.objects.create(
+            name='Caneca de Porcelana', description='Ideal para <b>café</b> e chá', price=Decimal('25.00'))
+        self.sugar = BaseProduct.objects.create(name='Açúcar Mascavo', price=Decimal('8.00'))
+        self.url = reverse('product-list')
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.data['results']]
+
+    def test_search_is_ranked_and_accent_insensitive(self):
+        self.assertEqual(self.search('cafe'), ['Café Especial Torrado', 'Caneca de Porcelana'])
+        self.assertEqual(self.search('ACUCAR'), ['Açúcar Mascavo'])
+        self.assertEqual(self.search('cafe', ordering='price'), ['Caneca de Porcelana', 'Café Especial Torrado'])
+
+    def test_search_tolerates_typos_and_prefixes(self):
+        self.assertEqual(self.search('porcelama'), ['Caneca de Porcelana'])
+        self.assertEqual(self.search('masc'), ['Açúcar Mascavo'])
+
+    def test_index_follows_product_changes(self):
+        self.sugar.name = 'Açúcar Demerara'
+        self.sugar.save()
+        self.assertEqual(self.search('mascavo'), [])
+        self.assertEqual(self.search('demerara'), ['Açúcar Demerara'])
+        self.coffee.delete()
+        self.assertEqual(self.search('torrado'), [])
+
+    def test_name_filter_uses_index(self):
+        response = self.client.get(self.url, {'name': 'caneca'})
+        self.assertEqual([item['name'] for item in response.data['results']], ['Caneca de Porcelana'])
+
+from .models import FinancialTransaction
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='financeiro', email='financeiro@test.com', password='123', user_type='manager')
+        FinancialTransaction.objects.bulk_create(
+            FinancialTransaction(type='INCOME', amount=Decimal(i + 1), description=f'Venda {i}') for i in range(25))
+        self.client.force_authenticate(user=self.staff_user)
+
+    def test_cursor_walks_table_without_count(self):
+        url = reverse('financial-transaction-list') + '?cursor=&page_size=10'
+        seen = []
+        while url:
+            # uma unica consulta por pagina, sem COUNT(*)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        # todas as linhas tem a mesma data: o desempate por id garante a ordem estavel
+        self.assertEqual(seen, list(FinancialTransaction.objects.order_by('date', 'id').values_list('id', flat=True)))
+
+    def test_page_number_mode_is_still_default(self):
+        response = self.client.get(reverse('financial-transaction-list'))
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('inventory-log-list'), {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+from . import serializers as base_serializers
+
+class FastRepresentationTests(APITestCase):
+    def test_fast_path_matches_legacy_representation(self):
+        user = BaseCustomUser.objects.create_user(username='rep', email='rep@test.com', password='123')
+        product = BaseProduct.objects.create(name='Livro', price=Decimal('0.00'), stock=0, description='')
+        order = Order.objects.create(client=user)
+        OrderItem.objects.create(order=order, product=product, quantity=1)
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        crm, _ = CustomerCRM.objects.get_or_create(user=user)
+        FinancialTransaction.objects.create(type='EXPENSE', amount=Decimal('10.00'), description='Frete', order=order)
+
+        cases = [
+            (base_serializers.ProductSerializer, product),
+            (base_serializers.ProductDetailSerializer, product),
+            (base_serializers.OrderSerializer, order),
+            (base_serializers.CartSerializer, cart),
+            (base_serializers.CustomerCRMSerializer, crm),
+            (base_serializers.FinancialTransactionSerializer, FinancialTransaction.objects.get()),
+            (base_serializers.CustomUserSerializer, user),
+        ]
+        for serializer_class, instance in cases:
+            fast = serializer_class(instance).data
+            try:
+                base_serializers.CleanModelSerializer.use_fast_representation = False
+                legacy = serializer_class(instance).data
+            finally:
+                base_serializers.CleanModelSerializer.use_fast_representation = True
+            self.assertEqual(dict(fast), dict(legacy), serializer_class.__name__)
+
+from django.test import override_settings
+from .models import EmailOutbox
+from .services.fake_service import FakeEmailService
+from .services.outbox import OutboxWorker
+
+@override_settings(EMAIL_SERVICE='fake', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        FakeEmailService.reset()
+        throttling.reset_throttles()
+        self.user = BaseCustomUser.objects.create_user(
+            username='esquecido', email='esquecido@test.com', password='123')
+
+    def test_reset_request_only_enqueues(self):
+        response = self.client.post(reverse('password_reset_request'), {'email': 'esquecido@test.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(FakeEmailService.sent, [])
+        message = EmailOutbox.objects.get()
+        self.assertEqual((message.to, message.status), ('esquecido@test.com', 'pending'))
+
+        self.assertEqual(OutboxWorker(workers=1).run_once(), (1, 0))
+        self.assertEqual(FakeEmailService.sent[0]['to'], 'esquecido@test.com')
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'sent')
+
+    def test_failures_back_off_then_dead_letter(self):
+        FakeEmailService.fail_for.add('esquecido@test.com')
+        message = EmailOutbox.objects.create(to='esquecido@test.com', subject='Oi', body='<p>oi</p>')
+        worker = OutboxWorker(workers=1)
+        self.assertEqual(worker.run_once(), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        # ainda em backoff: nada a processar
+        self.assertEqual(worker.run_once(), (0, 0))
+
+        EmailOutbox.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(worker.run_once(), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'dead')
+        self.assertIn('Falha simulada', message.last_error)
+
+import io
+import os
+from django.core.management import call_command
+from .services import crm_service
+from .signals import orders_completed_signal
+
+class CRMMetricsTests(APITestCase):
+    def setUp(self):
+        self.user = BaseCustomUser.objects.create_user(username='fiel', email='fiel@test.com', password='123')
+        self.other = BaseCustomUser.objects.create_user(username='novo', email='novo@test.com', password='123')
+        self.product = BaseProduct.objects.create(name='Vinho', price=Decimal('40.00'), stock=100)
+
+    def test_batch_payments_are_coalesced_per_customer(self):
+        now = timezone.now()
+        payments = [
+            (self.user.id, Decimal('10.00'), now - timedelta(days=2)),
+            (self.user.id, Decimal('15.50'), now),
+            (self.other.id, Decimal('7.00'), now - timedelta(days=1)),
+        ]
+        # savepoint, um INSERT para perfis faltantes e um UPDATE por cliente
+        with self.assertNumQueries(2 + 1 + 2):
+            orders_completed_signal.send(sender=Order, payments=payments)
+        crm = CustomerCRM.objects.get(user=self.user)
+        self.assertEqual((crm.total_orders_count, crm.lifetime_value, crm.last_purchase_date), (2, Decimal('25.50'), now))
+        crm_service.apply_payments([(self.user.id, Decimal('1.00'), now - timedelta(days=5))])
+        crm.refresh_from_db()
+        self.assertEqual((crm.total_orders_count, crm.last_purchase_date), (3, now))
+
+    def test_rebuild_command_recomputes_from_paid_orders(self):
+        for quantity, paid in ((1, True), (2, True), (5, False)):
+            order = Order.objects.create(client=self.user)
+            OrderItem.objects.create(order=order, product=self.product, quantity=quantity)
+            order.payment_status = paid
+            order.save()
+        CustomerCRM.objects.filter(user=self.user).update(total_orders_count=99, lifetime_value=0)
+        call_command('rebuild_crm_metrics', stdout=io.StringIO())
+
+        crm = CustomerCRM.objects.get(user=self.user)
+        self.assertEqual((crm.total_orders_count, crm.lifetime_value), (2, Decimal('120.00')))
+        self.assertEqual(crm.last_purchase_date, Order.objects.filter(payment_status=True).latest('created_at').created_at)
+        other_crm = CustomerCRM.objects.filter(user=self.other).first()
+        self.assertTrue(other_crm is None or other_crm.total_orders_count == 0)
+
+from datetime import date
+from .models import FinancialRollup
+
+class FinancialRollupTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='contador', email='contador@test.com', password='123', user_type='admin')
+        self.client.force_authenticate(user=self.staff_user)
+
+    def rollup(self, period, tx_type, category=''):
+        return FinancialRollup.objects.get(period=period, type=tx_type, category=category)
+
+    def test_rollups_follow_writes(self):
+        income = FinancialTransaction.objects.create(type='INCOME', amount=Decimal('100.00'), description='Venda', category='loja')
+        FinancialTransaction.objects.create(type='INCOME', amount=Decimal('50.00'), description='Venda', category='loja')
+        expense = FinancialTransaction.objects.create(type='EXPENSE', amount=Decimal('30.00'), description='Frete')
+        self.assertEqual(self.rollup('day', 'INCOME', 'loja').total, Decimal('150.00'))
+        self.assertEqual(self.rollup('month', 'INCOME', 'loja').count, 2)
+
+        income.amount = Decimal('120.00')
+        income.save()
+        expense.delete()
+        self.assertEqual(self.rollup('month', 'INCOME', 'loja').total, Decimal('170.00'))
+        self.assertEqual(self.rollup('day', 'EXPENSE').total, Decimal('0.00'))
+
+    def test_summary_with_opening_and_running_balance(self):
+        rows = [
+            (date(2026, 1, 10), 'INCOME', '500.00'),
+            (date(2026, 2, 5), 'EXPENSE', '200.00'),
+            (date(2026, 2, 20), 'INCOME', '100.00'),
+            (date(2026, 3, 1), 'INCOME', '50.00'),
+        ]
+        for day, tx_type, amount in rows:
+            tx = FinancialTransaction.objects.create(type=tx_type, amount=Decimal(amount), description='x')
+            FinancialTransaction.objects.filter(pk=tx.pk).update(date=day)
+        call_command('rebuild_financial_rollups', stdout=io.StringIO())
+
+        url = reverse('financial-transaction-summary')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'start': '2026-02-01', 'end': '2026-02-28'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['opening_balance'], Decimal('500.00'))
+        self.assertEqual(response.data['net'], Decimal('-100.00'))
+        self.assertEqual([p['balance'] for p in response.data['periods']], [Decimal('300.00'), Decimal('400.00')])
+
+        response = self.client.get(url, {'start': '2026-01-15', 'end': '2026-03-31', 'period': 'month'})
+        self.assertEqual([str(p['period_start']) for p in response.data['periods']], ['2026-01-01', '2026-02-01', '2026-03-01'])
+        self.assertEqual(response.data['closing_balance'], Decimal('450.00'))
+
+    def test_summary_requires_valid_range(self):
+        response = self.client.get(reverse('financial-transaction-summary'), {'start': '2026-03-01', 'end': '2026-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+import io
+import tempfile
+import pyarrow.parquet as pq
+from .services import export_service
+
+class ColumnarExportTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='analista', email='analista@test.com', password='123', user_type='admin')
+        self.product = BaseProduct.objects.create(name='Caneca', price=Decimal('25.00'), slug='caneca', stock=100)
+        self.output = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+
+    def add_transactions(self, count):
+        for i in range(count):
+            FinancialTransaction.objects.create(type='INCOME', amount=Decimal('10.00') + i, description=f'venda {i}')
+
+    def read_parquet(self, name):
+        return pq.read_table(os.path.join(self.output.name, name)).sort_by('id')
+
+    def test_incremental_parquet_runs_only_append_new_rows(self):
+        self.add_transactions(5)
+        result = export_service.export_dataset('financial_transactions', self.output.name, batch_size=2)
+        self.assertEqual(result['rows'], 5)
+        self.add_transactions(3)
+        self.assertEqual(export_service.export_dataset('financial_transactions', self.output.name)['rows'], 3)
+        self.assertEqual(export_service.export_dataset('financial_transactions', self.output.name)['rows'], 0)
+
+        table = self.read_parquet('financial_transactions')
+        self.assertEqual(table.num_rows, 8)
+        self.assertEqual(len(set(table.column('id').to_pylist())), 8)
+        self.assertEqual(table.column('amount').to_pylist()[0], Decimal('10.00'))
+        self.assertEqual(len(os.listdir(os.path.join(self.output.name, 'financial_transactions'))), 2)
+
+        # run completo reescreve o destino em vez de duplicar
+        call_command('export_data', 'financial_transactions', '--full', '--output', self.output.name, stdout=io.StringIO())
+        self.assertEqual(self.read_parquet('financial_transactions').num_rows, 8)
+
+    def test_changed_orders_are_exported_again(self):
+        order = Order.objects.create(client=self.staff_user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        call_command('export_data', 'orders', 'order_items', '--output', self.output.name, stdout=io.StringIO())
+        order.status = 'preparing'
+        order.save()
+        call_command('export_data', 'orders', 'order_items', '--output', self.output.name, stdout=io.StringIO())
+
+        orders = pq.read_table(os.path.join(self.output.name, 'orders'))
+        self.assertEqual(orders.column('status').to_pylist(), ['pending', 'preparing'])
+        self.assertEqual(orders.column('id').to_pylist(), [str(order.pk)] * 2)
+        items = self.read_parquet('order_items')
+        self.assertEqual(items.column('unit_price').to_pylist(), [Decimal('25.00')])
+
+    def test_edited_and_deleted_rows_are_exported_again(self):
+        order = Order.objects.create(client=self.staff_user)
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        self.add_transactions(2)
+        names = ['order_items', 'financial_transactions', 'deletions']
+        call_command('export_data', *names, '--output', self.output.name, stdout=io.StringIO())
+
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.patch(reverse('order-item-detail', args=[item.pk]), {'quantity': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second = FinancialTransaction.objects.order_by('id')
+        first.description = 'venda corrigida'
+        first.save()
+        deleted_pk = second.pk
+        second.delete()
+        results = [export_service.export_dataset(name, self.output.name) for name in names]
+        self.assertEqual([result['rows'] for result in results], [1, 1, 1])
+
+        items = pq.read_table(os.path.join(self.output.name, 'order_items'))
+        self.assertEqual(items.column('quantity').to_pylist(), [2, 3])
+        transactions = pq.read_table(os.path.join(self.output.name, 'financial_transactions'))
+        self.assertEqual(transactions.column('description').to_pylist()[-1], 'venda corrigida')
+        deletions = self.read_parquet('deletions')
+        self.assertEqual(deletions.column('dataset').to_pylist(), ['financial_transactions'])
+        self.assertEqual(deletions.column('object_id').to_pylist(), [str(deleted_pk)])
+
+    def test_lance_dataset_appends(self):
+        try:
+            import lance
+        except ImportError:
+            self.skipTest('pylance não instalado')
+        InventoryLog.objects.create(product=self.product, type='IN', quantity=5, reason='compra')
+        export_service.export_dataset('inventory_logs', self.output.name, fmt='lance')
+        InventoryLog.objects.create(product=self.product, type='OUT', quantity=2, reason='venda')
+        export_service.export_dataset('inventory_logs', self.output.name, fmt='lance')
+        dataset = lance.dataset(os.path.join(self.output.name, 'inventory_logs.lance'))
+        self.assertEqual(dataset.count_rows(), 2)
+
+    def test_endpoint_streams_parquet_with_watermark(self):
+        self.add_transactions(3)
+        url = reverse('data-export', args=['financial_transactions'])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 3)
+
+        watermark = response['X-Export-Watermark']
+        self.assertEqual(self.client.get(url, {'since': watermark}).status_code, status.HTTP_204_NO_CONTENT)
+        self.add_transactions(1)
+        response = self.client.get(url, {'since': watermark})
+        self.assertEqual(pq.read_table(io.BytesIO(b''.join(response.streaming_content))).num_rows, 1)
+
+        self.assertEqual(self.client.get(url, {'since': 'xx'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('data-export', args=['users'])).status_code, status.HTTP_404_NOT_FOUND)
+
+
+from datetime import datetime
+from .models import CustomerCRM
+
+class AnalyticsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='gerente', email='gerente@test.com', password='123', user_type='manager')
+        self.ana = BaseCustomUser.objects.create_user(
+            username='ana', email='ana@test.com', password='123', birth_date=date(1996, 5, 1))
+        self.bia = BaseCustomUser.objects.create_user(
+            username='bia', email='bia@test.com', password='123')
+        self.caneca = BaseProduct.objects.create(name='Caneca', price=Decimal('10.00'), slug='caneca-a')
+        self.copo = BaseProduct.objects.create(name='Copo', price=Decimal('5.00'), slug='copo-a')
+        self.order(self.ana, date(2026, 1, 10), [(self.caneca, 2)])
+        self.order(self.ana, date(2026, 3, 2), [(self.copo, 1)])
+        self.order(self.bia, date(2026, 2, 14), [(self.caneca, 1), (self.copo, 2)])
+        self.order(self.bia, date(2026, 2, 20), [(self.caneca, 1)], status='canceled')
+        tx = FinancialTransaction.objects.create(type='INCOME', amount=Decimal('100.00'), description='Aporte')
+        FinancialTransaction.objects.filter(pk=tx.pk).update(date=date(2026, 1, 15))
+        CustomerCRM.objects.create(user=self.ana, lifetime_value=Decimal('650.00'))
+        CustomerCRM.objects.create(user=self.bia, lifetime_value=Decimal('20.00'))
+        self.client.force_authenticate(user=self.staff_user)
+        self.window = {'start': '2026-01-01', 'end': '2026-03-31', 'period': 'month'}
+
+    def order(self, client, day, items, status='pending'):
+        order = Order.objects.create(client=client, status=status)
+        for product, quantity in items:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        created = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=12)))
+        Order.objects.filter(pk=order.pk).update(created_at=created, payment_status=True)
+        return order
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(f'analytics-{name}'), {**self.window, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_revenue_and_top_products(self):
+        revenue = self.get('revenue')
+        self.assertEqual([row['revenue'] for row in revenue], [Decimal('20.00'), Decimal('20.00'), Decimal('5.00')])
+        self.assertEqual(revenue[0]['income'], Decimal('100.00'))
+        self.assertEqual(len(self.get('revenue', period='week')), 14)
+
+        top = self.get('top-products', top=1)
+        self.assertEqual(top, [{'product': str(self.caneca.pk), 'name': 'Caneca', 'revenue': Decimal('30.00'), 'quantity': 3}])
+        statuses = {row['status']: row['orders'] for row in self.get('orders-by-status')}
+        self.assertEqual((statuses['pending'], statuses['canceled']), (3, 1))
+
+    def test_cohorts_and_customer_pyramid(self):
+        cohorts = self.get('cohorts')
+        self.assertEqual([(str(c['cohort']), c['retention']) for c in cohorts],
+                         [('2026-01-01', [1.0, 0.0, 1.0]), ('2026-02-01', [1.0, 0.0])])
+
+        customers = self.get('customers')
+        by_age = {band['age']: band for band in customers['age_bands']}
+        self.assertEqual(by_age['25-34']['customers'], 1)
+        self.assertEqual(by_age['25-34']['by_ltv'], [0, 0, 1, 0, 0])
+        self.assertEqual(by_age['desconhecida']['lifetime_value'], Decimal('20.00'))
+
+    def test_window_is_computed_once_and_staff_only(self):
+        self.get('revenue')
+        with self.assertNumQueries(0):
+            self.get('cohorts')
+        self.client.force_authenticate(user=self.ana)
+        response = self.client.get(reverse('analytics-revenue'), self.window)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+import time
+from email.utils import formatdate
+from .cache import CATALOG_VERSION_PREFIX
+
+class CatalogConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = BaseProduct.objects.create(name='Caderno', price=Decimal('12.00'), slug='caderno')
+        self.variation = ProductVariation.objects.create(product=self.product, name='Cor', value='Azul', stock=5)
+        self.list_url = reverse('product-list')
+        self.age_catalog()
+
+    def age_catalog(self, seconds=5):
+        # ultima mudança do catalogo num segundo que já terminou
+        for scope in ('products', 'variations'):
+            key = f'{CATALOG_VERSION_PREFIX}{scope}'
+            state = cache.get(key)
+            cache.set(key, {**state, 'modified': state['modified'] - seconds}, None)
+
+    def test_if_none_match_returns_304_until_catalog_changes(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        detail = reverse('product-detail', args=[self.product.pk])
+        self.assertNotEqual(self.client.get(detail)['ETag'], etag)
+
+        self.product.price = Decimal('15.00')
+        self.product.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        future = formatdate(time.time() + 60, usegmt=True)
+        past = formatdate(time.time() - 3600, usegmt=True)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=future).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=past).status_code, status.HTTP_200_OK)
+
+    def test_change_in_the_current_second_has_no_last_modified(self):
+        last_modified = self.client.get(self.list_url)['Last-Modified']
+        self.product.price = Decimal('13.00')
+        self.product.save()
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_etag_varies_by_user_class_and_variation_stock(self):
+        public = self.client.get(self.list_url)['ETag']
+        staff = BaseCustomUser.objects.create_user(username='staff', email='staff@test.com', password='123', user_type='admin')
+        self.client.force_authenticate(user=staff)
+        self.assertNotEqual(self.client.get(self.list_url)['ETag'], public)
+
+        url = reverse('product-variation-list')
+        etag = self.client.get(url)['ETag']
+        stock_service.decrement(self.product.pk, 1, variation_id=self.variation.pk)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+from .cache import reset_catalog_cache_stats
+
+class ProductResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_catalog_cache_stats()
+        self.product = BaseProduct.objects.create(name='Agenda', price=Decimal('30.00'), slug='agenda')
+        self.hidden = BaseProduct.objects.create(name='Agenda antiga', price=Decimal('20.00'), slug='agenda-antiga', is_active=False)
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='catalogo', email='catalogo@test.com', password='123', user_type='admin')
+        self.url = reverse('product-list')
+
+    def stats(self):
+        self.client.force_authenticate(user=self.staff_user)
+        data = self.client.get(reverse('product-cache-stats')).data['products']
+        self.client.force_authenticate(user=None)
+        return data['hits'], data['misses']
+
+    def test_normalized_params_share_an_entry(self):
+        first = self.client.get(self.url, {'min_price': '1', 'max_price': '100'})
+        with self.assertNumQueries(0):
+            second = self.client.get(f'{self.url}?max_price=100&min_price=1')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_catalog_change_invalidates(self):
+        self.client.get(self.url)
+        self.product.name = 'Agenda 2027'
+        self.product.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['name'], 'Agenda 2027')
+        self.assertEqual(self.stats(), (0, 2))
+
+    def test_staff_and_public_are_cached_separately(self):
+        response = self.client.get(self.url, {'is_active': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(self.url, {'is_active': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url, {'is_active': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('product-cache-stats')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+from django.db import connection as default_connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch
+from .models import Address, CRMInteraction, CRMTag, Supplier
+
+class QueryBudgetTests(APITestCase):
+    # Teto de consultas por endpoint do router (staff), para list e detail. O volume semeado
+    # é maior que a pagina usada, então um N+1 estoura o teto em vez de passar despercebido.
+    # Ao mudar um endpoint de proposito, ajuste o teto aqui junto com a mudança.
+    SEED = 40
+    PAGE_SIZE = 50
+    BUDGETS = {
+        'product': {'list': 2, 'detail': 1},
+        'product-variation': {'list': 2, 'detail': 1},
+        'user': {'list': 2, 'detail': 1},
+        'address': {'list': 2, 'detail': 1},
+        'order': {'list': 3, 'detail': 2},
+        'order-item': {'list': 2, 'detail': 1},
+        'cart': {'list': 3, 'detail': 2},
+        'cart-item': {'list': 2, 'detail': 1},
+        'crm-tag': {'list': 2, 'detail': 1},
+        'crm-customer': {'list': 4, 'detail': 3},
+        'crm-interaction': {'list': 2, 'detail': 1},
+        'supplier': {'list': 2, 'detail': 1},
+        'inventory-log': {'list': 2, 'detail': 1},
+        'financial-transaction': {'list': 2, 'detail': 1},
+    }
+    # endpoints usados pelo cliente final: o escopo por dono não pode trazer consultas extras
+    CLIENT_BUDGETS = {
+        'user': {'list': 2, 'detail': 1},
+        'address': {'list': 2, 'detail': 1},
+        'order': {'list': 3, 'detail': 2},
+        'cart-item': {'list': 2, 'detail': 1},
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='orcamento', email='orcamento@test.com', password='123', user_type='admin')
+        self.buyer = BaseCustomUser.objects.create_user(
+            username='comprador', email='comprador@test.com', password='123', user_type='client')
+        n = self.SEED
+        # bulk_create: o volume importa aqui, não os signals de cada linha
+        addresses = Address.objects.bulk_create(
+            Address(street=f'Rua {i}', city='Recife', state='PE', zip_code='50000-000') for i in range(n + 1))
+        users = BaseCustomUser.objects.bulk_create(
+            BaseCustomUser(username=f'cliente{i}', email=f'cliente{i}@test.com', address=addresses[i]) for i in range(n))
+        self.buyer.address = addresses[n]
+        self.buyer.save(update_fields=['address'])
+        products = BaseProduct.objects.bulk_create(
+            BaseProduct(name=f'Produto {i}', price=Decimal('10.00') + i, slug=f'produto-{i}') for i in range(n))
+        variations = ProductVariation.objects.bulk_create(
+            ProductVariation(product=products[i], name='Cor', value=f'Cor {i}', stock=10) for i in range(n))
+        orders = Order.objects.bulk_create(
+            Order(client=self.buyer if i % 2 else users[i], total=Decimal('30.00')) for i in range(n))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=orders[i], product=products[(i + k) % n], quantity=1, unit_price=Decimal('10.00'))
+            for i in range(n) for k in range(3))
+        carts = Cart.objects.bulk_create([Cart(user=self.buyer)] + [Cart(user=users[i]) for i in range(n - 1)])
+        CartItem.objects.bulk_create(
+            CartItem(cart=carts[i % len(carts)], product=products[(i + k) % n], quantity=1)
+            for i in range(n) for k in range(2))
+        tags = CRMTag.objects.bulk_create(CRMTag(name=f'Tag {i}') for i in range(5))
+        customers = CustomerCRM.objects.bulk_create(CustomerCRM(user=users[i]) for i in range(n))
+        for i, customer in enumerate(customers):
+            customer.tags.set(tags[:i % 5 + 1])
+        CRMInteraction.objects.bulk_create(
+            CRMInteraction(customer=customers[i], agent=self.staff_user if k else users[i], type='call',
+                           subject='Retorno', description='Contato')
+            for i in range(n) for k in range(2))
+        suppliers = Supplier.objects.bulk_create(Supplier(name=f'Fornecedor {i}') for i in range(n))
+        InventoryLog.objects.bulk_create(
+            InventoryLog(product=products[i], variation=variations[i], type='IN', quantity=5,
+                         reason='Reposição', user=users[i]) for i in range(n))
+        FinancialTransaction.objects.bulk_create(
+            FinancialTransaction(type='EXPENSE', amount=Decimal('50.00'), description='Compra',
+                                 order=orders[i], supplier=suppliers[i]) for i in range(n))
+        self.details = {
+            'product': products[0].pk,
+            'product-variation': variations[0].pk,
+            'user': self.buyer.pk,
+            'address': addresses[n].pk,
+            'order': orders[1].pk,
+            'order-item': OrderItem.objects.filter(order=orders[1]).values_list('pk', flat=True).first(),
+            'cart': carts[0].pk,
+            'cart-item': CartItem.objects.filter(cart=carts[0]).values_list('pk', flat=True).first(),
+            'crm-tag': tags[0].pk,
+            'crm-customer': customers[4].pk,
+            'crm-interaction': CRMInteraction.objects.values_list('pk', flat=True).first(),
+            'supplier': suppliers[0].pk,
+            'inventory-log': InventoryLog.objects.values_list('pk', flat=True).first(),
+            'financial-transaction': FinancialTransaction.objects.values_list('pk', flat=True).first(),
+        }
+
+    def routed_endpoints(self):
+        # import tardio: base.urls importa este modulo (ProtectedHelloView)
+        from .urls import router
+        for _, _, basename in router.registry:
+            for kind in ('list', 'detail'):
+                try:
+                    reverse(f'{basename}-{kind}', args=[] if kind == 'list' else [0])
+                except NoReverseMatch:
+                    continue
+                yield basename, kind
+
+    def url_for(self, basename, kind):
+        if kind == 'list':
+            return reverse(f'{basename}-list'), {'page_size': self.PAGE_SIZE}
+        return reverse(f'{basename}-detail', args=[self.details[basename]]), {}
+
+    def assert_within_budget(self, basename, kind, budget):
+        url, params = self.url_for(basename, kind)
+        # sem respostas ou snapshots em cache: mede o caminho que vai ao banco
+        cache.clear()
+        with CaptureQueriesContext(default_connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, f'{basename}-{kind}: {response.status_code}')
+        if len(captured) > budget:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(captured.captured_queries, 1))
+            self.fail(f'{basename}-{kind}: {len(captured)} consultas (teto {budget})\n{queries}')
+
+    def test_every_router_endpoint_has_a_budget(self):
+        missing = [f'{basename}-{kind}' for basename, kind in self.routed_endpoints()
+                   if kind not in self.BUDGETS.get(basename, {})]
+        self.assertEqual(missing, [])
+
+    def test_staff_endpoints_within_budget(self):
+        self.client.force_authenticate(user=self.staff_user)
+        for basename, kind in self.routed_endpoints():
+            with self.subTest(endpoint=f'{basename}-{kind}'):
+                self.assert_within_budget(basename, kind, self.BUDGETS[basename][kind])
+
+    def test_client_endpoints_within_budget(self):
+        self.client.force_authenticate(user=self.buyer)
+        for basename, budgets in self.CLIENT_BUDGETS.items():
+            for kind, budget in budgets.items():
+                with self.subTest(endpoint=f'{basename}-{kind}'):
+                    self.assert_within_budget(basename, kind, budget)
+
+    def test_failure_reports_the_offending_sql(self):
+        self.client.force_authenticate(user=self.staff_user)
+        with self.assertRaises(AssertionError) as raised:
+            self.assert_within_budget('crm-customer', 'list', 0)
+        self.assertIn('SELECT', str(raised.exception))
+        self.assertIn('crm-customer-list', str(raised.exception))
+
+
+import json
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.serializers import BaseSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from .middleware import RequestProfilingMiddleware
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SLOW_MS=0, REQUEST_PROFILING_SAMPLE_RATE=1.0)
+class RequestProfilingTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='perfil', email='perfil@test.com', password='123', user_type='admin')
+        product = BaseProduct.objects.create(name='Caderno', price=Decimal('12.00'), slug='caderno-perfil')
+        order = Order.objects.create(client=self.staff_user, total=Decimal('12.00'))
+        OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=Decimal('12.00'))
+        self.client.force_authenticate(user=self.staff_user)
+
+    def metrics(self, response):
+        metrics = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_server_timing_header(self):
+        with self.assertLogs('base.profiling'):
+            with CaptureQueriesContext(default_connection) as captured:
+                response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.metrics(response)
+        self.assertEqual(set(metrics), {'sql', 'view', 'serialize', 'render', 'total'})
+        self.assertEqual(metrics['sql']['desc'], f'"{len(captured)} queries"')
+        self.assertGreater(float(metrics['serialize']['dur']), 0)
+        self.assertGreater(float(metrics['render']['dur']), 0)
+        # a medição é feita pelo CleanModelSerializer; classes do DRF não são alteradas
+        self.assertEqual(BaseSerializer.data.fget.__module__, 'rest_framework.serializers')
+        self.assertGreaterEqual(float(metrics['total']['dur']), float(metrics['view']['dur']))
+
+    def test_slow_request_log_line(self):
+        with self.assertLogs('base.profiling', level='WARNING') as logs:
+            self.client.get(reverse('order-list'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['endpoint'], 'order-list')
+        self.assertEqual(entry['user_type'], 'admin')
+        self.assertEqual(entry['status'], 200)
+        self.assertTrue(entry['top_queries'])
+        self.assertLessEqual(len(entry['top_queries']), 5)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_sampling_and_threshold(self):
+        with self.assertNoLogs('base.profiling'):
+            response = self.client.get(reverse('order-list'))
+        self.assertIn('Server-Timing', response)
+        with override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_SLOW_MS=60_000):
+            self.client = self.client_class()
+            self.client.force_authenticate(user=self.staff_user)
+            with self.assertNoLogs('base.profiling'):
+                self.client.get(reverse('order-list'))
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled_is_out_of_the_chain(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(lambda request: None)
+        response = self.client.get(reverse('order-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_async_chain_stays_async(self):
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(RequestProfilingMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(RequestProfilingMiddleware(lambda request: None)))
+        # view async atras do middleware: as queries feitas via sync_to_async também são medidas
+        token = RefreshToken.for_user(self.staff_user).access_token
+        with self.assertLogs('base.profiling', level='WARNING') as logs:
+            response = async_to_sync(self.async_client.get)(
+                reverse('async-order-list'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.metrics(response)
+        self.assertNotEqual(metrics['sql']['desc'], '"0 queries"')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['endpoint'], 'async-order-list')
+
+
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import LiveServerTestCase
+from . import loadtest
+from .services.seed_service import DEFAULT_PASSWORD
+
+class SeedDataTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.reset_throttles()
+
+    def test_seed_is_consistent(self):
+        call_command('seed_data', products=30, users=12, orders=60, prefix='t', stdout=io.StringIO())
+        self.assertEqual(BaseProduct.objects.filter(slug__startswith='t-').count(), 30)
+        self.assertEqual(ProductVariation.objects.count(), 90)
+        self.assertEqual(UserSecurityProfile.objects.count(), BaseCustomUser.objects.count())
+        self.assertEqual(Order.objects.count(), 60)
+        for order in Order.objects.with_items_total():
+            self.assertEqual(order.total, order.items_total)
+        paid = Order.objects.filter(payment_status=True)
+        self.assertEqual(FinancialTransaction.objects.filter(type='INCOME').count(), paid.count())
+        self.assertEqual(CustomerCRM.objects.aggregate(n=Sum('total_orders_count'))['n'], paid.count())
+        self.assertEqual(FinancialRollup.objects.filter(period='month').aggregate(n=Sum('count'))['n'],
+                         FinancialTransaction.objects.count())
+        # datas espalhadas no periodo, não todas "agora"
+        self.assertGreater(Order.objects.dates('created_at', 'month').count(), 1)
+        self.assertGreater(FinancialTransaction.objects.dates('date', 'month').count(), 1)
+
+    def test_seeded_users_can_log_in(self):
+        call_command('seed_data', products=5, users=3, orders=5, prefix='login', stdout=io.StringIO())
+        response = self.client.post(reverse('token_obtain_pair'), {'email': 'login-1@seed.local', 'password': DEFAULT_PASSWORD})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        staff = BaseCustomUser.objects.get(email='login-staff@seed.local')
+        self.assertTrue(staff.is_staff)
+
+    def test_prefix_must_be_new(self):
+        call_command('seed_data', products=2, users=2, orders=2, prefix='dup', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_data', products=2, users=2, orders=2, prefix='dup', stdout=io.StringIO())
+
+class LoadTestTests(LiveServerTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([7], 95), 7)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+    def test_report_against_live_server(self):
+        call_command('seed_data', products=20, users=4, orders=20, prefix='carga', stdout=io.StringIO())
+        output = io.StringIO()
+        call_command('loadtest', url=self.live_server_url, requests=6, concurrency=2, prefix='carga', stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(set(report['results']), set(loadtest.SCENARIOS))
+        for name, result in report['results'].items():
+            self.assertEqual(result['requests'], 6, name)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+            self.assertGreater(result['throughput_rps'], 0)
+        delta = loadtest.compare(report, report)
+        self.assertEqual(delta['cart']['p95_ms'], 0)
+
+    def test_setup_login_waits_for_retry_after(self):
+        class ThrottledClient(loadtest.HttpClient):
+            def __init__(self, responses):
+                super().__init__('http://carga.invalid')
+                self.responses = responses
+
+            def send(self, *args, **kwargs):
+                return self.responses.pop(0)
+
+        client = ThrottledClient([(429, b'', {'Retry-After': '0'}), (200, b'{"access": "abc"}', {})])
+        self.assertEqual(client.obtain_token('carga-0@seed.local', 'x'), 'abc')
+        client = ThrottledClient([(429, b'', {'Retry-After': '60'})])
+        with self.assertRaises(loadtest.LoadTestError):
+            client.obtain_token('carga-0@seed.local', 'x', max_wait=10)
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', 'checkout', url=self.live_server_url, stdout=io.StringIO())
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = BaseCustomUser.objects.create_user(
+            username='checkout', email='checkout@test.com', password='123')
+        self.cart = Cart.objects.create(user=self.user)
+        self.products = BaseProduct.objects.bulk_create(
+            BaseProduct(name=f'Linha {i}', slug=f'linha-{i}', price=Decimal('5.00') + i, stock=20) for i in range(50))
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('cart-checkout')
+
+    def fill_cart(self, lines, reserve=True):
+        for product in self.products[:lines]:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=2)
+            if reserve:
+                stock_service.reserve(product.pk, 2, cart_id=self.cart.pk)
+
+    def checkout_queries(self, lines):
+        with CaptureQueriesContext(default_connection) as captured:
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response, len(captured)
+
+    def test_reserved_cart_becomes_an_order(self):
+        self.fill_cart(50)
+        response, _ = self.checkout_queries(50)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.items.count(), 50)
+        expected = sum((product.price * 2 for product in self.products), Decimal('0.00'))
+        self.assertEqual(order.total, expected)
+        self.assertEqual(Decimal(response.data['total']), expected)
+        self.assertEqual(response.data['items'][0]['product_name'], 'Linha 0')
+        # o estoque ja tinha sido debitado pelas reservas: não é debitado de novo
+        self.assertEqual(set(BaseProduct.objects.values_list('stock', flat=True)), {18})
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual(InventoryLog.objects.filter(type='OUT', quantity=2).count(), 50)
+
+    def test_checkout_clears_the_cart_snapshot(self):
+        self.fill_cart(3)
+        self.assertEqual(len(self.client.get(reverse('cart-list')).data['results'][0]['items']), 3)
+        self.checkout_queries(3)
+        # carrinho vazio: lista vazia é omitida
+        self.assertNotIn('items', self.client.get(reverse('cart-list')).data['results'][0])
+
+    def test_price_snapshot(self):
+        self.fill_cart(1)
+        response, _ = self.checkout_queries(1)
+        BaseProduct.objects.filter(pk=self.products[0].pk).update(price=Decimal('99.00'))
+        item = OrderItem.objects.get(order_id=response.data['id'])
+        self.assertEqual(item.unit_price, Decimal('5.00'))
+
+    def test_query_count_does_not_grow_with_lines(self):
+        self.fill_cart(5, reserve=False)
+        _, small = self.checkout_queries(5)
+        self.fill_cart(50, reserve=False)
+        _, large = self.checkout_queries(50)
+        self.assertEqual(small, large)
+        # o delete() dos itens custa 3 consultas fixas: leitura, SET_NULL das reservas e o carrinho do snapshot
+        self.assertLessEqual(large, 15)
+        # sem reserva, o checkout debita o estoque
+        self.assertEqual(BaseProduct.objects.get(pk=self.products[0].pk).stock, 16)
+        self.assertEqual(BaseProduct.objects.get(pk=self.products[49].pk).stock, 18)
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.fill_cart(3, reserve=False)
+        BaseProduct.objects.filter(pk=self.products[2].pk).update(stock=1)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['product'], str(self.products[2].pk))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 3)
+        self.assertEqual(BaseProduct.objects.get(pk=self.products[0].pk).stock, 20)
+
+    def test_partial_reservation_debits_only_the_difference(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=5)
+        stock_service.reserve(self.products[0].pk, 2, cart_id=self.cart.pk)
+        self.checkout_queries(1)
+        self.assertEqual(BaseProduct.objects.get(pk=self.products[0].pk).stock, 15)
+
+    def test_empty_cart(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+
+
+from .services.order_service import bulk_transition
+
+class OrderTransitionTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='cozinha', email='cozinha@test.com', password='123', user_type='employee')
+        self.buyers = [BaseCustomUser.objects.create_user(
+            username=f'cliente-{i}', email=f'cliente-{i}@test.com', password='123') for i in range(3)]
+        self.orders = Order.objects.bulk_create(
+            Order(client=self.buyers[i % 3], total=Decimal('10.00') + i) for i in range(30))
+        self.url = reverse('order-bulk-transition')
+
+    def test_save_uses_loaded_values(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.status = 'preparing'
+        self.assertTrue(order.has_changed('status'))
+        self.assertFalse(order.has_changed('payment_status'))
+        # só o UPDATE: o payment_status anterior veio com a instancia
+        with self.assertNumQueries(1):
+            order.save()
+        self.assertFalse(order.has_changed('status'))
+
+    def test_payment_signal_fires_once_per_transition(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.payment_status = True
+        order.save()
+        order.status = 'ready'
+        order.save()
+        crm = CustomerCRM.objects.get(user=self.buyers[0])
+        self.assertEqual(crm.total_orders_count, 1)
+
+    def test_refresh_after_bulk_payment_does_not_fire_again(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        bulk_transition([order.pk], payment_status=True)
+        order.refresh_from_db()
+        self.assertFalse(order.has_changed('payment_status'))
+        order.status = 'ready'
+        order.save()
+        crm = CustomerCRM.objects.get(user=self.buyers[0])
+        self.assertEqual(crm.total_orders_count, 1)
+        self.assertEqual(crm.lifetime_value, order.total)
+
+    def test_deferred_payment_status_falls_back_to_query(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(payment_status=True)
+        order = Order.objects.only('id', 'status').get(pk=self.orders[0].pk)
+        order.status = 'ready'
+        order.save()
+        self.assertFalse(CustomerCRM.objects.filter(user=self.buyers[0]).exists())
+
+    def test_bulk_transition_in_one_update(self):
+        self.client.force_authenticate(user=self.staff_user)
+        ids = [str(order.pk) for order in self.orders]
+        with CaptureQueriesContext(default_connection) as captured:
+            response = self.client.post(self.url, {'ids': ids, 'status': 'preparing'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': 30, 'paid': 0, 'not_found': []})
+        self.assertEqual([query['sql'].split()[0] for query in captured].count('UPDATE'), 1)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'preparing'})
+
+    def test_bulk_payment_emits_one_batch_event(self):
+        self.client.force_authenticate(user=self.staff_user)
+        Order.objects.filter(pk=self.orders[0].pk).update(payment_status=True)
+        ids = [str(order.pk) for order in self.orders[:9]]
+        events = []
+        receiver = lambda sender, payments, **kwargs: events.append(payments)
+        orders_completed_signal.connect(receiver)
+        try:
+            response = self.client.post(self.url, {'ids': ids, 'payment_status': True, 'status': 'ready'}, format='json')
+        finally:
+            orders_completed_signal.disconnect(receiver)
+        self.assertEqual(response.data['paid'], 8)
+        self.assertEqual(len(events), 1)
+        # o pedido 0 ja estava pago: não conta de novo no CRM
+        counts = dict(CustomerCRM.objects.values_list('user__username', 'total_orders_count'))
+        self.assertEqual(counts, {'cliente-0': 2, 'cliente-1': 3, 'cliente-2': 3})
+        response = self.client.post(self.url, {'ids': ids, 'payment_status': True}, format='json')
+        self.assertEqual(response.data['paid'], 0)
+
+    def test_bulk_transition_validation_and_permissions(self):
+        missing = str(uuid.uuid4())
+        self.client.force_authenticate(user=self.buyers[0])
+        response = self.client.post(self.url, {'ids': [str(self.orders[0].pk)], 'status': 'ready'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.post(self.url, {'ids': [str(self.orders[0].pk)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'ids': [str(self.orders[0].pk)], 'status': 'teleported'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'ids': [str(self.orders[0].pk), missing], 'status': 'ready'}, format='json')
+        self.assertEqual(response.data['not_found'], [missing])
+
+
+from django.urls import resolve
+from . import asgi_benchmark
+
+class AsyncReadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = BaseCustomUser.objects.create_user(username='leitor', email='leitor@test.com', password='123')
+        self.other = BaseCustomUser.objects.create_user(username='vizinho', email='vizinho@test.com', password='123')
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='gerente', email='gerente@test.com', password='123', user_type='admin')
+        self.products = BaseProduct.objects.bulk_create(
+            BaseProduct(name=f'Caneca {i}', slug=f'caneca-{i}', price=Decimal('9.90') + i, stock=50) for i in range(15))
+        self.hidden = BaseProduct.objects.create(name='Fora de linha', slug='fora', price=Decimal('1.00'), is_active=False)
+        for i, client in enumerate([self.buyer] * 3 + [self.other] * 2):
+            order = Order.objects.create(client=client, total=Decimal('0.00'))
+            OrderItem.objects.create(order=order, product=self.products[i], quantity=2, unit_price=self.products[i].price)
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=3)
+
+    def aget(self, name, *args, user=None, data=None, **headers):
+        if user is not None:
+            headers['Authorization'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        return async_to_sync(self.async_client.get)(reverse(name, args=args), data, headers=headers)
+
+    def sync_get(self, name, *args, user=None, data=None):
+        self.client.force_authenticate(user=user)
+        return self.client.get(reverse(name, args=args), data)
+
+    def test_routes_are_async(self):
+        for name, args in [('async-product-list', ()), ('async-product-detail', (self.products[0].pk,)),
+                           ('async-cart-list', ()), ('async-order-list', ())]:
+            self.assertTrue(iscoroutinefunction(resolve(reverse(name, args=args)).func), name)
+
+    def test_products_match_sync_views(self):
+        response = self.aget('async-product-list', data={'page': 2, 'ordering': '-price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = self.sync_get('product-list', data={'page': 2, 'ordering': '-price'}).json()
+        self.assertEqual(response.json()['count'], 15)
+        self.assertEqual(response.json()['results'], expected['results'])
+        self.assertIn('/api/async/products/', response.json()['previous'])
+        pk = self.products[3].pk
+        self.assertEqual(self.aget('async-product-detail', pk).json(), self.sync_get('product-detail', pk).json())
+        self.assertEqual(self.aget('async-product-detail', self.hidden.pk).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.aget('async-product-detail', 'nao-e-uuid').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.aget('async-product-list', data={'page': 9}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_catalog_conditional_get(self):
+        response = self.aget('async-product-list')
+        self.assertIn('ETag', response)
+        response = self.aget('async-product-list', **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_orders_respect_owner_and_pagination(self):
+        self.assertEqual(self.aget('async-order-list').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.aget('async-order-list', user=self.buyer)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(response.json()['results'], self.sync_get('order-list', user=self.buyer).json()['results'])
+        self.assertEqual(self.aget('async-order-list', user=self.staff_user).json()['count'], 5)
+        keyset = self.aget('async-order-list', user=self.buyer, data={'cursor': '', 'page_size': 2}).json()
+        self.assertEqual(len(keyset['results']), 2)
+        self.assertIsNotNone(keyset['next'])
+
+    def test_cart_snapshot_and_creation(self):
+        response = self.aget('async-cart-list', user=self.buyer)
+        self.assertEqual(response.json(), self.sync_get('cart-list', user=self.buyer).json())
+        self.assertEqual(response.json()['results'][0]['items'][0]['quantity'], 3)
+        response = self.aget('async-cart-list', user=self.other)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('items', response.json()['results'][0])  # carrinho vazio: lista vazia é omitida
+        self.assertTrue(Cart.objects.filter(user=self.other).exists())
+
+
+class AsgiBenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_all_modes_serve_every_endpoint(self):
+        call_command('seed_data', products=10, users=2, orders=6, prefix='bancada', stdout=io.StringIO())
+        output = io.StringIO()
+        call_command('bench_asgi', requests=4, concurrency='1,2', client_delay=0, clients=2, prefix='bancada', stdout=output)
+        report = json.loads(output.getvalue())
+        for name in asgi_benchmark.ENDPOINTS:
+            for level in ('1', '2'):
+                for mode in asgi_benchmark.MODES:
+                    result = report['results'][name][level][mode]
+                    self.assertEqual((result['requests'], result['errors']), (4, 0), (name, level, mode))
+
+    def test_requires_seed_data(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_asgi', prefix='inexistente', stdout=io.StringIO())
+
+
+from .cache import get_cached_principal
+
+class PrincipalCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = BaseCustomUser.objects.create_user(username='portador', email='portador@test.com', password='123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('protected-hello')
+
+    def test_authenticated_get_skips_user_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        cached = get_cached_principal(self.user.pk)
+        # o perfil de segurança veio no mesmo SELECT
+        with self.assertNumQueries(0):
+            self.assertFalse(cached.security_profile.is_2fa_enabled)
+
+    def test_user_and_profile_saves_invalidate(self):
+        self.client.get(self.url)
+        profile = UserSecurityProfile.objects.get(user=self.user)
+        profile.is_2fa_enabled = True
+        profile.save()
+        self.assertIsNone(get_cached_principal(self.user.pk))
+        self.client.get(self.url)
+        self.assertTrue(get_cached_principal(self.user.pk).security_profile.is_2fa_enabled)
+
+        user = BaseCustomUser.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get(self.url)
+        BaseCustomUser.objects.get(pk=self.user.pk).delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+from django.contrib.auth.hashers import make_password
+from .services.user_import import DEFAULT_CHUNK_SIZE, PasswordHasher, import_users
+
+class UserImportTests(APITestCase):
+    def setUp(self):
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='rh', email='rh@test.com', password='123', user_type='admin')
+        self.rows = [{'email': f'migrado{i}@legado.com', 'name': f'Cliente {i}', 'password': f'senha-{i}'} for i in range(6)]
+
+    def test_import_hashes_in_pool_and_creates_related_rows(self):
+        self.rows[1]['internal_notes'] = 'VIP no sistema antigo'
+        self.rows.append({'email': 'rh@test.com', 'name': 'Duplicado'})
+        self.rows.append({'email': 'migrado0@LEGADO.com', 'name': 'Repetido no arquivo'})
+        self.rows.append({'email': 'sem-arroba', 'name': 'Invalido'})
+        report = import_users(self.rows, chunk_size=4, workers=2)
+        self.assertEqual((report['created'], report['rejected']), (6, 3))
+        self.assertEqual([error['row'] for error in report['errors']], [7, 8, 9])
+        user = BaseCustomUser.objects.get(email='migrado3@legado.com')
+        self.assertTrue(user.check_password('senha-3'))
+        self.assertEqual(user.username, 'migrado3@legado.com')
+        self.assertEqual(UserSecurityProfile.objects.filter(user__email__endswith='@legado.com').count(), 6)
+        self.assertEqual(CustomerCRM.objects.get(user__email='migrado1@legado.com').internal_notes, 'VIP no sistema antigo')
+
+    def test_existing_hashes_are_kept(self):
+        legacy = make_password('antiga')
+        report = import_users([
+            {'email': 'hash@legado.com', 'name': 'Hash', 'password_hash': legacy},
+            {'email': 'semsenha@legado.com', 'name': 'Sem senha'},
+            {'email': 'lixo@legado.com', 'name': 'Lixo', 'password_hash': 'md5-qualquer'},
+        ], workers=1)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['errors'][0]['row'], 3)
+        self.assertEqual(BaseCustomUser.objects.get(email='hash@legado.com').password, legacy)
+        self.assertFalse(BaseCustomUser.objects.get(email='semsenha@legado.com').has_usable_password())
+
+    def test_pool_is_only_started_for_large_batches(self):
+        hasher = PasswordHasher(workers=4)
+        try:
+            hasher.hash(['a', 'b'])
+            self.assertIsNone(hasher.executor)
+        finally:
+            hasher.close()
+
+    def test_bulk_import_endpoint(self):
+        url = reverse('user-bulk-import')
+        client_user = BaseCustomUser.objects.create_user(username='curioso', email='curioso@test.com', password='123')
+        self.client.force_authenticate(user=client_user)
+        self.assertEqual(self.client.post(url, self.rows, format='json').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.staff_user)
+        upload = SimpleUploadedFile('clientes.csv', b'email,name,password\nnovo@legado.com,Novo,abc123\n', content_type='text/csv')
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        response = self.client.post(url, {'users': [{'email': 'novo@legado.com', 'name': 'De novo'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data['errors'][0]['errors'])
+
+    def test_bad_lines_after_the_first_chunk_keep_the_report(self):
+        lines = [f'migrado{i}@legado.com,Cliente {i},'.encode() for i in range(DEFAULT_CHUNK_SIZE + 5)]
+        lines.insert(DEFAULT_CHUNK_SIZE + 2, b'quebrado@legado.com,Jos\xe9,')
+        upload = SimpleUploadedFile('clientes.csv', b'\n'.join([b'email,name,password'] + lines), content_type='text/csv')
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.post(reverse('user-bulk-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['rejected']), (DEFAULT_CHUNK_SIZE + 5, 1))
+        self.assertEqual(response.data['errors'][0]['row'], DEFAULT_CHUNK_SIZE + 3)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('email,name,password\n' + ''.join(f"{row['email']},{row['name']},{row['password']}\n" for row in self.rows))
+        try:
+            output = io.StringIO()
+            call_command('import_users', f.name, workers=1, stdout=output)
+        finally:
+            os.remove(f.name)
+        self.assertIn('6 usuario(s) importado(s)', output.getvalue())
+
+    def test_user_update_does_not_resave_profile(self):
+        user = BaseCustomUser.objects.get(pk=self.staff_user.pk)
+        user.name = 'Recursos Humanos'
+        with self.assertNumQueries(1):
+            user.save()
+
+
+from .models import SecurityToken
+from .utils import send_otp_email, send_password_reset_email
+
+class SecurityTokenStoreTests(APITestCase):
+    def setUp(self):
+        throttling.reset_throttles()
+        self.user = BaseCustomUser.objects.create_user(username='cofre', email='cofre@test.com', password='123')
+
+    def test_only_hashes_are_stored_and_profile_is_untouched(self):
+        token = token_service.issue_password_reset(self.user)
+        code = token_service.issue_otp(self.user)
+        hashes = set(SecurityToken.objects.values_list('token_hash', flat=True))
+        self.assertEqual(len(hashes), 2)
+        self.assertNotIn(token, hashes)
+        self.assertFalse(any(code in value for value in hashes))
+        # uma nova emissão substitui o token anterior da mesma finalidade
+        token_service.issue_password_reset(self.user)
+        self.assertEqual(SecurityToken.objects.filter(user=self.user).count(), 2)
+        with self.assertRaises(token_service.TokenInvalid):
+            token_service.consume_password_reset(token)
+
+    def test_reset_is_a_single_indexed_lookup(self):
+        token = token_service.issue_password_reset(self.user)
+        # SELECT pelo hash + DELETE do token; nenhum UPDATE no perfil de segurança
+        with CaptureQueriesContext(default_connection) as captured:
+            self.assertEqual(token_service.consume_password_reset(token), self.user.pk)
+        self.assertEqual([query['sql'].split()[0] for query in captured], ['SELECT', 'DELETE'])
+
+    def test_login_otp_flow_and_sweeper(self):
+        self.user.security_profile.is_2fa_enabled = True
+        self.user.security_profile.save()
+        response = self.client.post(reverse('token_obtain_pair'), {'email': 'cofre@test.com', 'password': '123'})
+        self.assertTrue(response.data['2fa_required'])
+        self.assertEqual(SecurityToken.objects.filter(user=self.user, purpose=token_service.OTP).count(), 1)
+        token_service.issue_password_reset(self.user, now=timezone.now() - timedelta(days=1))
+        output = io.StringIO()
+        call_command('purge_security_tokens', stdout=output)
+        self.assertIn('1 token(s)', output.getvalue())
+        self.assertEqual(list(SecurityToken.objects.values_list('purpose', flat=True)), [token_service.OTP])
+
+    @override_settings(OTP_TTL_MINUTES=5)
+    def test_otp_email_states_the_configured_ttl(self):
+        send_otp_email(self.user)
+        self.assertIn('expira em 5 minutos', EmailOutbox.objects.get(to='cofre@test.com').body)
+
+    @override_settings(PASSWORD_RESET_TTL_MINUTES=30)
+    def test_reset_email_states_the_configured_ttl(self):
+        send_password_reset_email(self.user)
+        self.assertIn('expira em 30 minutos', EmailOutbox.objects.get(to='cofre@test.com').body)
+
+
+import tempfile
+import time
+
+class SharedThrottleTests(APITestCase):
+    def setUp(self):
+        throttling.reset_throttles()
+        self.addCleanup(throttling.reset_throttles)
+
+    def test_sliding_window_rolls_in_a_single_statement(self):
+        store = throttling.get_store()
+        key = 'throttle_test_1'
+        with self.assertNumQueries(0):
+            self.assertEqual(tuple(store.hit(key, 60, 600.0)), (1, 0))
+        for _ in range(3):
+            store.hit(key, 60, 630.0)
+        # proxima janela: as 4 contagens viram a anterior e pesam pela fração restante
+        current, previous = store.hit(key, 60, 675.0)
+        self.assertEqual((current, previous), (1, 4))
+        self.assertAlmostEqual(throttling.estimate(current, previous, 0.25), 4.0)
+        # mais de uma janela sem requests zera tudo
+        self.assertEqual(tuple(store.hit(key, 60, 900.0)), (1, 0))
+
+    def test_wait_until_request_fits(self):
+        # limite 4, 4 na anterior e 1 (negado) na atual: cabe quando a anterior pesar menos de 2
+        self.assertAlmostEqual(throttling.wait_seconds(1, 4, 0.25, 4, 60), 15.0)
+        # janela atual já cheia: espera a virada e parte da proxima
+        self.assertAlmostEqual(throttling.wait_seconds(5, 0, 0.5, 4, 60), 30.0 + 60 * (1 - 3 / 5))
+
+    def test_counters_are_shared_through_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'throttle.sqlite3')
+            # duas instancias fazem o papel de dois workers
+            first, second = throttling.ThrottleStore(path), throttling.ThrottleStore(path)
+            first.hit('throttle_anon_1.2.3.4', 60, 600.0)
+            self.assertEqual(tuple(second.hit('throttle_anon_1.2.3.4', 60, 601.0)), (2, 0))
+            self.assertEqual(second.purge(10000.0), 1)
+            first.connect().close()
+            second.connect().close()
+
+    def test_otp_scope_is_tighter_and_survives_cache_clear(self):
+        user = BaseCustomUser.objects.create_user(username='otpthrottle', email='otpthrottle@test.com', password='123')
+        url = reverse('verify_2fa')
+        data = {'email': user.email, 'otp_code': '000000'}
+        for _ in range(5):
+            self.assertEqual(self.client.post(url, data).status_code, status.HTTP_400_BAD_REQUEST)
+            # o cache local não guarda mais os contadores
+            cache.clear()
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        # catalogo segue no limite anonimo
+        self.assertEqual(self.client.get(reverse('product-list')).status_code, status.HTTP_200_OK)
+
+    def test_login_and_password_reset_have_separate_counters(self):
+        BaseCustomUser.objects.create_user(username='esquecido', email='esquecido@test.com', password='123')
+        login = reverse('token_obtain_pair')
+        for _ in range(10):
+            self.client.post(login, {'email': 'esquecido@test.com', 'password': 'errada'})
+        self.assertEqual(self.client.post(login, {'email': 'esquecido@test.com', 'password': 'errada'}).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(reverse('password_reset_request'), {'email': 'esquecido@test.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_purge_removes_expired_counters(self):
+        store = throttling.get_store()
+        now = time.time()
+        store.hit('throttle_old', 60, now - 3600)
+        store.hit('throttle_new', 60, now)
+        output = io.StringIO()
+        call_command('purge_throttle_counters', stdout=output)
+        self.assertIn('1 contador(es)', output.getvalue())
+        self.assertEqual(store.purge(now + 3600), 1)
+
+
+from PIL import Image
+from .models import ProductImageJob
+from .services.image_pipeline import ImageWorker
+from .utils import ImageSrcsetField
+
+class ProductImagePipelineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name, MEDIA_URL='/media/', IMAGE_JOB_MAX_ATTEMPTS=2)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media_root = media.name
+        self.staff_user = BaseCustomUser.objects.create_user(
+            username='fotos', email='fotos@test.com', password='123', user_type='admin')
+        self.client.force_authenticate(user=self.staff_user)
+
+    def upload(self, name, size, fmt='JPEG', mode='RGB'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 80, 40, 128)[:len(mode)]).save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+    def test_upload_returns_before_derivatives_and_worker_fills_srcset(self):
+        response = self.client.post(reverse('product-list'), {
+            'name': 'Cadeira', 'price': '450.00', 'image': self.upload('cadeira.jpg', (2000, 1000))}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('image_srcset', response.data)
+        job = ProductImageJob.objects.get()
+        self.assertEqual(job.status, 'pending')
+
+        self.assertEqual(ImageWorker(workers=2).run(once=True), (1, 0))
+        product = BaseProduct.objects.get()
+        sizes = {name: (product.image_variants[name]['width'], product.image_variants[name]['height'])
+                 for name in ('thumbnail', 'card', 'zoom')}
+        self.assertEqual(sizes, {'thumbnail': (160, 80), 'card': (480, 240), 'zoom': (1600, 800)})
+        with Image.open(os.path.join(self.media_root, product.image_variants['card']['webp'])) as card:
+            self.assertEqual((card.format, card.size), ('WEBP', (480, 240)))
+        self.assertEqual(ProductImageJob.objects.get().status, 'done')
+
+        # a gravação dos derivados invalida a resposta do catalogo em cache
+        srcset = self.client.get(reverse('product-detail', args=[product.pk])).data['image_srcset']
+        self.assertEqual([entry.rsplit(' ', 1)[1] for entry in srcset['webp'].split(', ')], ['160w', '480w', '1600w'])
+        self.assertIn(f"/media/{product.image_variants['zoom']['jpeg']} 1600w", srcset['jpeg'])
+        listed = self.client.get(reverse('product-list')).data['results'][0]
+        self.assertEqual(listed['image_srcset'], srcset)
+        self.assertNotIn('image_variants', self.client.get(reverse('product-detail', args=[product.pk])).data)
+
+    def test_small_transparent_image_is_not_upscaled_and_names_follow_content(self):
+        first = BaseProduct.objects.create(name='Icone', price=Decimal('5.00'), image=self.upload('icone.png', (300, 200), 'PNG', 'RGBA'))
+        second = BaseProduct.objects.create(name='Icone 2', price=Decimal('5.00'), image=self.upload('icone2.png', (300, 200), 'PNG', 'RGBA'))
+        ImageWorker(workers=1).run(once=True)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_variants['zoom']['width'], 300)
+        # mesma foto, mesmo conteudo: os dois produtos apontam para os mesmos arquivos
+        self.assertEqual(first.image_variants['card'], second.image_variants['card'])
+        srcset = ImageSrcsetField().to_representation(first)
+        self.assertEqual(srcset['jpeg'].count(' 300w'), 1)
+        self.assertTrue(srcset['jpeg'].startswith(f"/media/{first.image_variants['thumbnail']['jpeg']} 160w"))
+
+    def test_replaced_photo_and_broken_upload(self):
+        product = BaseProduct.objects.create(name='Mesa', price=Decimal('900.00'), image=self.upload('mesa.jpg', (800, 600)))
+        product.image = self.upload('mesa2.jpg', (600, 800))
+        product.save()
+        self.assertEqual(ProductImageJob.objects.filter(status='pending').count(), 2)
+        ImageWorker(workers=2).run(once=True)
+        product.refresh_from_db()
+        # só os derivados da foto atual ficam no produto
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        self.assertEqual(product.image_variants['zoom']['height'], 800)
+
+        broken = BaseProduct.objects.create(
+            name='Quebrada', price=Decimal('1.00'), image=SimpleUploadedFile('quebrada.jpg', b'nao e imagem'))
+        worker = ImageWorker(workers=1)
+        self.assertEqual(worker.run_once(), (0, 1))
+        ProductImageJob.objects.filter(product=broken).update(next_attempt_at=timezone.now())
+        self.assertEqual(worker.run_once(), (0, 1))
+        self.assertEqual(ProductImageJob.objects.get(product=broken).status, 'dead')
+        self.assertIsNone(ImageSrcsetField().to_representation(broken))
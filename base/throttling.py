@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+# Throttles do DRF com os contadores num arquivo SQLite proprio (THROTTLE_STORE_PATH) em vez
+# do cache: sem CACHES configurado cada worker tinha seu proprio locmem e o limite real era
+# multiplicado pelo numero de workers. O arquivo é compartilhado pelos processos do host, em
+# modo WAL, e fica fora do banco da aplicação: nenhuma query a mais nas conexões do Django.
+# Janela deslizante aproximada: a contagem da janela fixa atual mais a da anterior, ponderada
+# pela fração dela que ainda cai nos ultimos `duration` segundos. Cada checagem é um unico
+# UPSERT, sem a lista de timestamps do SimpleRateThrottle. Requests negados também contam:
+# um cliente que insiste continua bloqueado.
+
+MAX_KEY_LENGTH = 255
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS throttle_counter (
+    key TEXT PRIMARY KEY,
+    bucket INTEGER NOT NULL,
+    current INTEGER NOT NULL,
+    previous INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+# os SETs leem os valores antigos da linha, então a virada de janela acontece no mesmo comando
+HIT_SQL = """
+INSERT INTO throttle_counter (key, bucket, current, previous, expires_at) VALUES (?, ?, 1, 0, ?)
+ON CONFLICT (key) DO UPDATE SET
+    previous = CASE
+        WHEN throttle_counter.bucket = excluded.bucket THEN throttle_counter.previous
+        WHEN throttle_counter.bucket = excluded.bucket - 1 THEN throttle_counter.current
+        ELSE 0 END,
+    current = CASE WHEN throttle_counter.bucket = excluded.bucket THEN throttle_counter.current + 1 ELSE 1 END,
+    bucket = excluded.bucket,
+    expires_at = excluded.expires_at
+RETURNING current, previous
+"""
+
+def store_path():
+    path = getattr(settings, 'THROTTLE_STORE_PATH', None)
+    if path:
+        return str(path)
+    # banco padrão em memoria (testes): sem arquivo para compartilhar, contadores por thread
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return ':memory:'
+    return str(settings.BASE_DIR / 'throttle.sqlite3')
+
+class ThrottleStore:
+    # Uma conexão sqlite3 por thread (e por processo: workers criados por fork reabrem a sua).
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connect(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=getattr(settings, 'THROTTLE_STORE_TIMEOUT', 5), isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # contadores podem perder os ultimos commits numa queda de energia; não vale um fsync por request
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(SCHEMA_SQL)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return self.local.conn
+
+    def hit(self, key, duration, now):
+        # conta o request e devolve (current, previous) já com a janela atualizada
+        bucket = int(now // duration)
+        # a linha vale até o fim da proxima janela, quando a atual deixa de pesar
+        return self.connect().execute(HIT_SQL, (storage_key(key), bucket, (bucket + 2) * duration)).fetchone()
+
+    def purge(self, now):
+        return self.connect().execute('DELETE FROM throttle_counter WHERE expires_at <= ?', (now,)).rowcount
+
+    def reset(self):
+        self.connect().execute('DELETE FROM throttle_counter')
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store():
+    path = store_path()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ThrottleStore(path)
+        return _stores[path]
+
+def storage_key(key):
+    # chaves do DRF com X-Forwarded-For podem ficar grandes
+    if len(key) <= MAX_KEY_LENGTH:
+        return key
+    return 'sha256_' + hashlib.sha256(key.encode()).hexdigest()
+
+def estimate(current, previous, elapsed):
+    # elapsed: fração já decorrida da janela atual
+    return previous * (1 - elapsed) + current
+
+def wait_seconds(current, previous, elapsed, num_requests, duration):
+    # quanto falta para o proximo request caber no limite, se ninguem mais chamar
+    room = num_requests - current - 1
+    if previous and room >= 0:
+        target = 1 - room / previous
+        if target < 1:
+            return max(0.0, target - elapsed) * duration
+    # só na proxima janela, quando a atual passa a ser a anterior
+    return (1 - elapsed + max(0.0, 1 - (num_requests - 1) / current)) * duration
+
+def reset_throttles():
+    get_store().reset()
+
+class SharedRateThrottle(SimpleRateThrottle):
+    # Mesmas chaves, escopos e taxas do SimpleRateThrottle; muda só onde a contagem fica.
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        self.current, self.previous = get_store().hit(self.key, self.duration, self.now)
+        return estimate(self.current, self.previous, self.elapsed()) <= self.num_requests
+
+    def elapsed(self):
+        return (self.now % self.duration) / self.duration
+
+    def wait(self):
+        return wait_seconds(self.current, self.previous, self.elapsed(), self.num_requests, self.duration)
+
+# o SharedRateThrottle fica depois no MRO: os throttles do DRF definem escopo e chave
+# (o ScopedRateThrottle lê o throttle_scope da view e chama o allow_request daqui)
+class SharedAnonRateThrottle(AnonRateThrottle, SharedRateThrottle):
+    pass
+
+class SharedUserRateThrottle(UserRateThrottle, SharedRateThrottle):
+    pass
+
+class SharedScopedRateThrottle(ScopedRateThrottle, SharedRateThrottle):
+    pass
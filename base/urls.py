@@ -6,9 +6,10 @@ from .views import (
     OrderViewSet, OrderItemViewSet,
     CartViewSet, CartItemViewSet,
     CRMTagViewSet, CustomerCRMViewSet, CRMInteractionViewSet,
-    SupplierViewSet, InventoryLogViewSet, FinancialTransactionViewSet,
-    RequestPasswordResetView, ResetPasswordView
+    SupplierViewSet, InventoryLogViewSet, FinancialTransactionViewSet, AnalyticsViewSet,
+    RequestPasswordResetView, ResetPasswordView, DataExportView
 )
+from .async_views import AsyncCartViewSet, AsyncOrderViewSet, AsyncProductViewSet
 from .tests import ( ProtectedHelloView)
 router = DefaultRouter()
 
@@ -32,6 +33,7 @@ router.register(r'crm-interactions', CRMInteractionViewSet, basename='crm-intera
 router.register(r'suppliers', SupplierViewSet, basename='supplier')
 router.register(r'inventory-logs', InventoryLogViewSet, basename='inventory-log')
 router.register(r'financial-transactions', FinancialTransactionViewSet, basename='financial-transaction')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     # Inclui as rotas da api como: /api/products/  # inclui todas as rotas dos ViewSets
@@ -39,4 +41,10 @@ urlpatterns = [
     path('hello/', ProtectedHelloView.as_view(), name='protected-hello'), # endpoint protegido para teste de autenticação
     path('auth/request-password-reset/', RequestPasswordResetView.as_view(), name='request-password-reset'), # envia email para recuperação de senha
     path('auth/reset-password/', ResetPasswordView.as_view(), name='reset-password'), # redefine a senha usando token recebido
+    path('exports/<str:dataset>/', DataExportView.as_view(), name='data-export'), # exportação Parquet em streaming (staff)
+    # leitura assincrona (ASGI) de catalogo, carrinho e pedidos; mesmas respostas das rotas do router
+    path('async/products/', AsyncProductViewSet.as_view({'get': 'list'}), name='async-product-list'),
+    path('async/products/<pk>/', AsyncProductViewSet.as_view({'get': 'retrieve'}), name='async-product-detail'),
+    path('async/cart/', AsyncCartViewSet.as_view({'get': 'list'}), name='async-cart-list'),
+    path('async/orders/', AsyncOrderViewSet.as_view({'get': 'list'}), name='async-order-list'),
 ]
@@ -1,35 +1,29 @@
 from rest_framework import serializers
 import nh3
-import uuid
-import random
-import string
-from django.core.mail import send_mail
 from django.conf import settings
-from django.utils import timezone
-from datetime import timedelta
-from base.services.email_factory import get_email_service
-
-def generate_otp():
-    return ''.join(random.choices(string.digits, k=6))
+from django.core.files.storage import default_storage
+from django.utils.html import linebreaks
+from base.services.image_pipeline import DERIVATIVES, FORMATS
+from base.services.outbox import enqueue_email
+from base.services.token_service import issue_otp, issue_password_reset
 
 def send_otp_email(user):
-    otp = generate_otp()
-    user.security_profile.otp_code = otp
-    user.security_profile.otp_created_at = timezone.now()
-    user.security_profile.save()
+    # codigo guardado só como HMAC em SecurityToken; o perfil do usuario não é alterado
+    otp = issue_otp(user)
     subject = 'Seu código de verificação (2FA)'
-    message = f'Olá {user.name},\n\nSeu código de verificação é: {otp}\n\nEste código expira em 10 minutos.'
-    from_email = settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@nexum.com'
-    send_mail(subject, message, from_email, [user.email], fail_silently=False)
+    # mesmo prazo do token_service: o texto acompanha OTP_TTL_MINUTES
+    minutes = getattr(settings, 'OTP_TTL_MINUTES', 10)
+    message = f'Olá {user.name},\n\nSeu código de verificação é: {otp}\n\nEste código expira em {minutes} minutos.'
+    # o envio acontece no worker da fila (run_email_worker), fora da requisição de login
+    enqueue_email(to=user.email, subject=subject, body=linebreaks(message, autoescape=True))
 
 def send_password_reset_email(user):
-    # O token de recuperação de senha é gerado usando uuid.uuid4(),
-    # garantindo unicidade e segurança. Ele é salvo no perfil do usuário
-    # e enviado por email para ser usado na redefinição de senha.
-    token = str(uuid.uuid4())
-    user.security_profile.reset_password_token = token
-    user.security_profile.reset_password_expires = timezone.now() + timedelta(hours=1)
-    user.security_profile.save()
+    # O token de recuperação de senha é aleatorio (secrets.token_urlsafe) e de uso unico.
+    # Só o HMAC dele é salvo (SecurityToken, expira em PASSWORD_RESET_TTL_MINUTES); o valor vai apenas no email.
+    token = issue_password_reset(user)
+    minutes = getattr(settings, 'PASSWORD_RESET_TTL_MINUTES', 60)
+    hours, rest = divmod(minutes, 60)
+    expiry = f"{hours} hora{'s' if hours > 1 else ''}" if hours and not rest else f'{minutes} minutos'
     reset_link = f"http://localhost:3000/reset-password?token={token}"
     subject = 'Recuperação de Senha - Nexum'
     #para alterar a mensagem de recuperação de senha, é na variavel message
@@ -38,10 +32,9 @@ def send_password_reset_email(user):
     <p>Você solicitou a recuperação de senha.</p>
     <p>Clique no link abaixo para redefinir sua senha:</p>
     <p><a href="{reset_link}">Redefinir Minha Senha</a></p>
-    <p><small>Este link expira em 1 hora.</small></p>
+    <p><small>Este link expira em {expiry}.</small></p>
     """
-    email_service = get_email_service()
-    email_service.send_email(to=user.email, subject=subject, body=message)
+    enqueue_email(to=user.email, subject=subject, body=message)
 
 class SanitizedCharField(serializers.CharField):
     def to_internal_value(self, data):
@@ -58,4 +51,34 @@ class RichTextField(serializers.CharField):
         allowed_attributes = {
             'a': {'href', 'title', 'target'},
         }
-        return nh3.clean(data, tags=allowed_tags, attributes=allowed_attributes)
\ No newline at end of file
+        return nh3.clean(data, tags=allowed_tags, attributes=allowed_attributes)
+
+class ImageSrcsetField(serializers.Field):
+    # derivados da foto (image_variants) no formato do srcset, um por formato:
+    # {"webp": "<url> 160w, <url> 480w, ...", "jpeg": "..."}; ausente enquanto o worker não gerou
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, product):
+        variants = product.image_variants
+        # derivados de uma foto anterior não valem para a atual
+        if not product.image or variants.get('source') != product.image.name:
+            return None
+        request = self.context.get('request')
+        srcset = {}
+        for ext, _, _ in FORMATS:
+            entries, widths = [], set()
+            for name, _ in DERIVATIVES:
+                variant = variants.get(name)
+                # foto pequena: tamanhos sem ampliação repetem a mesma largura
+                if not variant or variant['width'] in widths:
+                    continue
+                widths.add(variant['width'])
+                url = default_storage.url(variant[ext])
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                entries.append(f"{url} {variant['width']}w")
+            srcset[ext] = ', '.join(entries)
+        return srcset
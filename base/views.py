@@ -1,13 +1,35 @@
+import hashlib
+import time
 from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.utils import timezone
-from datetime import timedelta
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, urlencode
 from .utils import send_otp_email, send_password_reset_email
+from .cache import (
+    catalog_cache_stats, catalog_response_key, catalog_state, get_cart_snapshot, get_catalog_response,
+    record_catalog_cache, set_cart_snapshot, set_catalog_response
+)
+from .services.stock_service import InsufficientStock, reserve, release_for_item
+from .services.checkout_service import CheckoutConflict, EmptyCart, checkout
+from .services.order_service import bulk_transition as transition_orders
+from .services.inventory_import import ingest_movements, iter_rows
+from .services.user_import import import_users
+from .services.token_service import TokenExpired, TokenInvalid, consume_otp, consume_password_reset
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import ProductFilter, OrderFilter, InventoryLogFilter, FinancialTransactionFilter, UserFilter
+from .pagination import OptionalCursorPagination
+from .filters import (
+    ProductFilter, OrderFilter, InventoryLogFilter, FinancialTransactionFilter, UserFilter,
+    ProductSearchFilter, RelevanceOrderingFilter
+)
 from .models import (
     BaseProduct, ProductVariation, BaseCustomUser, Address,
     Order, OrderItem, Cart, CartItem, CRMTag, CustomerCRM,
@@ -20,13 +42,21 @@ from .serializers import (
     CartSerializer, CartItemSerializer,
     CRMTagSerializer, CustomerCRMSerializer, CRMInteractionSerializer,
     SupplierSerializer, InventoryLogSerializer, FinancialTransactionSerializer,
-    CustomTokenObtainPairSerializer
+    CustomTokenObtainPairSerializer, FinancialSummaryQuerySerializer, AnalyticsQuerySerializer,
+    OrderBulkTransitionSerializer
+)
+from .services.finance_service import summary as financial_summary
+from .services.analytics_service import dashboard
+from .services.export_service import (
+    ExportError, decode_watermark, encode_watermark, high_watermark, stream_parquet,
+    get_spec as get_export_spec
 )
 #AUTENTICAÇÃO DE DOIS FATORES
 
 #verifica cria o token e verifica se o usuario tem
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)  
         if response.status_code == 200:
@@ -43,6 +73,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 #valida o codigo do token
 class VerifyOTPView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'otp'
     def post(self, request):
         email = request.data.get('email')
         otp_code = request.data.get('otp_code')
@@ -52,15 +83,12 @@ class VerifyOTPView(APIView):
             user = BaseCustomUser.objects.get(email=email)
         except BaseCustomUser.DoesNotExist:
             return Response({'error': 'Usuário não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
-        profile = user.security_profile
-        if not profile.otp_code or profile.otp_code != otp_code:
-            return Response({'error': 'Código inválido.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if profile.otp_created_at and timezone.now() > profile.otp_created_at + timedelta(minutes=10):
+        try:
+            consume_otp(user, otp_code)
+        except TokenExpired:
             return Response({'error': 'Código expirado.'}, status=status.HTTP_400_BAD_REQUEST)
-        profile.otp_code = None
-        profile.otp_created_at = None
-        profile.save()
+        except TokenInvalid:
+            return Response({'error': 'Código inválido.'}, status=status.HTTP_400_BAD_REQUEST)
         refresh = RefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
@@ -70,6 +98,7 @@ class VerifyOTPView(APIView):
 #recuperar senha
 class RequestPasswordResetView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset'
     def post(self, request):
         email = request.data.get('email')
         if not email:
@@ -84,23 +113,22 @@ class RequestPasswordResetView(APIView):
 #mudar senha
 class ResetPasswordView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset_confirm'
     
     def post(self, request):
         token = request.data.get('token')
         new_password = request.data.get('new_password')
         if not token or not new_password:
             return Response({'error': 'Token e nova senha são obrigatórios.'}, status=status.HTTP_400_BAD_REQUEST)
+        # busca pelo HMAC do token (indice unico) e consumo no mesmo passo
         try:
-            user = BaseCustomUser.objects.get(security_profile__reset_password_token=token)
-        except BaseCustomUser.DoesNotExist:
-            return Response({'error': 'Token inválido.'}, status=status.HTTP_400_BAD_REQUEST)
-        profile = user.security_profile
-        if profile.reset_password_expires and timezone.now() > profile.reset_password_expires:
+            user_id = consume_password_reset(token)
+        except TokenExpired:
             return Response({'error': 'Token expirado.'}, status=status.HTTP_400_BAD_REQUEST)
+        except TokenInvalid:
+            return Response({'error': 'Token inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        user = BaseCustomUser.objects.get(pk=user_id)
         user.set_password(new_password)
-        profile.reset_password_token = None
-        profile.reset_password_expires = None
-        profile.save()
         user.save()
         return Response({'message': 'Senha redefinida com sucesso.'}, status=status.HTTP_200_OK)
 
@@ -120,24 +148,94 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_superuser or request.user.is_staff:
             return True
-        if hasattr(obj, 'client'):
-            return obj.client == request.user
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
+        # compara as chaves (client_id/user_id) para não carregar o usuario dono só para a checagem
+        if hasattr(obj, 'client_id'):
+            return obj.client_id == request.user.pk
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.pk
         return obj == request.user
 
+# Cache HTTP do catalogo, tudo derivado da versão do catalogo (base/cache.py):
+# - GET condicional: ETag/Last-Modified sem serializar o corpo; If-None-Match / If-Modified-Since válidos recebem 304.
+# - cache de resposta: response.data por parametros normalizados e tipo de usuario (staff vs publico,
+#   pois ProductFilter.check_permissions muda); um bump da versão invalida tudo.
+class CatalogHTTPCacheMixin:
+    catalog_scope = 'products'
+
+    def catalog_variant(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        user_class = 'staff' if request.user and request.user.is_staff else 'public'
+        return f"{request.get_host()}{request.path}?{query}|{user_class}"
+
+    def catalog_etag(self, request, version):
+        # o formato negociado também muda a representação
+        variant = f"{version}|{self.catalog_variant(request)}|{request.accepted_media_type or ''}"
+        return '"%s"' % hashlib.sha1(variant.encode('utf-8')).hexdigest()
+
+    def cache_lookup(self, request, version):
+        key = catalog_response_key(self.catalog_scope, version, self.catalog_variant(request))
+        data = get_catalog_response(key)
+        record_catalog_cache(self.catalog_scope, hit=data is not None)
+        return key, data
+
+    def cache_store(self, key, response):
+        if response.status_code == status.HTTP_200_OK:
+            set_catalog_response(key, response.data)
+        return response
+
+    def cached_response(self, request, version, handler, *args, **kwargs):
+        key, data = self.cache_lookup(request, version)
+        if data is not None:
+            return Response(data)
+        return self.cache_store(key, handler(request, *args, **kwargs))
+
+    def precondition(self, request):
+        # (versão, etag, last_modified, 304/412 ou None)
+        version, modified = catalog_state(self.catalog_scope)
+        etag = self.catalog_etag(request, version)
+        # Last-Modified tem resolução de segundos: só é enviado depois que o segundo da ultima mudança
+        # terminou, senão outra mudança no mesmo segundo teria a mesma data e o If-Modified-Since daria 304
+        last_modified = int(modified) if int(time.time()) > int(modified) else None
+        return version, etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def tag_response(self, response, etag, last_modified):
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        version, etag, last_modified, response = self.precondition(request)
+        if response is None:
+            response = self.cached_response(request, version, handler, *args, **kwargs)
+        return self.tag_response(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
 # Products
-class BaseProductViewSet(viewsets.ModelViewSet):
+class BaseProductViewSet(CatalogHTTPCacheMixin, viewsets.ModelViewSet):
     queryset = BaseProduct.objects.filter(is_active=True).order_by('created_at')
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, RelevanceOrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['name', 'description']
     ordering_fields = ['price', 'created_at', 'name']
     ordering = ['created_at']
 
-class ProductVariationViewSet(viewsets.ModelViewSet):
+    # contadores do cache de respostas do catalogo (produtos e variações)
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(catalog_cache_stats())
+
+class ProductVariationViewSet(CatalogHTTPCacheMixin, viewsets.ModelViewSet):
+    catalog_scope = 'variations'
     queryset = ProductVariation.objects.all()
     serializer_class = VariationProductSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -154,13 +252,36 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action == 'create': 
             return [permissions.AllowAny()]
+        if self.action == 'bulk_import':
+            return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated(), IsOwnerOrAdmin()]
 
     def get_queryset(self):
         user = self.request.user
+        queryset = BaseCustomUser.objects.select_related('address')
         if user.is_staff:
-            return BaseCustomUser.objects.all()
-        return BaseCustomUser.objects.filter(id=user.id)
+            return queryset
+        return queryset.filter(id=user.id)
+
+    # importação de clientes: lista JSON no corpo ou arquivo .csv/.json/.jsonl no campo "file"
+    @action(detail=False, methods=['post'], url_path='bulk-import', parser_classes=[JSONParser, MultiPartParser])
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        try:
+            if upload:
+                fmt = 'csv' if upload.name.lower().endswith('.csv') else 'json'
+                rows = iter_rows(upload.file, fmt)
+            else:
+                rows = request.data.get('users') if isinstance(request.data, dict) else request.data
+                if not isinstance(rows, list):
+                    return Response({'error': 'Envie uma lista de usuarios ou um arquivo.'}, status=status.HTTP_400_BAD_REQUEST)
+            # hash serial: nada de pool de processos dentro do worker web; arquivos grandes vão pelo comando import_users
+            report = import_users(rows, workers=1)
+        except (ValueError, UnicodeDecodeError) as e:
+            # só erros antes do primeiro chunk (cabeçalho, array JSON); linhas ruins entram no relatorio
+            return Response({'error': f'Arquivo inválido: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
 
 class AddressViewSet(viewsets.ModelViewSet):
     serializer_class = AddressSerializer
@@ -189,18 +310,36 @@ class OrderViewSet(viewsets.ModelViewSet):
     search_fields = ['id', 'status']
     ordering_fields = ['created_at', 'status']
     ordering = ['created_at']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('created_at', 'id')
 
     def get_queryset(self):
         user = self.request.user
+        # total ja persistido no pedido; itens e produtos vem em um unico prefetch
+        queryset = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
         if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(client=user)
+            return queryset
+        return queryset.filter(client=user)
 
     def perform_create(self, serializer):
         serializer.save(client=self.request.user)
 
+    # avança varios pedidos de uma vez, ex: {"ids": [...], "status": "preparing"} ou {"ids": [...], "payment_status": true}
+    @action(detail=False, methods=['post'], url_path='bulk-transition', permission_classes=[permissions.IsAdminUser])
+    def bulk_transition(self, request):
+        data = OrderBulkTransitionSerializer(data=request.data)
+        data.is_valid(raise_exception=True)
+        result = transition_orders(
+            data.validated_data['ids'],
+            status=data.validated_data.get('status'),
+            payment_status=data.validated_data.get('payment_status'),
+        )
+        return Response(result)
+
 class OrderItemViewSet(viewsets.ModelViewSet):
-    queryset = OrderItem.objects.all()
+    queryset = OrderItem.objects.select_related('product').order_by('id')
     serializer_class = OrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -213,14 +352,51 @@ class CartViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = Cart.objects.prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product').only(
+                'id', 'cart_id', 'quantity', 'product__id', 'product__name', 'product__price'))
+        )
         if user.is_staff:
-            return Cart.objects.all()
-        cart, created = Cart.objects.get_or_create(user=user)
-        return Cart.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+    def list(self, request, *args, **kwargs):
+        user = request.user
+        if user.is_staff:
+            return super().list(request, *args, **kwargs)
+        return self.client_cart_response(user)
+
+    def client_cart_response(self, user):
+        # cliente possui um unico carrinho: serve o snapshot em cache quando existir
+        snapshot = get_cart_snapshot(user.id)
+        if snapshot is None:
+            cart = self.get_queryset().first()
+            if cart is None:
+                # duas primeiras leituras simultaneas: a segunda reaproveita o carrinho criado
+                cart, created = Cart.objects.get_or_create(user=user)
+            snapshot = self.get_serializer(cart).data
+            set_cart_snapshot(user.id, snapshot)
+        return Response({'count': 1, 'next': None, 'previous': None, 'results': [snapshot]})
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    # converte o carrinho do usuario em pedido (itens, estoque e limpeza do carrinho numa transação)
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        try:
+            order = checkout(request.user)
+        except EmptyCart as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as e:
+            return Response({'error': "Estoque insuficiente.", 'product': str(e.product_id)}, status=status.HTTP_400_BAD_REQUEST)
+        except CheckoutConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        order = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).get(pk=order.pk)
+        return Response(OrderSerializer(order, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
 class CartItemViewSet(viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
@@ -228,14 +404,38 @@ class CartItemViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = CartItem.objects.select_related('product')
         if user.is_staff:
-            return CartItem.objects.all()
-        return CartItem.objects.filter(cart__user=user)
+            return queryset
+        return queryset.filter(cart__user=user)
 
     def perform_create(self, serializer):
         user = self.request.user
         cart, created = Cart.objects.get_or_create(user=user)
-        serializer.save(cart=cart)
+        product = serializer.validated_data['product']
+        quantity = serializer.validated_data.get('quantity', 1)
+        with transaction.atomic():
+            # a linha é gravada antes para a reserva apontar para ela; sem estoque, a transação desfaz as duas
+            item = serializer.save(cart=cart)
+            self.reserve_stock(product.pk, quantity, item)
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        with transaction.atomic():
+            release_for_item(instance.pk)
+            item = serializer.save()
+            self.reserve_stock(item.product_id, item.quantity, item)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release_for_item(instance.pk)
+            instance.delete()
+
+    def reserve_stock(self, product_id, quantity, item):
+        try:
+            reserve(product_id, quantity, cart_id=item.cart_id, cart_item_id=item.pk)
+        except InsufficientStock:
+            raise ValidationError({'quantity': "Estoque insuficiente para a quantidade solicitada."})
 
 #CRM
 class CRMTagViewSet(viewsets.ModelViewSet):
@@ -244,12 +444,15 @@ class CRMTagViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAdminUser] 
 
 class CustomerCRMViewSet(viewsets.ModelViewSet):
-    queryset = CustomerCRM.objects.all()
+    # usuario, tags e interações (com o agente) em consultas fixas, independente do tamanho da pagina
+    queryset = CustomerCRM.objects.select_related('user').prefetch_related(
+        'tags', Prefetch('interactions', queryset=CRMInteraction.objects.select_related('agent'))
+    )
     serializer_class = CustomerCRMSerializer
     permission_classes = [permissions.IsAdminUser] 
 
 class CRMInteractionViewSet(viewsets.ModelViewSet):
-    queryset = CRMInteraction.objects.all()
+    queryset = CRMInteraction.objects.select_related('agent')
     serializer_class = CRMInteractionSerializer
     permission_classes = [permissions.IsAdminUser]
 
@@ -263,12 +466,33 @@ class SupplierViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAdminUser]
 
 class InventoryLogViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = InventoryLog.objects.all()
+    queryset = InventoryLog.objects.select_related('product', 'user')
     serializer_class = InventoryLogSerializer
     permission_classes = [permissions.IsAdminUser]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = InventoryLogFilter
     ordering_fields = ['created_at', 'type']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('created_at', 'id')
+
+    # entrada em lote: lista JSON no corpo ou arquivo .csv/.json/.jsonl no campo "file"
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, MultiPartParser])
+    def bulk(self, request):
+        upload = request.FILES.get('file')
+        try:
+            if upload:
+                fmt = 'csv' if upload.name.lower().endswith('.csv') else 'json'
+                rows = iter_rows(upload.file, fmt)
+            else:
+                rows = request.data.get('movements') if isinstance(request.data, dict) else request.data
+                if not isinstance(rows, list):
+                    return Response({'error': 'Envie uma lista de movimentos ou um arquivo.'}, status=status.HTTP_400_BAD_REQUEST)
+            report = ingest_movements(rows, user=request.user)
+        except (ValueError, UnicodeDecodeError) as e:
+            # só erros antes do primeiro chunk (cabeçalho, array JSON); linhas ruins entram no relatorio
+            return Response({'error': f'Arquivo inválido: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
 
 class FinancialTransactionViewSet(viewsets.ModelViewSet):
     queryset = FinancialTransaction.objects.all().order_by('date')
@@ -278,4 +502,86 @@ class FinancialTransactionViewSet(viewsets.ModelViewSet):
     filterset_class = FinancialTransactionFilter
     ordering_fields = ['date', 'amount']
     ordering = ['date']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('date', 'id')
+
+    # resumo de receitas/despesas a partir dos rollups, ex: ?start=2026-01-01&end=2026-03-31&period=month
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        query = FinancialSummaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(financial_summary(**query.validated_data))
 
+
+#DASHBOARDS (CRM/ERP)
+
+# Todas as seções de uma janela (?start=&end=&period=) são calculadas juntas e cacheadas;
+# cada endpoint devolve a sua parte.
+class AnalyticsViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def _dashboard(self, request):
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return params, dashboard(params['start'], params['end'], params['period'])
+
+    def _section(self, data, section):
+        return Response({'start': data['start'], 'end': data['end'], 'period': data['period'], 'results': section})
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        params, data = self._dashboard(request)
+        return self._section(data, data['revenue'])
+
+    @action(detail=False, methods=['get'], url_path='top-products')
+    def top_products(self, request):
+        params, data = self._dashboard(request)
+        return self._section(data, data['top_products'][:params['top']])
+
+    @action(detail=False, methods=['get'], url_path='orders-by-status')
+    def orders_by_status(self, request):
+        params, data = self._dashboard(request)
+        return self._section(data, data['orders_by_status'])
+
+    @action(detail=False, methods=['get'])
+    def cohorts(self, request):
+        params, data = self._dashboard(request)
+        return self._section(data, data['cohorts'])
+
+    @action(detail=False, methods=['get'])
+    def customers(self, request):
+        params, data = self._dashboard(request)
+        return self._section(data, data['customers'])
+
+#EXPORTAÇÃO COLUNAR
+
+# Baixa um dataset em Parquet, em streaming: GET /api/exports/orders/?since=<marca d'água>
+# O header X-Export-Watermark traz a marca d'água para o proximo download incremental.
+class DataExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, dataset):
+        try:
+            spec = get_export_spec(dataset)
+        except ExportError as e:
+            raise NotFound(str(e))
+        since = request.query_params.get('since')
+        try:
+            since = decode_watermark(spec, since) if since else None
+        except ExportError as e:
+            raise ValidationError({'since': [str(e)]})
+        until = high_watermark(spec)
+        if until is None or until == since:
+            response = Response(status=status.HTTP_204_NO_CONTENT)
+            if since is not None:
+                response['X-Export-Watermark'] = request.query_params['since']
+            return response
+
+        response = StreamingHttpResponse(
+            stream_parquet(spec, since=since, until=until),
+            content_type='application/vnd.apache.parquet',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.parquet"'
+        response['X-Export-Watermark'] = encode_watermark(until)
+        return response